@@ -0,0 +1,113 @@
+# Measures resolving chains of tasks where each task has the previous one
+# as it's only input. Times should grow linearly with the chain length.
+#
+# Usage: python benchmarks/chain.py [longest chain length]
+
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(
+    0,
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..")),
+)
+
+import taskgraph.dag
+import taskgraph.results
+import taskgraph.runner
+import taskgraph.task
+import taskgraph.util
+import taskgraph.values
+
+DEFAULT_LENGTH = 10000
+
+
+def add_chain(length):
+    """Register tasks chain0 ... chain<length - 1>
+    :return: Name of the last task
+    """
+    taskgraph.task.Task(
+        name="chain0",
+        runnable=lambda start: start,
+        inputs=["start"],
+    )
+    for i in range(1, length):
+        taskgraph.task.Task(
+            name="chain" + str(i),
+            runnable=lambda **previous: list(previous.values())[0],
+            inputs=["chain" + str(i - 1)],
+        )
+    return "chain" + str(length - 1)
+
+
+def measure(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def run(length):
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    taskgraph.values.reset()
+    timings = dict()
+    timings["register"] = measure(lambda: add_chain(length))
+    last = "chain" + str(length - 1)
+    taskgraph.values.add_value_names(["start"])
+    taskgraph.values.set_command_line_value("start", "value")
+
+    def fetch():
+        assert taskgraph.values.fetch_value(last) == "value"
+
+    timings["fetch_value"] = measure(fetch)
+    taskgraph.results.clear()
+
+    def value_task():
+        valuetask = taskgraph.runner.ValueTask.create_value_task(
+            name=last,
+            values={"start": "value"},
+        )
+        assert valuetask.run() == "value"
+
+    timings["value_task"] = measure(value_task)
+    taskgraph.results.clear()
+
+    def consecutive_task():
+        names = ["chain" + str(i) for i in range(length - 1)]
+        consecutive_task = \
+            taskgraph.task.ConsecutiveTask.create_consecutive_tasks(names)
+        consecutive_task.append(
+            taskgraph.task.ConsecutiveTask(task_name=last),
+        )
+        assert consecutive_task.run() == "value"
+
+    timings["consecutive_task"] = measure(consecutive_task)
+
+    timings["asciitree"] = measure(
+        lambda: taskgraph.util.get_asciitree(taskgraph.dag.get_task(last)),
+    )
+    return timings
+
+
+def main():
+    # Tasks log each run
+    logging.disable(logging.WARNING)
+    longest = DEFAULT_LENGTH
+    if len(sys.argv) > 1:
+        longest = int(sys.argv[1])
+    print("tasks   " + " ".join(
+        "{:>16}".format(name) for name in [
+            "register", "fetch_value", "value_task", "consecutive_task",
+            "asciitree",
+        ]
+    ))
+    for length in [longest // 8, longest // 4, longest // 2, longest]:
+        timings = run(length)
+        print("{:<7d} ".format(length) + " ".join(
+            "{:>16.3f}".format(timing) for timing in timings.values()
+        ))
+
+
+if __name__ == "__main__":
+    main()
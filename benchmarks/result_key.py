@@ -0,0 +1,75 @@
+# Measures looking up cached results of a task. Compares building the
+# key with a namedtuple type created on every lookup, as results were
+# keyed before, to the key function created once for each task.
+#
+# Usage: python benchmarks/result_key.py [number of lookups]
+
+import collections
+import logging
+import os
+import sys
+import timeit
+
+sys.path.insert(
+    0,
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..")),
+)
+
+import taskgraph.dag
+import taskgraph.results
+import taskgraph.task
+
+DEFAULT_LOOKUPS = 100000
+
+
+def get_namedtuple_per_call(task, values):
+    """Key of the result as it was built before key functions"""
+    tupletype = collections.namedtuple(
+        "task",
+        ["task_name"] + task.input_names + task.optional_input_names,
+        defaults=(taskgraph.task.EMPTY_VALUE,) *
+        len(task.optional_input_names),
+    )
+    if not "task_name" in values:
+        values = dict(values)
+        values["task_name"] = task.name
+    return tupletype(**values)
+
+
+def main():
+    # Tasks log each run
+    logging.disable(logging.WARNING)
+    lookups = DEFAULT_LOOKUPS
+    if len(sys.argv) > 1:
+        lookups = int(sys.argv[1])
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    task = taskgraph.task.Task(
+        name="commit",
+        runnable=lambda message, author, amend=None: message,
+        inputs=["message", "author"],
+        optionalInputs=["amend"],
+    )
+    values = {"message": "fix", "author": "me"}
+    task.run(values)
+
+    def before():
+        return get_namedtuple_per_call(task, values) in \
+            taskgraph.results.results_by_values
+
+    def after():
+        return taskgraph.results.has_result(task, values)
+
+    assert before() and after()
+    for name, function in [("before", before), ("after", after)]:
+        seconds = timeit.timeit(function, number=lookups)
+        print(
+            "{:<8}{:>10.3f} us per lookup".format(
+                name,
+                seconds / lookups * 1000000,
+            ),
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# Measures a session adding many results of a few hundred tasks and
+# listing the latest result of each task after every thousand results.
+# Compares scanning results_in_order backwards, as the latest results were
+# found before, to the per task indexes updated as results are added.
+# Times should grow linearly with the number of results.
+#
+# Usage: python benchmarks/session.py [number of results]
+
+import os
+import sys
+import time
+
+sys.path.insert(
+    0,
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..")),
+)
+
+import taskgraph.dag
+import taskgraph.results
+import taskgraph.task
+
+DEFAULT_RESULTS = 100000
+TASKS = 500
+LIST_INTERVAL = 1000
+
+
+def get_all_results_by_scanning():
+    """Latest results as they were found before the indexes"""
+    found_tasks = set()
+    results = list()
+    i = len(taskgraph.results.results_in_order) - 1
+    while i >= 0:
+        stored = taskgraph.results.results_in_order[i]
+        task_name = stored["task"].name
+        if task_name not in found_tasks and \
+           stored["result"] is not None and \
+           not taskgraph.results.is_stale(task_name):
+            results.insert(0, (task_name, stored["result"]))
+            found_tasks.add(task_name)
+        i -= 1
+    return results
+
+
+def run_session(count, get_all_results):
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    tasks = [
+        taskgraph.task.Task(name="task" + str(index), inputs=["number"])
+        for index in range(TASKS)
+    ]
+    start = time.perf_counter()
+    for number in range(count):
+        task = tasks[number % TASKS]
+        taskgraph.results.add_result(task, {"number": number}, str(number))
+        if number % LIST_INTERVAL == 0:
+            get_all_results()
+        taskgraph.results.get(task.name)
+    return time.perf_counter() - start
+
+
+def main():
+    count = DEFAULT_RESULTS
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+    assert run_session(TASKS * 3, get_all_results_by_scanning) and \
+        get_all_results_by_scanning() == taskgraph.results.get_all_results()
+    print("{:>10}{:>12}{:>12}".format("results", "scan s", "index s"))
+    for size in (count // 8, count // 4, count // 2, count):
+        print(
+            "{:>10}{:>12.3f}{:>12.3f}".format(
+                size,
+                run_session(size, get_all_results_by_scanning),
+                run_session(size, taskgraph.results.get_all_results),
+            ),
+        )
+    taskgraph.results.reset()
+    taskgraph.dag.reset()
+
+
+if __name__ == "__main__":
+    main()
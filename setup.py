@@ -19,7 +19,7 @@ setup(
     ),
     scripts=[],
     entry_points={
-        'console_scripts': ['tg=taskgraph.main:main'],
+        'console_scripts': ['tg=taskgraph.client:main'],
     },
     zip_safe=False,
     tests_require=[],
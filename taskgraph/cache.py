@@ -0,0 +1,343 @@
+# This file takes care of the persistent result cache.
+#
+# Results of tasks declaring cacheTtl are stored to a SQLite database
+# under ~/.taskgraph when the cache is enabled, so that later invocations
+# do not have to run them again. Entries are keyed by the hash of the
+# task definition and the canonical JSON of the values given to the task.
+# Entries expire after the TTL of the task and least recently used entries
+# are removed when the cache grows larger than max_size bytes.
+
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+import taskgraph.config
+
+log = logging.getLogger("taskgraph")
+
+# Changing the format of stored entries requires incrementing the version
+CACHE_VERSION = 1
+
+# Default maximum total size of stored results in bytes
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+enabled = False
+
+# Database file, None for default
+cache_file = None
+
+max_size = DEFAULT_MAX_SIZE
+
+# Connection to the database, opened on first use
+connection = None
+
+# Number of lookups finding and not finding a result since start
+hits = 0
+misses = 0
+
+# Hashes of module source files.
+# Key is file name, value is tuple of mtime in nanoseconds and hex digest.
+source_hashes = dict()
+
+lock = threading.Lock()
+
+
+def get_cache_file():
+    if cache_file is not None:
+        return cache_file
+    return taskgraph.config.get_taskgraph_dir() + "/results.sqlite"
+
+
+def is_enabled():
+    return enabled
+
+
+def enable(size=None, file=None):
+    """Store results of tasks having cacheTtl to the cache
+    :param size: Maximum total size of stored results in bytes
+    :param file: Database file, None for default
+    :return: None
+    """
+    global enabled
+    global max_size
+    global cache_file
+    if size is not None:
+        max_size = max(0, int(size))
+    if file is not None and file != cache_file:
+        close()
+        cache_file = file
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def get_connection():
+    """Get connection to the database, creating the database if needed
+    """
+    global connection
+    if connection is None:
+        filename = get_cache_file()
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        connection = sqlite3.connect(filename, check_same_thread=False)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, "
+            "task TEXT, "
+            "result BLOB, "
+            "size INTEGER, "
+            "created REAL, "
+            "expires REAL, "
+            "accessed REAL)"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS results_accessed "
+            "ON results (accessed)"
+        )
+        connection.commit()
+    return connection
+
+
+def close():
+    global connection
+    if connection is not None:
+        connection.close()
+        connection = None
+
+
+def get_source_hash(module_name, path=None):
+    """Get hash of the source file of a module without importing it
+    :param module_name: Name of the module
+    :param path: File of the module, None to find it by module name
+    :return: Hex digest as string or None if the file is not found
+    """
+    if path is None:
+        try:
+            spec = importlib.util.find_spec(module_name)
+        except (ImportError, ValueError):
+            spec = None
+        if spec is None or not spec.has_location:
+            return None
+        path = spec.origin
+    try:
+        mtime = os.stat(path).st_mtime_ns
+        stored = source_hashes.get(path)
+        if stored is not None and stored[0] == mtime:
+            return stored[1]
+        with open(path, "rb") as fp:
+            digest = hashlib.sha256(fp.read()).hexdigest()
+    except OSError:
+        return None
+    source_hashes[path] = (mtime, digest)
+    return digest
+
+
+def get_definition_hash(task):
+    """Get hash of everything defining what the task computes.
+    Python functions are identified by their module, name and code.
+    Functions of modules which are imported lazily are identified by
+    the source file of the module so that the module is not imported.
+
+    :param task: taskgraph.task.Task
+    :return: Hex digest as string
+    """
+    reference = task.runnable_reference
+    if reference is None:
+        runnable = task.runnable
+        code = getattr(runnable, "__code__", None)
+        reference = [
+            getattr(runnable, "__module__", None),
+            getattr(runnable, "__qualname__", None),
+            code.co_code.hex() if code is not None else None,
+        ]
+    elif reference[0] == "function":
+        reference = list(reference) + [
+            get_source_hash(reference[1], reference[3]),
+        ]
+    definition = json.dumps(
+        [
+            CACHE_VERSION,
+            task.module,
+            task.name,
+            task.input_names,
+            task.optional_input_names,
+            task.provided_values,
+            reference,
+        ],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(definition.encode("utf-8")).hexdigest()
+
+
+def get_key(task, values):
+    """Get key of the entry of task run with values
+    :param task: taskgraph.task.Task
+    :param values: Dictionary of values given to the task
+    :return: Key as string or None if values can not be represented as JSON
+    """
+    try:
+        canonical = json.dumps(values, sort_keys=True)
+    except (TypeError, ValueError):
+        return None
+    return get_definition_hash(task) + ":" + \
+        hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def get(task, values):
+    """Find stored result of task run with values
+    :return: Tuple of True and result if found, False and None otherwise
+    """
+    global hits
+    global misses
+    key = get_key(task, values)
+    if key is None:
+        return False, None
+    now = time.time()
+    with lock:
+        db = get_connection()
+        row = db.execute(
+            "SELECT result, expires FROM results WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is not None and row[1] < now:
+            db.execute("DELETE FROM results WHERE key = ?", (key,))
+            db.commit()
+            row = None
+        if row is None:
+            misses += 1
+            return False, None
+        try:
+            result = pickle.loads(row[0])
+        except Exception as ex:
+            log.warning("Could not read cached result: " + str(ex))
+            db.execute("DELETE FROM results WHERE key = ?", (key,))
+            db.commit()
+            misses += 1
+            return False, None
+        db.execute(
+            "UPDATE results SET accessed = ? WHERE key = ?",
+            (now, key),
+        )
+        db.commit()
+        hits += 1
+    return True, result
+
+
+def put(task, values, result):
+    """Store result of task run with values for cacheTtl seconds.
+    Results which can not be pickled are not stored.
+    :return: True if result was stored
+    """
+    key = get_key(task, values)
+    if key is None:
+        return False
+    try:
+        data = pickle.dumps(result)
+    except Exception:
+        return False
+    if len(data) > max_size:
+        return False
+    now = time.time()
+    with lock:
+        db = get_connection()
+        db.execute(
+            "INSERT OR REPLACE INTO results "
+            "(key, task, result, size, created, expires, accessed) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                key,
+                task.name,
+                sqlite3.Binary(data),
+                len(data),
+                now,
+                now + task.cache_ttl,
+                now,
+            ),
+        )
+        evict(db)
+        db.commit()
+    return True
+
+
+def evict(db):
+    """Remove expired entries and least recently used entries
+    until the total size is at most max_size
+    """
+    db.execute("DELETE FROM results WHERE expires < ?", (time.time(),))
+    total = db.execute(
+        "SELECT COALESCE(SUM(size), 0) FROM results"
+    ).fetchone()[0]
+    if total <= max_size:
+        return
+    evicted = list()
+    for key, size in db.execute(
+        "SELECT key, size FROM results ORDER BY accessed, rowid"
+    ).fetchall():
+        if total <= max_size:
+            break
+        evicted.append((key,))
+        total -= size
+    db.executemany("DELETE FROM results WHERE key = ?", evicted)
+
+
+def get_stats():
+    """Get statistics of the cache.
+    The database is not opened when the cache is disabled.
+    :return: Dictionary
+    """
+    entries, size, expired = 0, 0, 0
+    if enabled:
+        with lock:
+            entries, size, expired = get_connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), "
+                "COALESCE(SUM(expires < ?), 0) FROM results",
+                (time.time(),),
+            ).fetchone()
+    return {
+        "file": get_cache_file(),
+        "enabled": enabled,
+        "entries": entries,
+        "size": size,
+        "max_size": max_size,
+        "expired": expired,
+        "hits": hits,
+        "misses": misses,
+    }
+
+
+def clear():
+    """Remove all entries, also when the cache is disabled.
+    The database is not created if it does not exist.
+    :return: Number of removed entries
+    """
+    with lock:
+        if connection is None and not os.path.exists(get_cache_file()):
+            return 0
+        db = get_connection()
+        count = db.execute("DELETE FROM results").rowcount
+        db.commit()
+    return count
+
+
+def reset():
+    global enabled
+    global cache_file
+    global max_size
+    global hits
+    global misses
+    close()
+    enabled = False
+    cache_file = None
+    max_size = DEFAULT_MAX_SIZE
+    hits = 0
+    misses = 0
+    source_hashes.clear()
@@ -0,0 +1,103 @@
+# This file is the tg command line entry point.
+# The command line is forwarded to taskgraph.daemon when it is running.
+# Otherwise the command is run in this process.
+# Only standard library is imported before that to keep forwarding fast.
+
+import json
+import os
+import pathlib
+import shutil
+import socket
+import sys
+
+
+# Arguments only affecting the process starting up, see taskgraph.main.
+# They are not forwarded to the daemon, which has started already.
+STARTUP_ARGUMENTS = ("--profile-startup", "--daemon")
+
+
+def get_socket_file():
+    # Same as taskgraph.daemon.get_socket_file without importing taskgraph
+    return str(pathlib.Path.home()) + "/.taskgraph/daemon.sock"
+
+
+def get_forwarded_arguments(argv):
+    """Leave out startup arguments, including --profile-startup=file
+    :param argv: Command line arguments including the program name
+    :return: List of arguments to be run by the daemon
+    """
+    return [
+        argument for argument in argv
+        if argument not in STARTUP_ARGUMENTS and
+        not argument.startswith(STARTUP_ARGUMENTS[0] + "=")
+    ]
+
+
+def forward(
+    argv,
+    environment,
+    cwd,
+    socket_file=None,
+    stdout=None,
+    stderr=None,
+):
+    """Run command in the daemon and write it's output
+
+    :param argv: Command line arguments including the program name
+    :param environment: Dictionary of environment variables
+    :param cwd: Working directory
+    :param socket_file: Unix domain socket of the daemon
+    :param stdout: Stream for standard output, defaults to sys.stdout
+    :param stderr: Stream for standard error, defaults to sys.stderr
+    :return: Exit status of the command or None when daemon is not running
+    """
+    if socket_file is None:
+        socket_file = get_socket_file()
+    if stdout is None:
+        stdout = sys.stdout
+    if stderr is None:
+        stderr = sys.stderr
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_file)
+    except OSError:
+        connection.close()
+        return None
+    exit_code = 1
+    with connection:
+        request = {
+            "argv": get_forwarded_arguments(argv),
+            "env": environment,
+            "cwd": cwd,
+        }
+        connection.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        for line in connection.makefile("rb"):
+            message = json.loads(line)
+            if "stdout" in message:
+                stdout.write(message["stdout"])
+                stdout.flush()
+            elif "stderr" in message:
+                stderr.write(message["stderr"])
+                stderr.flush()
+            elif "exit" in message:
+                exit_code = message["exit"]
+    return exit_code
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] != "--daemon":
+        environment = dict(os.environ)
+        if "COLUMNS" not in environment:
+            # Render task tree to the width of client's terminal
+            environment["COLUMNS"] = str(
+                shutil.get_terminal_size().columns,
+            )
+        exit_code = forward(sys.argv, environment, os.getcwd())
+        if exit_code is not None:
+            sys.exit(exit_code)
+    import taskgraph.main
+    taskgraph.main.main()
+
+
+if __name__ == "__main__":
+    main()
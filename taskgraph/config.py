@@ -1,15 +1,118 @@
 import configparser
-import git
 import glob
 import importlib.util
+import logging
 import os
 import pathlib
+import subprocess
+import sys
+import time
 
 import taskgraph.util
 
+log = logging.getLogger("taskgraph")
 
 external_module_dir = None
 log_dir = None
+daemon_session_lifetime = None
+workers = None
+engine = None
+max_processes = None
+process_workers = None
+result_cache = False
+result_cache_size = None
+max_results = None
+max_result_bytes = None
+result_indexes = None
+
+# Default time in seconds after which external modules
+# are refreshed from their git repository
+EXTERNAL_MODULES_TTL = 3600
+
+
+def get_taskgraph_dir():
+    """
+    Returns the directory holding user specific taskgraph files,
+    ~/.taskgraph
+    :return: Directory name as string without trailing slash
+    """
+    return str(pathlib.Path.home()) + "/.taskgraph"
+
+
+def get_stamp_file(checkout_dir):
+    """Returns the name of the file which' modification time tells
+    when external modules in checkout_dir were last refreshed
+    """
+    return os.path.dirname(checkout_dir) + "/." + \
+        os.path.basename(checkout_dir) + ".refreshed"
+
+
+def touch(filename):
+    with open(filename, "a"):
+        pass
+    os.utime(filename)
+
+
+def is_fresh(stamp_file, ttl):
+    try:
+        return time.time() - os.stat(stamp_file).st_mtime < ttl
+    except FileNotFoundError:
+        return False
+
+
+def clone_external_modules(repo_url, dest_directory):
+    """Clone git repo of external modules under dest_directory
+    :return: None
+    """
+    import git
+    repo = git.Git(dest_directory)
+    try:
+        repo.clone(repo_url)
+    except git.exc.GitCommandError as gegce:
+        log.warning("Could not clone " + repo_url + ": " + str(gegce))
+    finally:
+        # Clean up repo object
+        del(repo)
+
+
+def refresh_external_modules(checkout_dir):
+    """Fetch and fast forward external modules checkout
+    from it's upstream git repo.
+    :param checkout_dir: Directory of cloned external modules
+    :return: True if refresh succeeded
+    """
+    import git
+    repo = git.Git(checkout_dir)
+    try:
+        repo.fetch()
+        repo.merge("--ff-only", "@{upstream}")
+    except git.exc.GitCommandError as gegce:
+        log.warning(
+            "Could not refresh " + checkout_dir + ": " + str(gegce),
+        )
+        return False
+    finally:
+        del(repo)
+    touch(get_stamp_file(checkout_dir))
+    return True
+
+
+def start_background_refresh(checkout_dir):
+    """Run refresh_external_modules in a detached process
+    so that current invocation does not have to wait for it.
+    :param checkout_dir: Directory of cloned external modules
+    :return: subprocess.Popen of the started process
+    """
+    package_parent = pathlib.Path(__file__).parent.parent.resolve()
+    return subprocess.Popen(
+        [sys.executable, "-m", "taskgraph.config", "refresh", checkout_dir],
+        cwd=str(package_parent),
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
 
 def read_config_file():
     """
@@ -17,20 +120,43 @@ def read_config_file():
     and search for
     [taskgraph]
     externalModules = giturl
+    externalModulesTtl = seconds
+    daemonSessionLifetime = seconds
+    workers = number of threads running tasks
+    engine = asyncio
+    maxProcesses = number of commands running at the same time
+    processWorkers = number of processes running python tasks
+    resultCache = yes to store results of tasks having cacheTtl
+    resultCacheSize = maximum size of stored results in bytes
+    maxResults = number of results kept in memory
+    maxResultBytes = maximum size of results kept in memory in bytes
+    resultIndexes = comma separated input names results are indexed by
 
     in that config file.
     Creates ~/.taskgraph/externalModules/girepo directory
-    and clones given git url to that directory.
+    and clones given git url to that directory if it does not exist yet.
+    Existing clone is refreshed in background when it was last refreshed
+    more than externalModulesTtl seconds ago.
     Adds modules cloned from that to taskgraph
     :return: List of modules downloaded from git repo
     """
 
     global external_module_dir
     global log_dir
+    global daemon_session_lifetime
+    global workers
+    global engine
+    global max_processes
+    global process_workers
+    global result_cache
+    global result_cache_size
+    global max_results
+    global max_result_bytes
+    global result_indexes
 
     # Find the config file name
-    homedir = str(pathlib.Path.home())
-    config_file = homedir + "/.taskgraph/config"
+    taskgraph_dir = get_taskgraph_dir()
+    config_file = taskgraph_dir + "/config"
 
     if os.path.isfile(config_file) and \
        os.access(config_file, os.R_OK):
@@ -43,30 +169,90 @@ def read_config_file():
             repo_url = parser.get("taskgraph", "externalModules")
             # TODO: Add functionality to handle circumstances
             # on updates from one side or another
-            # TODO: Make sure git repo is not uselessly cloned
             if repo_url:
+                ttl = parser.getfloat(
+                    "taskgraph",
+                    "externalModulesTtl",
+                    fallback=EXTERNAL_MODULES_TTL,
+                )
                 # Create directory
-                dest_directory = homedir + "/.taskgraph/externalModules"
-                try:
-                    os.mkdir(dest_directory)
-                except:
-                    pass
-                # Clone git repo
-                repo = git.Git(dest_directory)
-                try:
-                    repo.clone(repo_url)
-                except git.exc.GitCommandError as gegce:
-                    pass
-                finally:
-                    # Clean up repo object
-                    del(repo)
+                dest_directory = taskgraph_dir + "/externalModules"
+                os.makedirs(dest_directory, exist_ok=True)
 
                 # Set externalModules to all modules
                 # to be included from that directory
                 module_name = taskgraph.util.get_basename_without_ext(repo_url)
-                if dest_directory[-1] != "/":
-                    dest_directory += "/"
-                external_module_dir = dest_directory + module_name
+                checkout_dir = dest_directory + "/" + module_name
+                stamp_file = get_stamp_file(checkout_dir)
+                if not os.path.isdir(checkout_dir):
+                    # Nothing to use before the first clone
+                    clone_external_modules(repo_url, dest_directory)
+                    touch(stamp_file)
+                elif not is_fresh(stamp_file, ttl):
+                    # Stamp before starting to prevent
+                    # several concurrent refreshes
+                    touch(stamp_file)
+                    start_background_refresh(checkout_dir)
+                external_module_dir = checkout_dir
+        except configparser.NoOptionError:
+            pass
+
+        # Seconds daemon keeps results of earlier commands
+        try:
+            daemon_session_lifetime = parser.getfloat(
+                "taskgraph",
+                "daemonSessionLifetime",
+            )
+        except configparser.NoOptionError:
+            pass
+
+        # Number of threads running independent tasks concurrently
+        try:
+            workers = parser.getint("taskgraph", "workers")
+        except configparser.NoOptionError:
+            pass
+
+        # Engine running commands of shell tasks
+        engine = parser.get("taskgraph", "engine", fallback=None)
+        try:
+            max_processes = parser.getint("taskgraph", "maxProcesses")
+        except configparser.NoOptionError:
+            pass
+
+        # Worker processes for task_func(executor="process") tasks
+        try:
+            process_workers = parser.getint("taskgraph", "processWorkers")
+        except configparser.NoOptionError:
+            pass
+
+        # Persistent result cache, see taskgraph.cache
+        result_cache = parser.getboolean(
+            "taskgraph",
+            "resultCache",
+            fallback=False,
+        )
+        try:
+            result_cache_size = parser.getint("taskgraph", "resultCacheSize")
+        except configparser.NoOptionError:
+            pass
+
+        # Limits of results kept in memory, see taskgraph.results.set_limits
+        try:
+            max_results = parser.getint("taskgraph", "maxResults")
+        except configparser.NoOptionError:
+            pass
+        try:
+            max_result_bytes = parser.getint("taskgraph", "maxResultBytes")
+        except configparser.NoOptionError:
+            pass
+
+        # Indexes of results, see taskgraph.results.set_indexes
+        try:
+            result_indexes = [
+                name.strip()
+                for name in parser.get("taskgraph", "resultIndexes").split(",")
+                if name.strip()
+            ]
         except configparser.NoOptionError:
             pass
 
@@ -78,3 +264,9 @@ def read_config_file():
                 log_dir = log_dir.format(**os.environ)
         except configparser.NoOptionError:
             pass
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "refresh":
+        if not refresh_external_modules(sys.argv[2]):
+            exit(1)
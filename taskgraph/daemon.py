@@ -0,0 +1,263 @@
+# This file takes care of running taskgraph as a resident daemon which
+# keeps registered tasks, values and results in memory between commands.
+# Commands are received over a unix domain socket from taskgraph.client.
+#
+# Protocol is newline separated json.
+# Client sends one request:
+#   {"argv": [...], "env": {...}, "cwd": "..."}
+# Daemon responds with any number of output messages
+#   {"stdout": "text"} or {"stderr": "text"}
+# and finally with the exit status of the command
+#   {"exit": 0}
+
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import threading
+import time
+import traceback
+
+import taskgraph.config
+import taskgraph.dag
+import taskgraph.inputs
+import taskgraph.modules
+import taskgraph.output
+import taskgraph.processpool
+import taskgraph.results
+import taskgraph.values
+
+log = logging.getLogger("taskgraph")
+
+# Default time in seconds results of earlier commands are reused
+DAEMON_SESSION_LIFETIME = 3600
+
+
+def get_socket_file():
+    return taskgraph.config.get_taskgraph_dir() + "/daemon.sock"
+
+
+def get_source_signature(sources):
+    """Get modification times and sizes of source files
+    to detect changed modules
+    """
+    signature = list()
+    for source in sources:
+        try:
+            stat = os.stat(source)
+            signature.append((source, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append((source, None, None))
+    return signature
+
+
+class SocketStream:
+    """File like object writing text as output messages to the client
+    """
+    def __init__(self, wfile, name):
+        self.wfile = wfile
+        self.name = name
+
+    def write(self, data):
+        if isinstance(data, bytes):
+            data = data.decode("utf-8", errors="replace")
+        if data:
+            self.wfile.write(
+                json.dumps({self.name: data}).encode("utf-8") + b"\n",
+            )
+        return len(data)
+
+    def flush(self):
+        self.wfile.flush()
+
+    def isatty(self):
+        return False
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        exit_code = self.server.run_request(json.loads(line), self.wfile)
+        self.wfile.write(
+            json.dumps({"exit": exit_code}).encode("utf-8") + b"\n",
+        )
+
+
+class Server(socketserver.UnixStreamServer):
+    """Serves one command at a time, since commands change working
+    directory and environment of the whole process.
+    """
+    def __init__(
+        self,
+        socket_file,
+        run,
+        load_modules=None,
+        session_lifetime=None,
+    ):
+        """
+        :param socket_file: File name of unix domain socket to listen
+        :param run: Function running the command with argv and
+            environment dictionary
+        :param load_modules: Function registering tasks again when
+            module files have changed. None to never reload.
+        :param session_lifetime: Seconds results are reused between commands
+        """
+        self.run = run
+        self.load_modules = load_modules
+        if session_lifetime is None:
+            session_lifetime = DAEMON_SESSION_LIFETIME
+        self.session_lifetime = session_lifetime
+        self.session_start = time.time()
+        # Environment of the previous command
+        self.environment = None
+        self.sources = taskgraph.modules.get_module_source_files(
+            taskgraph.config.external_module_dir,
+        )
+        self.source_signature = get_source_signature(self.sources)
+        remove_stale_socket(socket_file)
+        super().__init__(socket_file, RequestHandler)
+        os.chmod(socket_file, 0o600)
+
+    def check_session(self):
+        """Reload modules when they have changed and forget results
+        when session lifetime has passed
+        """
+        now = time.time()
+        if self.load_modules is not None:
+            signature = get_source_signature(self.sources)
+            if signature != self.source_signature:
+                log.info("Modules changed, registering tasks again")
+                taskgraph.dag.reset()
+                taskgraph.inputs.reset()
+                taskgraph.results.reset()
+                # Worker processes have imported the old modules
+                taskgraph.processpool.shutdown()
+                self.load_modules()
+                self.sources = taskgraph.modules.get_module_source_files(
+                    taskgraph.config.external_module_dir,
+                )
+                self.source_signature = get_source_signature(self.sources)
+                self.session_start = now
+        if now - self.session_start > self.session_lifetime:
+            taskgraph.results.clear()
+            self.session_start = now
+
+    def invalidate_environment(self, environment):
+        """Make results depending on environment variables which were
+        added, changed or removed since the previous command stale
+        :param environment: Dictionary of environment variables of the command
+        """
+        previous = self.environment
+        self.environment = dict(environment)
+        if previous is None:
+            return
+        for name in sorted(set(previous) | set(environment)):
+            if name not in previous or name not in environment or \
+               previous[name] != environment[name]:
+                taskgraph.values.invalidate(name)
+
+    def run_request(self, request, wfile):
+        """Run command in client's working directory and environment
+        with output forwarded to the client.
+        :return: Exit status of the command
+        """
+        self.check_session()
+        saved_environment = dict(os.environ)
+        saved_cwd = os.getcwd()
+        stdout = SocketStream(wfile, "stdout")
+        stderr = SocketStream(wfile, "stderr")
+        exit_code = 0
+        try:
+            os.environ.clear()
+            os.environ.update(request["env"])
+            os.chdir(request["cwd"])
+            # Values are given per command, results are kept
+            taskgraph.values.reset()
+            self.invalidate_environment(request["env"])
+            with taskgraph.output.redirected(stdout, stderr):
+                self.run(request["argv"], dict(request["env"]))
+        except SystemExit as se:
+            if se.code is None:
+                exit_code = 0
+            elif isinstance(se.code, int):
+                exit_code = se.code
+            else:
+                print(se.code, file=stderr)
+                exit_code = 1
+        except KeyboardInterrupt:
+            raise
+        except BaseException:
+            traceback.print_exc(file=stderr)
+            exit_code = 1
+        finally:
+            stdout.flush()
+            os.chdir(saved_cwd)
+            os.environ.clear()
+            os.environ.update(saved_environment)
+        return exit_code
+
+
+def remove_stale_socket(socket_file):
+    """Remove socket file left behind by a daemon which is not running
+    anymore.
+    """
+    if not os.path.exists(socket_file):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_file)
+    except OSError:
+        os.unlink(socket_file)
+    else:
+        raise OSError("Daemon already listening " + socket_file)
+    finally:
+        probe.close()
+
+
+def interrupt(signum, frame):
+    """Stop serving on SIGTERM like on KeyboardInterrupt"""
+    raise KeyboardInterrupt()
+
+
+def serve(run, load_modules=None, session_lifetime=None, socket_file=None):
+    """Serve commands until interrupted or terminated with SIGTERM.
+    The socket file is removed when serving stops.
+    :param run: Function running the command with argv and
+        environment dictionary
+    :param load_modules: Function registering tasks again when
+        module files have changed
+    :param session_lifetime: Seconds results are reused between commands
+    :param socket_file: File name of unix domain socket to listen
+    :return: None
+    """
+    if socket_file is None:
+        socket_file = get_socket_file()
+    os.makedirs(os.path.dirname(socket_file), exist_ok=True)
+    server = Server(
+        socket_file=socket_file,
+        run=run,
+        load_modules=load_modules,
+        session_lifetime=session_lifetime,
+    )
+    log.info("Listening " + socket_file)
+    # Signal handlers can only be set in the main thread
+    handle_signals = threading.current_thread() is threading.main_thread()
+    if handle_signals:
+        previous_handler = signal.signal(signal.SIGTERM, interrupt)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if handle_signals:
+            signal.signal(
+                signal.SIGTERM,
+                signal.SIG_DFL if previous_handler is None
+                else previous_handler,
+            )
+        server.server_close()
+        os.unlink(socket_file)
@@ -1,45 +1,447 @@
 import taskgraph.inputs
+import taskgraph.symbols
 # This file contains everything related to managing the directed asyclic graph
 # containing all the input names of all tasks and their names
+#
+# The graph has a node for each value name, both tasks and their inputs.
+# Edges point from an input to the tasks having that input.
+# The module level functions operate on default_graph.
 
 import logging
 log = logging.getLogger("taskgraph")
 
-# Dictionary containing set of all task names
-# which can be fulfilled by the inputs.
-# Key is inputs as frozenset.
-# Value is set of task names.
-task_names_by_complete_inputs = dict()
 
-# Dictionary of mandatory inputs by task name.
-# Key is task name
-# Value is a frozen set of inputs which can fulfill this task.
-mandatory_inputs_of_tasks = dict()
+class NoSuchTask(BaseException):
+    pass
 
-# Dictionary of optional inputs by task.
-# Key is task name
-# Value is a frozen set of inputs which can fulfill this task.
-optional_inputs_of_tasks = dict()
 
-# All tasks as set in value having single input as key
-tasks_having_input = dict()
+class CycleError(ValueError):
+    pass
 
-# Task by their name
-# Key is task name
-# Value is Task object itself
-tasks_by_name = dict()
 
-all_value_names = set()
+class TaskGraph():
+    """Tasks with forward and reverse adjacency, module membership and
+    topological order of all value names maintained on add and remove.
+    """
 
+    def __init__(self):
+        # Task by their name
+        # Key is task name
+        # Value is Task object itself
+        self.tasks_by_name = dict()
+
+        # Dictionary containing set of all task names
+        # which can be fulfilled by the inputs.
+        # Key is bitset of inputs, see taskgraph.symbols
+        # Value is set of task names.
+        self.task_names_by_complete_inputs = dict()
+
+        # Dictionary of mandatory inputs by task name.
+        # Key is task name
+        # Value is bitset of inputs which can fulfill this task.
+        self.mandatory_inputs_of_tasks = dict()
+
+        # Dictionary of optional inputs by task.
+        # Key is task name
+        # Value is list of optional inputs of this task.
+        self.optional_inputs_of_tasks = dict()
+
+        # Forward adjacency, tasks having the input.
+        # Key is input name, value is non empty set of task names
+        self.successors = dict()
+
+        # Reverse adjacency, mandatory and optional inputs of the task.
+        # Key is task name, value is set of input names
+        self.predecessors = dict()
+
+        # key is module name, value is set of tasks in module
+        self.tasks_by_modules = dict()
+
+        # key is task name, value is module name or None
+        self.module_of_task = dict()
+
+        self.all_task_names = set()
+        self.all_value_names = set()
+
+        # Position of each value name in topological order.
+        # Inputs always have lower position than tasks having them.
+        # Positions are unique but not contiguous.
+        self.order = dict()
+        self.next_position = 0
+
+        # Incremented on every add and remove to tell
+        # derived data has to be calculated again
+        self.version = 0
+
+        # Tasks which are not inputs to any other task
+        self.final_task_names = set()
+
+        # Tasks which are not inputs to any other task of the same module.
+        # Key is module name, value is set of task names
+        self.final_tasks_by_module = dict()
+
+        # Number of tasks in the same module having the task as input
+        # Key is task name, value is count
+        self.module_successor_counts = dict()
+
+        # Sources of available values.
+        # Key is value name, value is non empty set of sources
+        # like "environment", "commandLine" or "result"
+        self.value_sources = dict()
+
+        # Number of mandatory inputs which are neither available values
+        # nor runnable tasks. Key is task name, value is count
+        self.unsatisfied_counts = dict()
+
+        # Tasks which can be run with available values
+        self.runnable_task_names = set()
+
+    def add_node(self, name):
+        if name not in self.order:
+            self.order[name] = self.next_position
+            self.next_position += 1
+            self.all_value_names.add(name)
+
+    def discard_node(self, name):
+        """Remove value name which is neither a task nor an input anymore
+        """
+        if name not in self.all_task_names and name not in self.successors:
+            self.order.pop(name, None)
+            self.all_value_names.discard(name)
+
+    def visit(self, start, adjacency, is_included):
+        """Get nodes reachable from start through adjacency
+        :param start: Name of the node to start from
+        :param adjacency: Either successors or predecessors
+        :param is_included: Function telling whether node is to be visited
+        :return: List of visited nodes including start
+        """
+        visited = {start}
+        stack = [start]
+        while stack:
+            name = stack.pop()
+            for next_name in adjacency.get(name, ()):
+                if next_name not in visited and is_included(next_name):
+                    visited.add(next_name)
+                    stack.append(next_name)
+        return list(visited)
+
+    def find_cycle(self, name, input_names):
+        """Get input which the task of given name would depend on through
+        itself if the task had given inputs.
+        :return: Input name or None if no cycle would be created
+        """
+        if name in input_names:
+            return name
+        if name not in self.order:
+            # Nothing depends on the name yet
+            return None
+        position = self.order[name]
+        upper = position
+        for input in input_names:
+            if input in self.order:
+                upper = max(upper, self.order[input])
+        if upper == position:
+            # Order is already valid for all new edges
+            return None
+        # Only nodes between the task and it's inputs in topological
+        # order can be on the path from the task to an input
+        reachable = self.visit(
+            name,
+            self.successors,
+            lambda node: self.order[node] <= upper,
+        )
+        for input in input_names:
+            if input in reachable:
+                return input
+        return None
 
-all_task_names = set()
+    def add_edge(self, input, name):
+        """Add edge from input to task and restore topological order
+        with Pearce-Kelly algorithm. Edge must not create a cycle.
+        """
+        if input not in self.successors:
+            self.successors[input] = set()
+        self.successors[input].add(name)
+        self.predecessors[name].add(input)
+        lower = self.order[name]
+        upper = self.order[input]
+        if upper < lower:
+            return
+        forward = self.visit(
+            name,
+            self.successors,
+            lambda node: self.order[node] < upper,
+        )
+        backward = self.visit(
+            input,
+            self.predecessors,
+            lambda node: self.order[node] > lower,
+        )
+        forward.sort(key=self.order.get)
+        backward.sort(key=self.order.get)
+        nodes = backward + forward
+        positions = sorted(self.order[node] for node in nodes)
+        for node, position in zip(nodes, positions):
+            self.order[node] = position
+
+    def add(self, task, module=None):
+        """Add task to the graph replacing earlier task of the same name.
+        :raises CycleError: If task would depend on itself
+        """
+        name = task.name
+        inputs = taskgraph.symbols.intern_mask(task.input_names)
+        input_names = list(task.input_names) + \
+            list(task.optional_input_names)
+
+        cycle_input = self.find_cycle(name, input_names)
+        if cycle_input is not None:
+            raise CycleError(
+                "Task " + str(name) + " depends on itself through input " +
+                str(cycle_input),
+            )
+        if name in self.tasks_by_name:
+            self.remove(name)
+
+        self.version += 1
+        self.all_task_names.add(name)
+        self.tasks_by_name[name] = task
+        self.module_of_task[name] = module
+        if module:
+            if module not in self.tasks_by_modules:
+                self.tasks_by_modules[module] = set()
+            self.tasks_by_modules[module].add(name)
+
+        # task_names_by_complete_inputs
+        if inputs not in self.task_names_by_complete_inputs:
+            self.task_names_by_complete_inputs[inputs] = set()
+        self.task_names_by_complete_inputs[inputs].add(name)
+
+        # inputs_of_tasks
+        self.mandatory_inputs_of_tasks[name] = inputs
+        self.optional_inputs_of_tasks[name] = task.optional_input_names
+
+        for input in input_names:
+            self.add_node(input)
+        self.add_node(name)
+        self.predecessors[name] = set()
+        for input in input_names:
+            self.add_edge(input, name)
+        self.add_final_task(name, module)
+        self.add_runnable_task(name)
+
+    def remove(self, name):
+        """Remove task from the graph.
+        Input names stay as value names as long as some task has them.
+        :return: Removed task
+        """
+        if name not in self.tasks_by_name:
+            raise NoSuchTask(name)
+        self.remove_runnable_task(name)
+        self.remove_final_task(name)
+        task = self.tasks_by_name.pop(name)
+        self.version += 1
+        self.all_task_names.discard(name)
+
+        module = self.module_of_task.pop(name)
+        if module:
+            self.tasks_by_modules[module].discard(name)
+            if not self.tasks_by_modules[module]:
+                del self.tasks_by_modules[module]
+
+        inputs = self.mandatory_inputs_of_tasks.pop(name)
+        self.optional_inputs_of_tasks.pop(name)
+        self.task_names_by_complete_inputs[inputs].discard(name)
+        if not self.task_names_by_complete_inputs[inputs]:
+            del self.task_names_by_complete_inputs[inputs]
+
+        for input in self.predecessors.pop(name):
+            self.successors[input].discard(name)
+            if not self.successors[input]:
+                del self.successors[input]
+            self.discard_node(input)
+        self.discard_node(name)
+        return task
+
+    def add_final_task(self, name, module):
+        """Update final task indexes when task has been added
+        """
+        if name not in self.successors:
+            self.final_task_names.add(name)
+        for input in self.predecessors[name]:
+            self.final_task_names.discard(input)
+        if not module:
+            return
+        if module not in self.final_tasks_by_module:
+            self.final_tasks_by_module[module] = set()
+        count = 0
+        for successor in self.successors.get(name, ()):
+            if self.module_of_task[successor] == module:
+                count += 1
+        self.module_successor_counts[name] = count
+        if count == 0:
+            self.final_tasks_by_module[module].add(name)
+        for input in self.predecessors[name]:
+            if self.module_of_task.get(input) == module:
+                self.module_successor_counts[input] += 1
+                self.final_tasks_by_module[module].discard(input)
+
+    def remove_final_task(self, name):
+        """Update final task indexes before task is removed
+        """
+        self.final_task_names.discard(name)
+        for input in self.predecessors[name]:
+            if input in self.tasks_by_name and \
+               self.successors[input] == {name}:
+                self.final_task_names.add(input)
+        module = self.module_of_task[name]
+        if not module:
+            return
+        del self.module_successor_counts[name]
+        final_tasks = self.final_tasks_by_module[module]
+        final_tasks.discard(name)
+        for input in self.predecessors[name]:
+            if self.module_of_task.get(input) == module:
+                self.module_successor_counts[input] -= 1
+                if self.module_successor_counts[input] == 0:
+                    final_tasks.add(input)
+        if not final_tasks:
+            del self.final_tasks_by_module[module]
+
+    def is_satisfied(self, name):
+        """Check value is available or can be produced by running tasks
+        """
+        return name in self.value_sources or name in self.runnable_task_names
+
+    def propagate_satisfied(self, name, satisfied):
+        """Update tasks having name as mandatory input after name has
+        become satisfied or unsatisfied. Only tasks whose runnability
+        changes are visited further.
+        """
+        stack = [(name, satisfied)]
+        while stack:
+            name, satisfied = stack.pop()
+            for task in self.successors.get(name, ()):
+                if not taskgraph.symbols.has(
+                    self.mandatory_inputs_of_tasks[task],
+                    name,
+                ):
+                    continue
+                was_satisfied = self.is_satisfied(task)
+                if satisfied:
+                    self.unsatisfied_counts[task] -= 1
+                else:
+                    self.unsatisfied_counts[task] += 1
+                if self.unsatisfied_counts[task] == 0:
+                    self.runnable_task_names.add(task)
+                else:
+                    self.runnable_task_names.discard(task)
+                is_satisfied = self.is_satisfied(task)
+                if is_satisfied != was_satisfied:
+                    stack.append((task, is_satisfied))
+
+    def add_runnable_task(self, name):
+        """Update satisfiability index when task has been added
+        """
+        was_satisfied = self.is_satisfied(name)
+        count = 0
+        for input in taskgraph.symbols.get_names(
+            self.mandatory_inputs_of_tasks[name],
+        ):
+            if not self.is_satisfied(input):
+                count += 1
+        self.unsatisfied_counts[name] = count
+        if count == 0:
+            self.runnable_task_names.add(name)
+        if self.is_satisfied(name) != was_satisfied:
+            self.propagate_satisfied(name, not was_satisfied)
+
+    def remove_runnable_task(self, name):
+        """Update satisfiability index before task is removed
+        """
+        was_satisfied = self.is_satisfied(name)
+        del self.unsatisfied_counts[name]
+        self.runnable_task_names.discard(name)
+        if self.is_satisfied(name) != was_satisfied:
+            self.propagate_satisfied(name, not was_satisfied)
+
+    def set_value_available(self, name, source):
+        """Mark value available from source
+        :param name: Value name
+        :param source: Where the value comes from, like "environment"
+        """
+        was_satisfied = self.is_satisfied(name)
+        if name not in self.value_sources:
+            self.value_sources[name] = set()
+        self.value_sources[name].add(source)
+        if not was_satisfied:
+            self.propagate_satisfied(name, True)
+
+    def set_value_unavailable(self, name, source):
+        """Mark value not available from source anymore
+        """
+        if source not in self.value_sources.get(name, ()):
+            return
+        self.value_sources[name].discard(source)
+        if not self.value_sources[name]:
+            del self.value_sources[name]
+            if not self.is_satisfied(name):
+                self.propagate_satisfied(name, False)
+
+    def clear_value_source(self, source):
+        """Mark all values from source not available
+        """
+        for name in list(self.value_sources):
+            self.set_value_unavailable(name, source)
+
+    def get_runnable_tasks(self, module=None):
+        """Get tasks which can be run with available values,
+        running the tasks providing their inputs first if needed.
+        :param module: Module name, None for all tasks
+        :return: Set of task names
+        """
+        if module is None:
+            return set(self.runnable_task_names)
+        return self.runnable_task_names & self.tasks_by_modules[module]
+
+    def is_task(self, name):
+        return name in self.tasks_by_name
+
+    def get_task(self, name):
+        try:
+            return self.tasks_by_name[name]
+        except KeyError as ke:
+            raise(NoSuchTask(ke))
 
-# key is module name, value is set of tasks in module
-tasks_by_modules = dict()
+    def get_tasks_having_input(self, input_name):
+        return self.successors.get(input_name, set())
 
+    def get_inputs(self, task_name):
+        return self.predecessors.get(task_name, set())
 
-class NoSuchTask(BaseException):
-    pass
+    def get_modules(self):
+        return sorted(self.tasks_by_modules.keys())
+
+    def get_topological_order(self, names=None):
+        """Get value names ordered so that inputs are before tasks
+        having them.
+        :param names: Value names to order, defaults to all of them
+        :return: List of value names
+        """
+        if names is None:
+            names = self.all_value_names
+        return sorted(names, key=self.order.__getitem__)
+
+    def final_tasks(self, module=None):
+        """Get all tasks which are not inputs to any other task
+        in the module, or in the whole graph when module is None.
+        """
+        if module is None:
+            return set(self.final_task_names)
+        return set(self.final_tasks_by_module[module])
+
+
+default_graph = TaskGraph()
 
 
 def add(module, task):
@@ -47,110 +449,70 @@ def add(module, task):
     Adding a task will enable bookkeeper to track name and inputs
     and retrieve the task based on those
     """
-    global all_task_names
-    global task_names_by_complete_inputs
-    global mandatory_inputs_of_tasks
-    global optional_inputs_of_tasks
-    global tasks_by_name
-    global all_value_names
-    global tasks_having_input
-    global tasks_by_modules
-
-    name = task.name
     taskgraph.inputs.add_input_names(module, task.input_names)
     taskgraph.inputs.add_input_names(module, task.optional_input_names)
+    default_graph.add(task, module)
+
 
-    if module:
-        if not module in tasks_by_modules:
-            tasks_by_modules[module] = set()
-        tasks_by_modules[module].add(name)
+def get_graph():
+    return default_graph
 
-    inputs = frozenset(tuple(task.input_names))
 
-    all_task_names.add(name)
-    all_value_names.add(name)
-    all_value_names.update(inputs)
-    all_value_names.update(frozenset(tuple(task.optional_input_names)))
+def remove(name):
+    return default_graph.remove(name)
 
-    # task_names_by_complete_inputs
-    if inputs not in task_names_by_complete_inputs:
-        task_names_by_complete_inputs[inputs] = set()
-    task_names_by_complete_inputs[inputs].add(name)
 
-    # inputs_of_tasks
-    mandatory_inputs_of_tasks[name] = inputs
-    optional_inputs_of_tasks[name] = task.optional_input_names
+def reset():
+    """Empty all values from dag
+    :return:
+    """
+    global default_graph
+    default_graph = TaskGraph()
 
-    # tasks_having_input
-    for input in task.input_names + task.optional_input_names:
-        if input not in tasks_having_input:
-            tasks_having_input[input] = set()
-        tasks_having_input[input].add(name)
 
-    # tasks by name
-    tasks_by_name[name] = task
+def get_state():
+    """Get all bookkeeping of dag to be stored
+    :return: Dictionary of dag contents
+    """
+    return {"graph": default_graph}
 
 
-def reset():
-    """Empty all values from dag
+def set_state(state):
+    """Replace all bookkeeping of dag with state returned by get_state
+    :param state: Dictionary of dag contents
     :return:
     """
-    global task_names_by_complete_inputs
-    global mandatory_inputs_of_tasks
-    global optional_inputs_of_tasks
-    global tasks_having_input
-    global tasks_by_name
-    global all_value_names
-    global all_task_names
-    global tasks_by_modules
-    task_names_by_complete_inputs = dict()
-    mandatory_inputs_of_tasks = dict()
-    optional_inputs_of_tasks = dict()
-    tasks_having_input = dict()
-    tasks_by_name = dict()
-    all_value_names = set()
-    all_task_names = set()
-    tasks_by_modules = dict()
+    global default_graph
+    default_graph = state["graph"]
+
 
 def is_task(name):
-    global tasks_by_name
-    return name in tasks_by_name
+    return default_graph.is_task(name)
+
 
 def get_all_value_names():
-    global all_value_names
-    return all_value_names
+    return default_graph.all_value_names
 
 
 def get_all_task_names():
-    global all_task_names
-    return all_task_names
+    return default_graph.all_task_names
 
 
 def get_default_input_name(task_name):
-    task = get_task(task_name)
-    if not task:
+    if not is_task(task_name):
         return None
-    return task.default_input
+    return get_task(task_name).default_input
 
 
 def get_tasks_having_input(input_name):
-    global tasks_having_input
-    try:
-        return tasks_having_input[input_name]
-    except KeyError:
-        return set()
+    return default_graph.get_tasks_having_input(input_name)
 
 
 def get_task(name):
     """Retrieves the task based on it's name and all non-optional inputs
        Returns None if not found
     """
-    global tasks_by_name
-
-    try:
-        return tasks_by_name[name]
-    except KeyError as ke:
-        raise(NoSuchTask(ke))
+    return default_graph.get_task(name)
 
 
 def run_task(name, values):
@@ -158,30 +520,31 @@ def run_task(name, values):
 
 
 def get_modules():
-    global tasks_by_modules
-    return sorted(tasks_by_modules.keys())
+    return default_graph.get_modules()
+
+
+def get_topological_order(names=None):
+    return default_graph.get_topological_order(names)
+
+
+def set_value_available(name, source):
+    default_graph.set_value_available(name, source)
+
+
+def set_value_unavailable(name, source):
+    default_graph.set_value_unavailable(name, source)
+
+
+def clear_value_source(source):
+    default_graph.clear_value_source(source)
+
+
+def get_runnable_tasks(module=None):
+    return default_graph.get_runnable_tasks(module)
 
 
 def final_tasks(module=None):
     """Get all tasks which are not inputs to any other task
 
     """
-    global tasks_by_modules
-    global mandatory_inputs_of_tasks
-    global optional_inputs_of_tasks
-
-    if module is None:
-        tasks = mandatory_inputs_of_tasks
-    else:
-        tasks = sorted(tasks_by_modules[module])
-
-    all_tasks = set()
-    all_inputs = set()
-    for task in tasks:
-        all_tasks.add(task)
-        all_inputs.update(mandatory_inputs_of_tasks[task])
-        try:
-            all_inputs.update(optional_inputs_of_tasks[task])
-        except BaseException as be:
-            logging.exception(be)
-    return all_tasks - all_inputs
+    return default_graph.final_tasks(module)
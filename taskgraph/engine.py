@@ -0,0 +1,137 @@
+# This file takes care of running shell commands of tasks with asyncio.
+#
+# When enabled, an event loop runs in a background thread and
+# taskgraph.task.run_commands hands the commands of each shell task over to
+# it. Output of all running commands is read by the same loop and written
+# to the Logger of the task. The number of processes running at the same
+# time is limited with a single semaphore shared by all tasks.
+# Tasks run by several threads, see taskgraph.executor, can therefore have
+# their commands running concurrently.
+
+import asyncio
+import logging
+import threading
+
+import taskgraph.task
+
+log = logging.getLogger("taskgraph")
+
+READ_SIZE = 8192
+
+# Default maximum number of processes running at the same time
+DEFAULT_MAX_PROCESSES = 8
+
+max_processes = DEFAULT_MAX_PROCESSES
+
+# Event loop running commands and the thread running it
+loop = None
+loop_thread = None
+
+# Semaphore limiting the number of running processes
+process_semaphore = None
+
+
+def is_enabled():
+    return loop is not None
+
+
+def enable(processes=None):
+    """Start event loop running commands of shell tasks
+    :param processes: Maximum number of processes running at the same time
+    :return: None
+    """
+    global loop
+    global loop_thread
+    global max_processes
+    global process_semaphore
+    if processes is not None:
+        max_processes = max(1, int(processes))
+    if loop is not None:
+        disable()
+    loop = asyncio.new_event_loop()
+    process_semaphore = asyncio.Semaphore(max_processes)
+    loop_thread = threading.Thread(
+        target=loop.run_forever,
+        name="taskgraph-engine",
+        daemon=True,
+    )
+    loop_thread.start()
+
+
+def disable():
+    """Stop event loop. Commands are run with taskgraph.task.run_commands
+    after this.
+    :return: None
+    """
+    global loop
+    global loop_thread
+    global process_semaphore
+    if loop is None:
+        return
+    loop.call_soon_threadsafe(loop.stop)
+    loop_thread.join()
+    loop.close()
+    loop = None
+    loop_thread = None
+    process_semaphore = None
+
+
+async def read_stream(stream, write):
+    while True:
+        data = await stream.read(READ_SIZE)
+        if not data:
+            break
+        write(data)
+
+
+async def run_command(logger, command):
+    """Run single shell command with it's output written to logger
+    :return: Exit status of the command
+    """
+    async with process_semaphore:
+        logger.command(bytes(command, "utf-8"))
+        process = await asyncio.create_subprocess_shell(
+            command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        logger.pid(process.pid)
+        await asyncio.gather(
+            read_stream(process.stdout, logger.stdout),
+            read_stream(process.stderr, logger.stderr),
+        )
+        returncode = await process.wait()
+    logger.exitcode(returncode)
+    return returncode
+
+
+async def run_commands_async(logger, commands):
+    """Run commands one after another like taskgraph.task.run_commands
+    :param logger: taskgraph.results.Logger of the task
+    :param commands: List of shell command lines
+    :return: Output of the commands
+    :raises taskgraph.task.FailedCommand: On non-zero exit status
+    """
+    for command in commands:
+        command = command.strip()
+        if command:
+            returncode = await run_command(logger, command)
+            if returncode:
+                raise taskgraph.task.FailedCommand(
+                    "Command \"" + command + "\" exit code: " +
+                    str(returncode)
+                )
+    return logger.close()
+
+
+def run_commands(logger, commands):
+    """Run commands in the event loop and wait for them to complete.
+    Called from the thread running the task.
+    """
+    if threading.current_thread() is loop_thread:
+        raise RuntimeError("Commands can not be waited in the event loop")
+    future = asyncio.run_coroutine_threadsafe(
+        run_commands_async(logger, commands),
+        loop,
+    )
+    return future.result()
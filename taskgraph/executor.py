@@ -0,0 +1,306 @@
+# This file takes care of running independent inputs of ValueTasks
+# and independent steps of execution plans concurrently in a pool of
+# worker threads.
+#
+# The tree of ValueTasks is flattened to the order tasks would be run
+# one after another. Each task becomes ready as soon as it's ValueTask
+# inputs are completed and ready tasks are started in the order of the
+# schedule whenever a worker is free. Results added by each task are
+# collected to a separate buffer and added to results_in_order in the
+# sequential order, so that reporting does not depend on timing.
+
+import concurrent.futures
+import heapq
+import logging
+
+import taskgraph.plan
+import taskgraph.results
+import taskgraph.runner
+
+log = logging.getLogger("taskgraph")
+
+# Default number of worker threads. One runs tasks sequentially.
+DEFAULT_WORKERS = 1
+
+workers = DEFAULT_WORKERS
+
+# Order of starting tasks which are ready to be run.
+# Critical path starts first the tasks on the longest path to the target
+# estimated with durations of earlier runs.
+# Fifo starts tasks in the order they become ready.
+CRITICAL_PATH = "critical-path"
+FIFO = "fifo"
+SCHEDULES = (CRITICAL_PATH, FIFO)
+
+schedule = CRITICAL_PATH
+
+
+def set_workers(count):
+    """Set the number of worker threads running tasks
+    :param count: Number of threads, 1 to run tasks sequentially
+    :return: None
+    """
+    global workers
+    workers = max(1, int(count))
+
+
+def set_schedule(name):
+    """Set the order of starting ready tasks
+    :param name: One of SCHEDULES
+    :return: None
+    """
+    global schedule
+    if name not in SCHEDULES:
+        raise ValueError(
+            "Unknown schedule " + str(name) + ", expected one of " +
+            ", ".join(SCHEDULES),
+        )
+    schedule = name
+
+
+def is_parallel():
+    return workers > 1
+
+
+class Node():
+    """Task to be run with the indexes of the nodes of it's inputs.
+    Either ValueTask or arguments of a plan step, see taskgraph.plan.
+    """
+    def __init__(self, task, value_task=None, arguments=None):
+        self.task = task
+        self.value_task = value_task
+        self.arguments = arguments
+        # List of (input name, node index) pairs in order of values
+        self.inputs = list()
+        # Indexes of nodes having this node as input
+        self.dependents = list()
+        self.pending = 0
+
+
+def get_nodes(value_task):
+    """Flatten tree of ValueTasks to the order they would be run
+    sequentially. Equal ValueTasks are run only once.
+
+    :param value_task: ValueTask at the root of the tree
+    :return: List of Nodes, root being the last
+    """
+    nodes = list()
+    indexes_by_value_task = dict()
+    indexes_by_id = dict()
+
+    def get_index(value_task):
+        try:
+            return indexes_by_value_task.get(value_task)
+        except TypeError:
+            # Values are not hashable, compare by identity
+            return indexes_by_id.get(id(value_task))
+
+    # Nodes whose ValueTask inputs are being added as pairs of Node and
+    # index of next input. Inputs are added before the node having them.
+    stack = [(Node(value_task.task, value_task=value_task), 0)]
+    while stack:
+        node, index = stack.pop()
+        if get_index(node.value_task) is not None:
+            continue
+        input_names = node.value_task.input_value_tasks
+        while index < len(input_names):
+            input_value = node.value_task.values[input_names[index]]
+            input_index = get_index(input_value)
+            if input_index is None:
+                break
+            node.inputs.append((input_names[index], input_index))
+            index += 1
+        if index < len(input_names):
+            # Add node of the input and check it again
+            stack.append((node, index))
+            input_node = Node(input_value.task, value_task=input_value)
+            stack.append((input_node, 0))
+            continue
+        index = len(nodes)
+        nodes.append(node)
+        try:
+            indexes_by_value_task[node.value_task] = index
+        except TypeError:
+            indexes_by_id[id(node.value_task)] = index
+        for input_index in set(index for _, index in node.inputs):
+            nodes[input_index].dependents.append(index)
+            node.pending += 1
+    return nodes
+
+
+def get_step_nodes(steps):
+    """Get nodes of steps of a plan
+    :param steps: Steps returned by taskgraph.plan.compile_plan
+    :return: List of Nodes in the order of steps
+    """
+    nodes = list()
+    for task, arguments in steps:
+        node = Node(task, arguments=arguments)
+        index = len(nodes)
+        nodes.append(node)
+        for input_name, position in arguments:
+            if position is not None:
+                node.inputs.append((input_name, position))
+        for input_index in set(position for _, position in node.inputs):
+            nodes[input_index].dependents.append(index)
+            node.pending += 1
+    return nodes
+
+
+def get_remaining_durations(nodes):
+    """Estimate the duration of the longest path from each node to the
+    target including the node itself. Tasks without earlier runs are
+    estimated to take the mean duration of the tasks with them.
+
+    :param nodes: List of Nodes returned by get_nodes
+    :return: List of durations in seconds by node index
+    """
+    expected = list()
+    for node in nodes:
+        expected.append(
+            taskgraph.results.get_expected_duration(node.task),
+        )
+    known = [duration for duration in expected if duration is not None]
+    default = sum(known) / len(known) if known else 0.0
+    remaining = [0.0] * len(nodes)
+    # Dependents always come after the node
+    for index in range(len(nodes) - 1, -1, -1):
+        longest = 0.0
+        for dependent in nodes[index].dependents:
+            longest = max(longest, remaining[dependent])
+        duration = expected[index]
+        if duration is None:
+            duration = default
+        remaining[index] = duration + longest
+    return remaining
+
+
+def run_value_task_node(node, node_results):
+    """Run the ValueTask of the node
+    :return: Result of the task
+    """
+    result = None
+    values = dict(node.value_task.values)
+    for input_name, index in node.inputs:
+        values[input_name] = node_results[index]
+        # Last evaluated input is the result of tasks without runnable
+        result = node_results[index]
+    return node.value_task.run_task(values, result)
+
+
+def run_buffered(run, node, node_results):
+    """Run node in worker thread
+    :return: Tuple of task result and results added while running it
+    """
+    buffer = list()
+    with taskgraph.results.buffered(buffer):
+        result = run(node, node_results)
+    return result, buffer
+
+
+def run_value_task(value_task):
+    """Run ValueTask and all of it's ValueTask inputs,
+    independent inputs concurrently.
+
+    :param value_task: ValueTask to be run
+    :return: Result of the value_task
+    """
+    nodes = get_nodes(value_task)
+    node_results = run_nodes(nodes, run_value_task_node)
+    return node_results[len(nodes) - 1]
+
+
+def run_steps(steps, values):
+    """Run steps of a plan, independent steps concurrently.
+
+    :param steps: Steps returned by taskgraph.plan.compile_plan
+    :param values: Dictionary of available values
+    :return: List of results of steps
+    """
+    def run_step(node, node_results):
+        return taskgraph.plan.run_step(
+            node.task,
+            node.arguments,
+            values,
+            node_results,
+        )
+
+    node_results = run_nodes(get_step_nodes(steps), run_step)
+    return [node_results[index] for index in range(len(steps))]
+
+
+def run_nodes(nodes, run):
+    """Run nodes in worker threads starting each as soon as it's inputs
+    have been completed
+
+    :param nodes: List of Nodes, inputs before nodes having them
+    :param run: Function called with node and results of completed nodes
+        returning result of the node
+    :return: Dictionary of results by node index
+    """
+    if schedule == CRITICAL_PATH:
+        remaining = get_remaining_durations(nodes)
+    node_results = dict()
+    buffers = dict()
+    merged_count = 0
+    error = None
+    # Heap of ready nodes as (priority, index) pairs
+    ready = list()
+    ready_count = 0
+
+    def add_ready(index):
+        nonlocal ready_count
+        if schedule == CRITICAL_PATH:
+            priority = -remaining[index]
+        else:
+            priority = ready_count
+        ready_count += 1
+        heapq.heappush(ready, (priority, index))
+
+    for index, node in enumerate(nodes):
+        if node.pending == 0:
+            add_ready(index)
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=workers,
+    ) as pool:
+        running = dict()
+        while ready or running:
+            # Start as many tasks as there are workers
+            while ready and len(running) < workers and error is None:
+                _, index = heapq.heappop(ready)
+                future = pool.submit(
+                    run_buffered,
+                    run,
+                    nodes[index],
+                    node_results,
+                )
+                running[future] = index
+            if not running:
+                break
+            done, _ = concurrent.futures.wait(
+                running,
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            for future in done:
+                index = running.pop(future)
+                try:
+                    node_results[index], buffers[index] = future.result()
+                except BaseException as be:
+                    # Let running tasks finish but do not start new ones
+                    if error is None:
+                        error = be
+                    continue
+                for dependent in nodes[index].dependents:
+                    nodes[dependent].pending -= 1
+                    if nodes[dependent].pending == 0:
+                        add_ready(dependent)
+            # Merge results in the order of sequential execution
+            while merged_count in buffers:
+                taskgraph.results.merge(buffers.pop(merged_count))
+                merged_count += 1
+    # Keep results of tasks which completed after failed one
+    for index in sorted(buffers):
+        taskgraph.results.merge(buffers[index])
+    if error is not None:
+        raise error
+    return node_results
@@ -1,6 +1,11 @@
 import logging
 log = logging.getLogger("taskgraph")
 
+import taskgraph.symbols
+
+# Simple input name by each of it's aliases, both as symbol ids.
+# Key is id of input name or module prefixed alias of it.
+# Value is id of the input name itself.
 all_input_names = dict()
 
 
@@ -16,32 +21,43 @@ def add_input_names(module, inputs):
                     module + '_' + input,
                 ],
             )
+        input_id = taskgraph.symbols.intern(input)
         for key in keynames:
-            if not key in all_input_names:
-                all_input_names[key] = input
+            key_id = taskgraph.symbols.intern(key)
+            if not key_id in all_input_names:
+                all_input_names[key_id] = input_id
 
 
 def get_all_input_names():
-    return frozenset(all_input_names.keys())
+    return frozenset(
+        taskgraph.symbols.get_name(key_id) for key_id in all_input_names
+    )
 
 def is_input(input):
     global all_input_names
-    result = False
-    if input in all_input_names:
-        result = True
-    return result
+    return taskgraph.symbols.get_id(input) in all_input_names
 
 
 def get_simple_values(module, values):
     global all_input_names
     result = {}
     for input_name in values:
-        if all_input_names[input_name]:
-            simple_input_name = all_input_names[input_name]
+        input_id = all_input_names[taskgraph.symbols.get_id(input_name)]
+        simple_input_name = taskgraph.symbols.get_name(input_id)
+        if simple_input_name:
             result[simple_input_name] = values[input_name]
     return result
 
 
+def get_state():
+    return {"all_input_names": all_input_names}
+
+
+def set_state(state):
+    global all_input_names
+    all_input_names = state["all_input_names"]
+
+
 def reset():
     global all_input_names
-    all_input_names = dict()
\ No newline at end of file
+    all_input_names = dict()
@@ -1,7 +1,5 @@
 #! /usr/bin/env python3
 
-import glob
-import importlib.util
 import json
 import logging
 import os
@@ -17,101 +15,237 @@ log.setLevel(1)
 
 
 import taskgraph.ascii
+import taskgraph.cache
 import taskgraph.util
 import taskgraph.config
+import taskgraph.engine
+import taskgraph.executor
 import taskgraph.values
 import taskgraph.results
 import taskgraph.runner
 import taskgraph.modules
+import taskgraph.output
+import taskgraph.overview
+import taskgraph.processpool
 
-colorama.init(autoreset=True)
-
-# TODO: Use same scheme as below with reading external modules so that
-#  we can import them with full name
-# https://stackoverflow.com/questions/67631/how-can-i-import-a-module-dynamically-given-the-full-path
+import taskgraph.daemon
+import taskgraph.profile
 
-taskgraph.modules.refresh_path_executables()
+colorama.init(autoreset=True)
 
-from taskgraph.modules.python import *
+PROFILE_ARGUMENT = "--profile-startup"
+SCHEDULE_ARGUMENT = "--schedule"
+RUNNABLE_ARGUMENT = "--runnable"
+CACHE_STATS_ARGUMENT = "--cache-stats"
+CACHE_CLEAR_ARGUMENT = "--cache-clear"
 
-taskgraph.config.read_config_file()
 
-# Read and import external json modules
-if taskgraph.config.external_module_dir:
-    # Read and import external python modules
-    for path in glob.glob(taskgraph.config.external_module_dir + "/python/*.py"):
-        module_name = taskgraph.util.get_basename_without_ext(path)
-        spec = importlib.util.spec_from_file_location(module_name, path)
-        module = importlib.util.module_from_spec(spec)
-        sys.modules[module_name] = module
-        spec.loader.exec_module(module)
-    # Read and register external json modules
-    taskgraph.modules.register_json_modules(
-        directory=taskgraph.config.external_module_dir + "/json",
-    )
+def enable_startup_profiling():
+    """Enable startup profiling when requested with --profile-startup
+    argument or TASKGRAPH_PROFILE_STARTUP environment variable.
+    Either can define a file the report is appended to with
+    --profile-startup=file or TASKGRAPH_PROFILE_STARTUP=file.
+    Report is written to stderr otherwise.
+    The argument is removed from sys.argv.
+    :return: None
+    """
+    requested = False
+    destination = None
+    environment_value = os.environ.get("TASKGRAPH_PROFILE_STARTUP")
+    if environment_value:
+        requested = True
+        if environment_value != "1":
+            destination = environment_value
+    i = 1
+    while i < len(sys.argv):
+        argument = sys.argv[i]
+        if argument == PROFILE_ARGUMENT or \
+           argument.startswith(PROFILE_ARGUMENT + "="):
+            requested = True
+            if '=' in argument:
+                destination = argument[len(PROFILE_ARGUMENT) + 1:]
+            sys.argv.pop(i)
+        else:
+            i += 1
+    if requested:
+        taskgraph.profile.enable(destination)
 
 
-# Read and import json modules
-taskgraph.modules.register_json_modules()
+def get_schedule_argument(argv):
+    """Find --schedule=critical-path|fifo argument
+    :param argv: Command line arguments
+    :return: Tuple of arguments without the schedule argument and
+        schedule name or None if not given
+    """
+    schedule = None
+    remaining = list()
+    for argument in argv:
+        if argument.startswith(SCHEDULE_ARGUMENT + "="):
+            schedule = argument[len(SCHEDULE_ARGUMENT) + 1:]
+        else:
+            remaining.append(argument)
+    return remaining, schedule
 
 
-def get_task_tree_aligned(values, module=None, columns=None):
-    tasks = taskgraph.dag.final_tasks(module)
-    aligned_texts = list()
+def load_modules():
+    """Find executables in PATH and register tasks from python and
+    json modules including external modules
+    """
+    with taskgraph.profile.phase("path_scan"):
+        taskgraph.modules.refresh_path_executables()
 
-    for task_name in tasks:
-        # Get text tree for the task
-        asciitree = taskgraph.util.get_asciitree(
-            task=taskgraph.dag.get_task(task_name),
-            values=values,
-        )
-        text = asciitree.get_tree(width=columns)
-        # Align tree
-        aligned_task = taskgraph.ascii.AlignedText(text=text)
-        # Set aligned column at the start of the task name
-        aligned_task.set_aligned_column(
-            aligned_task.get_width() - len(task_name),
+    with taskgraph.profile.phase("config"):
+        taskgraph.config.read_config_file()
+    if taskgraph.config.workers is not None:
+        taskgraph.executor.set_workers(taskgraph.config.workers)
+    if taskgraph.config.engine == "asyncio":
+        taskgraph.engine.enable(taskgraph.config.max_processes)
+    if taskgraph.config.process_workers is not None:
+        taskgraph.processpool.set_processes(taskgraph.config.process_workers)
+    if taskgraph.config.max_results is not None or \
+       taskgraph.config.max_result_bytes is not None:
+        taskgraph.results.set_limits(
+            taskgraph.config.max_results,
+            taskgraph.config.max_result_bytes,
         )
-        aligned_texts.append(aligned_task)
-    return aligned_texts
+    if taskgraph.config.result_indexes is not None:
+        taskgraph.results.set_indexes(taskgraph.config.result_indexes)
+    if taskgraph.config.result_cache:
+        taskgraph.cache.enable(taskgraph.config.result_cache_size)
+
+    taskgraph.modules.register_modules(
+        external_module_dir=taskgraph.config.external_module_dir,
+    )
+    taskgraph.profile.count(
+        "executables",
+        taskgraph.modules.get_indexed_executable_count(),
+    )
+    taskgraph.profile.count(
+        "tasks",
+        len(taskgraph.dag.get_all_task_names()),
+    )
+    taskgraph.profile.count(
+        "input_names",
+        len(taskgraph.inputs.get_all_input_names()),
+    )
 
 
 def print_task_tree(values, module=None, columns=None):
     columns = shutil.get_terminal_size().columns
+    print(
+        taskgraph.overview.get_overview(values=values, columns=columns),
+        end="",
+        file=taskgraph.output.get_stdout(),
+    )
+
 
-    result = dict()
+def print_runnable_tasks():
+    """Print tasks which can be run with currently set values
+    grouped by module
+    """
     for module in taskgraph.dag.get_modules():
-        result[module] = get_task_tree_aligned(
-            values=values,
-            module=module,
-            columns=columns,
+        task_names = taskgraph.dag.get_runnable_tasks(module)
+        if task_names:
+            print(module, file=taskgraph.output.get_stdout())
+            print(len(module) * '=', file=taskgraph.output.get_stdout())
+            for task_name in sorted(task_names):
+                print(task_name, file=taskgraph.output.get_stdout())
+            print(file=taskgraph.output.get_stdout())
+
+
+class TargetBatch:
+    """Tasks given on command line which are fetched together
+    after setting the values given on command line.
+    """
+    def __init__(self):
+        # List of (name, print_json) pairs
+        self.targets = list()
+        # Names of values assigned after the previous fetch
+        self.assigned_names = set()
+
+    def assign(self, name, value):
+        """Set command line value. If the value has already been assigned,
+        targets given before are fetched with the earlier value first.
+        """
+        if name in self.assigned_names:
+            self.fetch()
+        taskgraph.values.set_command_line_value(name, value)
+        self.assigned_names.add(name)
+
+    def add(self, name, print_json=False):
+        """Add target to be fetched
+        :param name: Name of task or value
+        :param print_json: Print result as json instead of printing
+            all results as exports
+        """
+        self.targets.append((name, print_json))
+
+    def fetch(self):
+        """Fetch all targets and print their results
+        """
+        targets = self.targets
+        self.targets = list()
+        self.assigned_names = set()
+        if not targets:
+            return
+        names = [name for name, _ in targets]
+        # Exceptions of targets missing input by target name
+        missing = dict()
+        try:
+            results = taskgraph.values.fetch_values(names)
+        except taskgraph.runner.MissingInputException:
+            # Fetch targets one at a time to find the ones missing input
+            results = dict()
+            for name in names:
+                if name in results or name in missing:
+                    continue
+                try:
+                    results.update(taskgraph.values.fetch_values([name]))
+                except taskgraph.runner.MissingInputException as mie:
+                    missing[name] = mie
+        print_exports = False
+        for name, print_json in targets:
+            if name in missing:
+                print(
+                    "Missing input for task " + name,
+                    file=taskgraph.output.get_stdout(),
+                )
+                print(missing[name].args, file=taskgraph.output.get_stdout())
+            elif print_json:
+                print(
+                    json.dumps(
+                        results[name],
+                        indent=2,
+                        default=lambda o: str(o),
+                    ),
+                    file=taskgraph.output.get_stdout(),
+                )
+            else:
+                print_exports = True
+        if print_exports:
+            for task, result in taskgraph.results.get_all_results_in_order():
+                if " " in result:
+                    result = '"' + result + '"'
+                print(
+                    "export "+ str(task) + "=" + str(result),
+                    file=taskgraph.output.get_stdout(),
+                )
+
+
+def print_cache_stats():
+    """Print statistics of the persistent result cache
+    """
+    stats = taskgraph.cache.get_stats()
+    for name in sorted(stats):
+        print(
+            name + "=" + str(stats[name]),
+            file=taskgraph.output.get_stdout(),
         )
 
-    max_width = 0
-    max_aligned_column = 0
-    for module in result:
-        for aligned_task in result[module]:
-            if aligned_task.aligned_column > max_aligned_column:
-                max_aligned_column = aligned_task.aligned_column
-            if max_width < aligned_task.get_width():
-                max_width = aligned_task.width
-
-    for module in result:
-        for aligned_task in result[module]:
-            aligned_task.align_to(
-                column=max_aligned_column,
-                max_width=columns,
-            )
-
-    for module in sorted(result.keys()):
-        print(module)
-        print(len(module) * '=')
-        for aligned_task in result[module]:
-            print(str(aligned_task))
-        print()
+
 def print_values(values=dict()):
     for name in sorted(values):
-        print(name + "=" + values[name])
+        print(name + "=" + values[name], file=taskgraph.output.get_stdout())
 
 
 def main():
@@ -119,30 +253,66 @@ def main():
 
     :return:
     """
-    taskgraph.values.add_value_names(
-        taskgraph.dag.get_all_value_names(),
-    )
-    taskgraph.values.set_environment_values(dict(os.environ))
+    enable_startup_profiling()
+    load_modules()
+    if len(sys.argv) > 1 and sys.argv[1] == "--daemon":
+        # Keep modules and results in memory
+        # and serve clients over unix domain socket
+        taskgraph.daemon.serve(
+            run=run_command_line,
+            load_modules=load_modules,
+            session_lifetime=taskgraph.config.daemon_session_lifetime,
+        )
+    else:
+        run_command_line(sys.argv, dict(os.environ))
+
+
+def run_command_line(argv, environment):
+    """Set values and run tasks given as command line arguments
+
+    :param argv: Command line arguments including the program name
+    :param environment: Dictionary of environment variables
+    :return:
+    """
+    argv, schedule = get_schedule_argument(argv)
+    if schedule is None:
+        schedule = taskgraph.executor.CRITICAL_PATH
+    try:
+        taskgraph.executor.set_schedule(schedule)
+    except ValueError as ve:
+        print(ve, file=taskgraph.output.get_stdout())
+        exit(1)
+    with taskgraph.profile.phase("values"):
+        taskgraph.values.add_value_names(
+            taskgraph.dag.get_all_value_names(),
+        )
+        taskgraph.values.set_environment_values(environment)
     # TODO print relevant inputs before starting on task(s)
-    if len(sys.argv) == 1:
+    if len(argv) == 1:
         # TODO Print also already provided inputs
         values = taskgraph.values.get_values()
         print_values(values)
-        print("\n")
-        print_task_tree(values)
+        print("\n", file=taskgraph.output.get_stdout())
+        with taskgraph.profile.phase("tree_rendering"):
+            print_task_tree(values)
+        if taskgraph.profile.enabled:
+            taskgraph.profile.report()
     else:
+        if taskgraph.profile.enabled:
+            taskgraph.profile.report()
         # We have arguments
         # This holds the current input where value is going to be read next
         current_input = None
+        batch = TargetBatch()
         try:
             i = 1
-            while i < len(sys.argv):
-                argument = sys.argv[i]
+            while i < len(argv):
+                argument = argv[i]
                 separator_idx = argument.find("=")
                 if argument.startswith("-f"):
                     i += 1
                     with open(
-                        os.path.expanduser(sys.argv[i]), "rb",
+                        os.path.expanduser(argv[i]), "rb",
                     ) as jsonfile:
                         pass
                         # runner = taskgraph.runner.TaskRunner(
@@ -159,6 +329,17 @@ def main():
                     i += 1
                 elif argument.startswith("--print"):
                     i += 1
+                elif argument == RUNNABLE_ARGUMENT:
+                    batch.fetch()
+                    print_runnable_tasks()
+                elif argument == CACHE_STATS_ARGUMENT:
+                    print_cache_stats()
+                elif argument == CACHE_CLEAR_ARGUMENT:
+                    count = taskgraph.cache.clear()
+                    print(
+                        "Removed " + str(count) + " cached results",
+                        file=taskgraph.output.get_stdout(),
+                    )
                 elif separator_idx > 0:
                     # name=value assignment
                     name = argument[0:separator_idx]
@@ -168,24 +349,11 @@ def main():
                     )
                     if default_input is not None:
                         # We have default input
-                        taskgraph.values.set_command_line_value(
-                            default_input,
-                            value,
-                        )
-                        result = taskgraph.values.fetch_value(name=name)
-                        print(
-                            json.dumps(
-                                result,
-                                indent=2,
-                                default=lambda o: str(o),
-                            )
-                        )
+                        batch.assign(default_input, value)
+                        batch.add(name, print_json=True)
                     else:
                         # No default input
-                        taskgraph.values.set_command_line_value(
-                            name,
-                            value,
-                        )
+                        batch.assign(name, value)
                 elif argument.startswith("--"):
                     # Value names are prefixed with --
                     # Strip -- prefix
@@ -197,27 +365,19 @@ def main():
                         # suffix.
                         # For instance --recipient a --recipient b ->
                         #  recipients=[a,b]
-                        taskgraph.set_command_line_value(
-                            current_input,
-                            argument,
-                        )
+                        batch.assign(current_input, argument)
                         current_input = None
                     # TODO: Array values with plural suffix "s"
                     else:
-                        try:
-                            result = taskgraph.values.fetch_value(name=argument)
-                            for task, result in taskgraph.results.get_all_results_in_order():
-                                if " " in result:
-                                    result = '"' + result + '"'
-                                print("export "+ str(task) + "=" + str(result))
-                        except taskgraph.runner.MissingInputException as mie:
-                            print("Missing input for task " + str(argument))
-                            print(mie.args)
+                        batch.add(argument)
 
                 i += 1
+            batch.fetch()
         except taskgraph.task.FailedCommand as ex:
-            print(ex)
+            print(ex, file=taskgraph.output.get_stdout())
             exit(1)
+        finally:
+            taskgraph.results.save_durations()
 
 
 if __name__ == "__main__":
@@ -1,13 +1,24 @@
+import ast
 import collections
 import glob
+import importlib
+import importlib.util
 import json
 import logging
 import os
 import pathlib
 import pprint
+import re
 import subprocess
+import time
 
+import taskgraph.config
+import taskgraph.dag
+import taskgraph.modules.python
+import taskgraph.profile
+import taskgraph.snapshot
 import taskgraph.task
+import taskgraph.util
 
 log = logging.getLogger("taskgraph")
 
@@ -20,28 +31,422 @@ def is_executable(filepath):
         return False
 
 
-# Dictionary with simple command as key and full path to executable as value
+# Dictionary with simple command as key and full path to executable as value.
+# Filled lazily by find_executable from executables_by_directory.
 command_to_full_path = collections.OrderedDict()
 builtin_commands = set()
 
-def refresh_path_executables(paths=None):
+# Existing directories listed in PATH in search order
+path_directories = list()
+
+# Index of executables in directories.
+# Key is directory name as string.
+# Value is dictionary containing "mtime" and "inode" of the directory
+# at the time of scanning and "executables" as set of executable names.
+# "executables" is None when the directory has changed after it was indexed
+# and it has not been rescanned yet.
+executables_by_directory = dict()
+
+# File where executables_by_directory is stored between invocations
+path_index_file = None
+
+# Executables of json tasks checked during registration.
+# Key is executable, value is boolean whether it was available
+checked_executables = dict()
+
+# Version of the stored index file format
+PATH_INDEX_VERSION = 1
+
+# Directory modifications this close to scanning time in nanoseconds
+# may not be visible in directory mtime. Such directories are rescanned
+# on next invocation.
+MTIME_GRANULARITY = 2 * 10**9
+
+
+def get_path_index_file():
+    return taskgraph.config.get_taskgraph_dir() + "/pathIndex.json"
+
+
+def get_directory_signature(directory):
+    """Get mtime and inode of directory
+    :param directory: Directory name as string
+    :return: Tuple of mtime in nanoseconds and inode or None if
+        directory does not exist
+    """
+    try:
+        stat = os.stat(directory)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_ino
+
+
+def scan_directory(directory):
+    """Loop through all files in directory
+    :return: Set of names of executable files
+    """
+    executables = set()
+    try:
+        for filepath in pathlib.Path(directory).iterdir():
+            if is_executable(filepath):
+                executables.add(filepath.name)
+    except PermissionError:
+        pass
+    return executables
+
+
+def read_path_index(index_file):
+    try:
+        with open(index_file, "r") as fp:
+            index = json.load(fp)
+    except (OSError, ValueError):
+        return dict()
+    if not isinstance(index, dict) or \
+       index.get("version") != PATH_INDEX_VERSION:
+        return dict()
+    directories = dict()
+    for directory, entry in index.get("directories", dict()).items():
+        directories[directory] = {
+            "mtime": entry["mtime"],
+            "inode": entry["inode"],
+            "executables": set(entry["executables"]),
+        }
+    return directories
+
+
+def write_path_index(index_file):
+    """Store index of scanned directories currently in PATH.
+    Directories no longer in PATH are left out.
+    """
+    global path_directories
+    global executables_by_directory
+    directories = dict()
+    for directory in path_directories:
+        entry = executables_by_directory[directory]
+        if entry["executables"] is not None:
+            directories[directory] = {
+                "mtime": entry["mtime"],
+                "inode": entry["inode"],
+                "executables": sorted(entry["executables"]),
+            }
+    temporary_file = index_file + "." + str(os.getpid())
+    try:
+        os.makedirs(os.path.dirname(index_file), exist_ok=True)
+        with open(temporary_file, "w") as fp:
+            json.dump(
+                {
+                    "version": PATH_INDEX_VERSION,
+                    "directories": directories,
+                },
+                fp,
+            )
+        os.replace(temporary_file, index_file)
+    except OSError as oe:
+        log.warning("Could not write " + index_file + ": " + str(oe))
+
+
+def refresh_path_executables(paths=None, index_file=None):
+    """Validate stored index of executables against directories in PATH.
+    Only directories which' mtime or inode has changed are marked for
+    rescanning. Rescanning happens when find_executable first needs them.
+
+    :param paths: List of directories. Defaults to PATH environment variable
+    :param index_file: File name where index is stored between invocations
+    :return: None
+    """
     global command_to_full_path
+    global path_directories
+    global executables_by_directory
+    global path_index_file
     if paths is None:
         paths = os.environ.get("PATH").split(os.pathsep)
+    if index_file is None:
+        index_file = get_path_index_file()
+    path_index_file = index_file
+    command_to_full_path = collections.OrderedDict()
+    executables_by_directory = read_path_index(index_file)
+    path_directories = list()
     for dir in paths:
-        dir = pathlib.Path(dir)
-        if not dir.exists():
+        signature = get_directory_signature(dir)
+        if signature is None:
             log.warning(
                 "Non-existing directory " + str(dir) +
                 " listed PATH environment variable",
             )
+            continue
+        if dir in path_directories:
+            continue
+        path_directories.append(dir)
+        entry = executables_by_directory.get(dir)
+        if entry is None or \
+           (entry["mtime"], entry["inode"]) != signature:
+            executables_by_directory[dir] = {
+                "mtime": signature[0],
+                "inode": signature[1],
+                "executables": None,
+            }
+
+
+def rescan_changed_directories():
+    """Scan all PATH directories which have changed since they were indexed
+    and store the updated index.
+    """
+    global path_directories
+    global executables_by_directory
+    global path_index_file
+    scan_time = time.time_ns()
+    for dir in path_directories:
+        entry = executables_by_directory[dir]
+        if entry["executables"] is None:
+            entry["executables"] = scan_directory(dir)
+            if scan_time - entry["mtime"] < MTIME_GRANULARITY:
+                # Modification in same mtime tick would go unnoticed
+                entry["mtime"] = None
+    if path_index_file:
+        write_path_index(path_index_file)
+
+
+def get_indexed_executable_count():
+    """Get number of executables indexed in PATH directories"""
+    global path_directories
+    global executables_by_directory
+    result = 0
+    for dir in path_directories:
+        executables = executables_by_directory[dir]["executables"]
+        if executables is not None:
+            result += len(executables)
+    return result
+
+
+def find_executable(command):
+    """Resolve command to full path from PATH directories in PATH order.
+    :param command: Simple command name
+    :return: Full path to the executable as pathlib.Path or None if not found
+    """
+    global command_to_full_path
+    global path_directories
+    global executables_by_directory
+    if command in command_to_full_path:
+        return command_to_full_path[command]
+    for dir in path_directories:
+        entry = executables_by_directory[dir]
+        if entry["executables"] is None:
+            rescan_changed_directories()
+        if command in entry["executables"]:
+            command_to_full_path[command] = pathlib.Path(dir) / command
+            return command_to_full_path[command]
+    return None
+
+
+def is_command_available(executable):
+    """Check executable is found from PATH or it is a path to executable
+    :param executable: Command or path to executable
+    :return: Boolean
+    """
+    global command_to_full_path
+    global checked_executables
+    available = executable in command_to_full_path or \
+        find_executable(executable) is not None or \
+        is_executable(pathlib.Path(executable))
+    checked_executables[executable] = available
+    return available
+
+
+# Names which register tasks when referenced in python module
+REGISTERING_NAMES = frozenset(
+    ["task_func", "Task", "task_shell_script", "struct_to_task"],
+)
+
+
+def get_decorator_name(decorator):
+    if isinstance(decorator, ast.Call):
+        decorator = decorator.func
+    if isinstance(decorator, ast.Name):
+        return decorator.id
+    if isinstance(decorator, ast.Attribute):
+        return decorator.attr
+    return None
+
+
+def get_task_func_struct(function):
+    """Get task_func arguments of function definition without executing it
+    :param function: ast.FunctionDef decorated with task_func
+    :return: Dictionary of Task arguments or None if they can not be
+        determined statically
+    """
+    arguments = function.args
+    if arguments.vararg or arguments.kwarg or arguments.kwonlyargs:
+        return None
+    params = [arg.arg for arg in arguments.posonlyargs + arguments.args]
+    defaults_len = len(arguments.defaults)
+    struct = {"name": function.name}
+    if defaults_len == 0:
+        struct["inputs"] = params
+    else:
+        struct["inputs"] = params[:-defaults_len]
+        struct["optionalInputs"] = params[len(params) - defaults_len:]
+    decorators = [
+        decorator for decorator in function.decorator_list
+        if get_decorator_name(decorator) == "task_func"
+    ]
+    if len(decorators) != 1 or len(function.decorator_list) != 1:
+        return None
+    decorator = decorators[0]
+    if isinstance(decorator, ast.Call):
+        if decorator.args:
+            return None
+        for keyword in decorator.keywords:
+            if keyword.arg is None:
+                return None
+            try:
+                struct[keyword.arg] = ast.literal_eval(keyword.value)
+            except ValueError:
+                return None
+    return struct
+
+
+def read_python_manifest(path):
+    """Read tasks python module defines with task_func without importing it.
+
+    :param path: Path of python module
+    :return: List of dictionaries of Task arguments or None if
+        tasks can not be determined without importing the module
+    """
+    with open(path, "rb") as fp:
+        try:
+            tree = ast.parse(fp.read(), filename=path)
+        except SyntaxError:
+            return None
+    manifest = list()
+    decorators = set()
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and \
+           "task_func" in map(get_decorator_name, node.decorator_list):
+            struct = get_task_func_struct(node)
+            if struct is None:
+                return None
+            manifest.append(struct)
+            for decorator in node.decorator_list:
+                decorators.add(id(decorator))
+                if isinstance(decorator, ast.Call):
+                    decorators.add(id(decorator.func))
+    for node in ast.walk(tree):
+        if id(node) in decorators:
+            continue
+        if isinstance(node, ast.Name) and node.id in REGISTERING_NAMES or \
+           isinstance(node, ast.Attribute) and node.attr in REGISTERING_NAMES:
+            # Tasks are registered some other way than task_func decorator
+            return None
+    return manifest
+
+
+def register_python_module(module_name, path=None):
+    """Register tasks of python module as stubs, which import the module
+    on first run. Module is imported right away when it's tasks can not be
+    determined without importing.
+
+    :param module_name: Full name of the module
+    :param path: Path of python module when it is not importable by name
+    :return: None
+    """
+    manifest_path = path
+    if manifest_path is None:
+        manifest_path = importlib.util.find_spec(module_name).origin
+    manifest = read_python_manifest(manifest_path)
+    if manifest is None:
+        if path is None:
+            importlib.import_module(module_name)
         else:
-            # Loop through all files in dir
-            for filepath in dir.iterdir():
-                if is_executable(filepath):
-                    command = filepath.name
-                    if command not in command_to_full_path:
-                        command_to_full_path[command] = filepath
+            taskgraph.util.import_module_from_path(module_name, path)
+        return
+    for struct in manifest:
+        try:
+            task = taskgraph.task.Task(
+                module=re.search(r'[^.]+$', module_name).group(0),
+                **struct,
+            )
+        except taskgraph.dag.CycleError as ce:
+            log.warning("Not registering task " + str(ce))
+            continue
+        task.runnable_reference = (
+            "function",
+            module_name,
+            struct["name"],
+            path,
+        )
+
+
+def register_python_modules(directory=None):
+    """Register tasks defined with task_func in python modules
+    :param directory: Directory of external python modules. Defaults to
+        modules coming with taskgraph.
+    :return: None
+    """
+    if directory is None:
+        for module_name in taskgraph.modules.python.__all__:
+            register_python_module("taskgraph.modules.python." + module_name)
+    else:
+        for path in sorted(glob.glob(directory + "/*.py")):
+            register_python_module(
+                taskgraph.util.get_basename_without_ext(path),
+                path,
+            )
+
+
+def get_module_directories(external_module_dir=None):
+    """Get external json and python module directories
+    :return: Tuple of lists of json and python module directories
+    """
+    json_directories = []
+    python_directories = []
+    if external_module_dir:
+        json_directories.append(external_module_dir + "/json")
+        python_directories.append(external_module_dir + "/python")
+    return json_directories, python_directories
+
+
+def get_module_source_files(external_module_dir=None):
+    """Get all files registered tasks are constructed from
+    :return: Sorted list of file names
+    """
+    json_directories, python_directories = get_module_directories(
+        external_module_dir,
+    )
+    return taskgraph.snapshot.get_source_files(
+        json_directories=json_directories,
+        python_directories=python_directories,
+    )
+
+
+def register_modules(external_module_dir=None, snapshot_file=None):
+    """Register all tasks from python and json modules coming with taskgraph
+    and from external module directory.
+    Tasks are restored from registry snapshot when none of the module files
+    has changed since the snapshot was stored.
+
+    :param external_module_dir: Directory containing python and json
+        subdirectories of external modules
+    :param snapshot_file: File name of registry snapshot
+    :return: None
+    """
+    global checked_executables
+    checked_executables = dict()
+    json_directories, python_directories = get_module_directories(
+        external_module_dir,
+    )
+    sources = get_module_source_files(external_module_dir)
+    with taskgraph.profile.phase("snapshot_load"):
+        if taskgraph.snapshot.load(sources, snapshot_file):
+            return
+    with taskgraph.profile.phase("python_modules"):
+        register_python_modules()
+        for directory in python_directories:
+            register_python_modules(directory)
+    with taskgraph.profile.phase("json_modules"):
+        for directory in json_directories:
+            register_json_modules(directory)
+        register_json_modules()
+    with taskgraph.profile.phase("snapshot_save"):
+        taskgraph.snapshot.save(sources, snapshot_file)
 
 
 def register_json_modules(directory=None):
@@ -81,10 +486,14 @@ def struct_to_task(module, struct):
                     "Task " + struct["name"] +
                     " parameters are not correct"
                 )
-        elif struct["executable"] in command_to_full_path or \
-           is_executable(pathlib.Path(struct["executable"])):
+            except taskgraph.dag.CycleError as ce:
+                log.warning("Not registering task " + str(ce))
+        elif is_command_available(struct["executable"]):
             # Executable exists in PATH
-            taskgraph.task.task_shell_script(module=module, **struct)
+            try:
+                taskgraph.task.task_shell_script(module=module, **struct)
+            except taskgraph.dag.CycleError as ce:
+                log.warning("Not registering task " + str(ce))
         else:
             log.warning(
                 "Not registering task " + struct["name"] +
@@ -51,7 +51,7 @@ def get_int(min, max):
     else:
         return random.randrange(min, max + 1)
 
-@task_func
+@task_func(executor="process")
 def mailBody(
     size,
     priority=None,
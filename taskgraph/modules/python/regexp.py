@@ -1,7 +1,7 @@
 from taskgraph.task import *
 import re
 
-@task_func
+@task_func(executor="process")
 def searchPattern(
     text,
     pattern,
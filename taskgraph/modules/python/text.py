@@ -2,7 +2,7 @@ import random
 import time
 from taskgraph.task import *
 
-@task_func
+@task_func(executor="process")
 def get_random_ascii_data(size=80):
     size = int(size)
     result = ""
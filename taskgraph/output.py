@@ -0,0 +1,40 @@
+# This file holds the streams output of commands is written to.
+# The daemon points them to the client of each command instead of
+# replacing sys.stdout and sys.stderr of the whole process, which other
+# code such as logging handlers may replace as well.
+
+import contextlib
+import sys
+
+# Streams of the running command, None for sys.stdout and sys.stderr
+stdout = None
+stderr = None
+
+
+def get_stdout():
+    if stdout is None:
+        return sys.stdout
+    return stdout
+
+
+def get_stderr():
+    if stderr is None:
+        return sys.stderr
+    return stderr
+
+
+@contextlib.contextmanager
+def redirected(out, err):
+    """Write output of commands run inside with statement to given streams
+    :param out: Stream for standard output
+    :param err: Stream for standard error
+    """
+    global stdout
+    global stderr
+    saved = (stdout, stderr)
+    stdout = out
+    stderr = err
+    try:
+        yield
+    finally:
+        stdout, stderr = saved
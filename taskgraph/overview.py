@@ -0,0 +1,206 @@
+# This file takes care of rendering the overview of all tasks printed
+# when tg is run without arguments.
+# Rendered task trees are cached per module to ~/.taskgraph/overview.json
+# so that only modules whose tasks or shown values have changed
+# need to be rendered again.
+
+import hashlib
+import json
+import logging
+import os
+
+import taskgraph.ascii
+import taskgraph.config
+import taskgraph.dag
+import taskgraph.util
+
+log = logging.getLogger("taskgraph")
+
+# Changing the format of stored cache requires incrementing the version
+OVERVIEW_CACHE_VERSION = 1
+
+# Changing how trees are rendered requires incrementing the version
+# so that trees rendered by earlier versions are not shown
+RENDERER_VERSION = 1
+
+
+def get_cache_file():
+    return taskgraph.config.get_taskgraph_dir() + "/overview.json"
+
+
+def get_tree_signature(task_name, values, signatures):
+    """Get hash of everything shown in the tree of given task:
+    names of the task and it's transitive inputs and values of the inputs
+    which are not tasks.
+
+    :param task_name: Name of the task at the bottom of the tree
+    :param values: Dictionary of provided values
+    :param signatures: Dictionary of already calculated signatures
+        by task name. Updated with calculated signatures.
+    :return: Signature as hex string
+    """
+    # Tasks whose signature is being calculated. Signatures of inputs
+    # are calculated before the task having them.
+    stack = [task_name]
+    while stack:
+        name = stack[-1]
+        if name in signatures:
+            stack.pop()
+            continue
+        task = taskgraph.dag.get_task(name)
+        parts = [task.name]
+        missing = list()
+        for input in task.input_names + task.optional_input_names:
+            if taskgraph.dag.is_task(input):
+                if input in signatures:
+                    parts.append(["task", input, signatures[input]])
+                else:
+                    missing.append(input)
+            elif input in values:
+                parts.append(["input", input, str(values[input])])
+            else:
+                parts.append(["input", input])
+        if missing:
+            stack.extend(missing)
+            continue
+        signatures[name] = hashlib.sha256(
+            json.dumps(parts).encode("utf-8"),
+        ).hexdigest()
+        stack.pop()
+    return signatures[task_name]
+
+
+def get_module_signature(module, task_names, values, columns, signatures):
+    """Get hash of everything shown in the overview of given module
+    :return: Signature as hex string
+    """
+    parts = [RENDERER_VERSION, module, columns]
+    for task_name in task_names:
+        parts.append(get_tree_signature(task_name, values, signatures))
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+def render_module(task_names, values, columns):
+    """Render tree of each task before aligning them
+    :return: List of [text, aligned column] pairs
+    """
+    rendered = list()
+    for task_name in task_names:
+        asciitree = taskgraph.util.get_asciitree(
+            task=taskgraph.dag.get_task(task_name),
+            values=values,
+        )
+        text = asciitree.get_tree(width=columns)
+        aligned_task = taskgraph.ascii.AlignedText(text=text)
+        # Aligned column is at the start of the task name
+        rendered.append(
+            [text, aligned_task.get_width() - len(task_name)],
+        )
+    return rendered
+
+
+def read_cache(cache_file):
+    try:
+        with open(cache_file, "r") as fp:
+            cache = json.load(fp)
+    except (OSError, ValueError):
+        return dict()
+    if not isinstance(cache, dict) or \
+       cache.get("version") != OVERVIEW_CACHE_VERSION:
+        return dict()
+    return cache.get("modules", dict())
+
+
+def write_cache(cache_file, modules):
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        temporary_file = cache_file + "." + str(os.getpid())
+        with open(temporary_file, "w") as fp:
+            json.dump(
+                {"version": OVERVIEW_CACHE_VERSION, "modules": modules},
+                fp,
+            )
+        os.replace(temporary_file, cache_file)
+    except OSError as oe:
+        log.warning("Could not write " + cache_file + ": " + str(oe))
+
+
+def get_task_trees(values, columns, cache_file=None):
+    """Get rendered trees of final tasks of all modules.
+    Trees of modules which have not changed since the last call
+    are read from cache file.
+
+    :param values: Dictionary of provided values shown in trees
+    :param columns: Width of the terminal
+    :param cache_file: File name of the cache, None for default
+    :return: Dictionary with module name as key and
+        list of unaligned taskgraph.ascii.AlignedText as value
+    """
+    if cache_file is None:
+        cache_file = get_cache_file()
+    cached_modules = read_cache(cache_file)
+    modules = dict()
+    changed = False
+    signatures = dict()
+    for module in taskgraph.dag.get_modules():
+        task_names = sorted(taskgraph.dag.final_tasks(module))
+        signature = get_module_signature(
+            module,
+            task_names,
+            values,
+            columns,
+            signatures,
+        )
+        cached = cached_modules.get(module)
+        if cached is not None and cached.get("signature") == signature:
+            modules[module] = cached
+        else:
+            modules[module] = {
+                "signature": signature,
+                "tasks": render_module(task_names, values, columns),
+            }
+            changed = True
+    if changed or set(modules) != set(cached_modules):
+        write_cache(cache_file, modules)
+
+    result = dict()
+    for module in modules:
+        result[module] = list()
+        for text, aligned_column in modules[module]["tasks"]:
+            result[module].append(
+                taskgraph.ascii.AlignedText(
+                    text=text,
+                    aligned_column=aligned_column,
+                ),
+            )
+    return result
+
+
+def get_overview(values, columns, cache_file=None):
+    """Get overview of all tasks aligned at the start of task names.
+
+    :param values: Dictionary of provided values shown in trees
+    :param columns: Width of the terminal
+    :param cache_file: File name of the cache, None for default
+    :return: Overview as string
+    """
+    trees = get_task_trees(values, columns, cache_file)
+
+    max_aligned_column = 0
+    for module in trees:
+        for aligned_task in trees[module]:
+            if aligned_task.aligned_column > max_aligned_column:
+                max_aligned_column = aligned_task.aligned_column
+
+    lines = list()
+    for module in sorted(trees.keys()):
+        lines.append(module)
+        lines.append(len(module) * '=')
+        for aligned_task in trees[module]:
+            aligned_task.align_to(
+                column=max_aligned_column,
+                max_width=columns,
+            )
+            lines.append(str(aligned_task))
+        lines.append("")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,217 @@
+# This file takes care of compiling execution plans for fetching values.
+# A plan lists the tasks needed to fetch the target in execution order
+# with the source of each argument resolved beforehand.
+# Plans are memoized by target and names of available values
+# until tasks are added to or removed from the dag.
+
+import taskgraph.dag
+import taskgraph.executor
+import taskgraph.results
+import taskgraph.runner
+import taskgraph.symbols
+
+# Maximum number of memoized plans before forgetting all of them
+MAX_PLANS = 1024
+
+# Memoized plans
+# Key is tuple of target name and bitset of available value names.
+# Value is plan returned by compile_plan.
+# Plans of several targets have tuple of target names as the key.
+plans = dict()
+
+# Graph and it's version memoized plans were compiled from
+plans_graph = None
+plans_version = None
+
+
+def compile_plan(target, available_names, graph=None):
+    """Compile steps needed to fetch the result of target task.
+
+    Inputs which are available are read from values. Mandatory inputs
+    which are not are results of earlier steps. Optional inputs are
+    passed only if they are available or fetched before the task's own
+    inputs.
+
+    :param target: Name of the task
+    :param available_names: Set of names of available values
+        or dictionary of available values
+    :param graph: taskgraph.dag.TaskGraph, defaults to the default graph
+    :return: Tuple of steps in execution order.
+        Each step is a tuple of Task and it's arguments.
+        Arguments is a tuple of (input name, index of step) pairs
+        where index is None when input is read from values.
+    :raises taskgraph.runner.MissingInputException: If some missing input
+        is not a task
+    :raises taskgraph.dag.NoSuchTask: If target is not a task
+    """
+    steps, _ = compile_batch_plan([target], available_names, graph)
+    return steps
+
+
+def compile_batch_plan(targets, available_names, graph=None):
+    """Compile steps needed to fetch the results of several target tasks.
+    Steps of tasks needed by several targets are included once.
+    See compile_plan
+
+    :param targets: List of task names
+    :return: Tuple of steps and tuple of index of the step of each target
+    """
+    if graph is None:
+        graph = taskgraph.dag.get_graph()
+    steps = list()
+    # Index of the step by task name
+    positions = dict()
+    for target in targets:
+        if target in positions:
+            continue
+        # Tasks whose inputs are being resolved as lists of name, task,
+        # index of the step of it's first input, arguments and index of next
+        # input. Inputs are resolved before the task having them.
+        stack = [[target, graph.get_task(target), len(steps), list(), 0]]
+        while stack:
+            frame = stack[-1]
+            name, task, start, arguments, index = frame
+            while index < len(task.input_names):
+                input = task.input_names[index]
+                if input in available_names:
+                    arguments.append((input, None))
+                elif input in positions:
+                    arguments.append((input, positions[input]))
+                else:
+                    break
+                index += 1
+            if index < len(task.input_names):
+                # Add steps of the input and check it again
+                frame[4] = index
+                if not graph.is_task(input):
+                    raise taskgraph.runner.MissingInputException(input)
+                stack.append(
+                    [input, graph.get_task(input), len(steps), list(), 0],
+                )
+                continue
+            for input in task.optional_input_names:
+                if input in available_names:
+                    arguments.append((input, None))
+                elif input in positions and positions[input] < start:
+                    arguments.append((input, positions[input]))
+            positions[name] = len(steps)
+            steps.append((task, tuple(arguments)))
+            stack.pop()
+    return tuple(steps), tuple(positions[target] for target in targets)
+
+
+def get_plan(target, available_names, mask=None):
+    """Get memoized plan for target or compile it.
+    See compile_plan
+
+    :param mask: Bitset of available names if already known,
+        see taskgraph.symbols
+    """
+    key = get_key(target, available_names, mask)
+    try:
+        return plans[key]
+    except KeyError:
+        plan = compile_plan(target, available_names, plans_graph)
+        plans[key] = plan
+        return plan
+
+
+def get_batch_plan(targets, available_names, mask=None):
+    """Get memoized plan for several targets or compile it.
+    See compile_batch_plan and get_plan
+    """
+    key = get_key(tuple(targets), available_names, mask)
+    try:
+        return plans[key]
+    except KeyError:
+        plan = compile_batch_plan(targets, available_names, plans_graph)
+        plans[key] = plan
+        return plan
+
+
+def get_key(target, available_names, mask):
+    """Get key of memoized plan forgetting plans of earlier versions
+    of the graph
+    """
+    global plans
+    global plans_graph
+    global plans_version
+    graph = taskgraph.dag.get_graph()
+    if graph is not plans_graph or graph.version != plans_version or \
+       len(plans) >= MAX_PLANS:
+        plans = dict()
+        plans_graph = graph
+        plans_version = graph.version
+    if mask is None:
+        # Names which are not interned are not inputs of any task
+        mask = taskgraph.symbols.get_mask(available_names)
+    return (target, mask)
+
+
+def run_step(task, arguments, values, step_results):
+    """Run single step of a plan. Task having a result with the same
+    values is not run again.
+
+    :param task: Task of the step
+    :param arguments: Arguments of the step
+    :param values: Dictionary of available values
+    :param step_results: Results of earlier steps by their index
+    :return: Result of the task
+    """
+    call_values = dict()
+    for input, position in arguments:
+        if position is None:
+            call_values[input] = values[input]
+        else:
+            call_values[input] = step_results[position]
+    try:
+        return taskgraph.results.reuse_result(task, call_values)
+    except KeyError:
+        # Not run with the values or evicted
+        return task.run(call_values)
+
+
+def run_plan(plan, values):
+    """Run steps of the plan. Tasks having a result with the same
+    values are not run again.
+
+    :param plan: Plan returned by compile_plan
+    :param values: Dictionary of available values
+    :return: Result of the last step
+    """
+    step_results = list()
+    with taskgraph.results.pinned():
+        for task, arguments in plan:
+            step_results.append(
+                run_step(task, arguments, values, step_results),
+            )
+    return step_results[-1]
+
+
+def run_batch_plan(batch_plan, values):
+    """Run steps of plan returned by compile_batch_plan.
+    Independent steps are run concurrently when taskgraph.executor
+    has several workers.
+
+    :return: List of results of targets
+    """
+    steps, target_positions = batch_plan
+    with taskgraph.results.pinned():
+        if taskgraph.executor.is_parallel():
+            step_results = taskgraph.executor.run_steps(steps, values)
+        else:
+            step_results = list()
+            for task, arguments in steps:
+                step_results.append(
+                    run_step(task, arguments, values, step_results),
+                )
+    return [step_results[position] for position in target_positions]
+
+
+def reset():
+    global plans
+    global plans_graph
+    global plans_version
+    plans = dict()
+    plans_graph = None
+    plans_version = None
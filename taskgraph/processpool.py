@@ -0,0 +1,118 @@
+# This file takes care of running python tasks registered with
+# task_func(executor="process") in a pool of worker processes,
+# so that CPU bound tasks do not block the main interpreter.
+#
+# Worker processes import the modules of all such tasks once when they
+# are started. After that only the arguments and the result of each call
+# are transferred between the processes.
+
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+
+import taskgraph.dag
+import taskgraph.util
+
+log = logging.getLogger("taskgraph")
+
+# Value of executor argument of tasks run in worker processes
+PROCESS_EXECUTOR = "process"
+
+# Number of worker processes, None for number of processors
+processes = None
+
+pool = None
+
+# Functions resolved in worker process by their reference
+functions_by_reference = dict()
+
+
+def set_processes(count):
+    """Set the number of worker processes.
+    Takes effect when the pool is started next time.
+    """
+    global processes
+    processes = max(1, int(count))
+
+
+def is_process_reference(reference):
+    """Check function can be called in worker process by it's reference
+    """
+    return reference is not None and reference[0] == "function"
+
+
+def get_preloaded_modules():
+    """Get modules of all registered tasks run in worker processes
+    :return: List of (module name, path) tuples
+    """
+    modules = set()
+    for task_name in taskgraph.dag.get_all_task_names():
+        task = taskgraph.dag.get_task(task_name)
+        reference = task.runnable_reference
+        if getattr(task, "executor", None) == PROCESS_EXECUTOR and \
+           is_process_reference(reference):
+            modules.add((reference[1], reference[3]))
+    return sorted(modules, key=lambda module: (module[0], module[1] or ""))
+
+
+def preload(modules):
+    """Import modules in worker process when it starts
+    :param modules: List of (module name, path) tuples
+    """
+    for module_name, path in modules:
+        try:
+            taskgraph.util.import_module(module_name, path)
+        except Exception as ex:
+            log.warning("Could not preload " + module_name + ": " + str(ex))
+
+
+def call_in_worker(reference, arguments):
+    """Call function by it's reference in worker process
+    :param reference: ("function", module name, function name, path)
+    :param arguments: Dictionary of keyword arguments
+    :return: Return value of the function
+    """
+    function = functions_by_reference.get(reference)
+    if function is None:
+        _, module_name, function_name, path = reference
+        module = taskgraph.util.import_module(module_name, path)
+        function = getattr(module, function_name)
+        functions_by_reference[reference] = function
+    return function(**arguments)
+
+
+def get_pool():
+    """Get pool of worker processes, starting it if needed
+    """
+    global pool
+    if pool is None:
+        max_workers = processes
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=preload,
+            initargs=(get_preloaded_modules(),),
+        )
+    return pool
+
+
+def call(reference, arguments):
+    """Call function in worker process and wait for the result
+    :param reference: ("function", module name, function name, path)
+    :param arguments: Dictionary of keyword arguments
+    :return: Return value of the function
+    """
+    return get_pool().submit(call_in_worker, reference, arguments).result()
+
+
+def shutdown():
+    """Stop worker processes. Pool is started again on next call,
+    for instance after modules have been registered again.
+    """
+    global pool
+    if pool is not None:
+        pool.shutdown()
+        pool = None
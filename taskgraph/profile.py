@@ -0,0 +1,124 @@
+# This file takes care of measuring wall time, cpu time and memory
+# allocations of the startup phases and reporting them as json.
+
+import contextlib
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import taskgraph.output
+
+# Version of the report format
+REPORT_VERSION = 1
+
+enabled = False
+
+# File name to append report to. None for stderr
+destination = None
+
+# Measured phases in execution order
+# [
+#   {
+#     "phase": name of the phase,
+#     "wall": wall time in seconds,
+#     "cpu": process cpu time in seconds,
+#     "allocated": bytes allocated and still in use after the phase,
+#     "peak": peak of bytes allocated during the phase,
+#   },
+#   ...
+# ]
+phases = list()
+
+# Counts of registered items by their name
+counts = dict()
+
+# Whether tracemalloc was started by enable and is stopped by reset
+started_tracing = False
+
+
+def enable(report_destination=None):
+    global enabled
+    global destination
+    global started_tracing
+    enabled = True
+    destination = report_destination
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+        started_tracing = True
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Measure the code run inside with statement as phase of given name
+    when profiling is enabled.
+    :param name: Name of the phase
+    """
+    global phases
+    if not enabled:
+        yield
+        return
+    tracemalloc.reset_peak()
+    memory_before, _ = tracemalloc.get_traced_memory()
+    wall_before = time.perf_counter()
+    cpu_before = time.process_time()
+    try:
+        yield
+    finally:
+        cpu_after = time.process_time()
+        wall_after = time.perf_counter()
+        memory_after, memory_peak = tracemalloc.get_traced_memory()
+        phases.append(
+            {
+                "phase": name,
+                "wall": wall_after - wall_before,
+                "cpu": cpu_after - cpu_before,
+                "allocated": memory_after - memory_before,
+                "peak": max(0, memory_peak - memory_before),
+            },
+        )
+
+
+def count(name, value):
+    global counts
+    if enabled:
+        counts[name] = value
+
+
+def get_report():
+    return {
+        "version": REPORT_VERSION,
+        "timestamp": time.time(),
+        "python": sys.version.split()[0],
+        "phases": phases,
+        "counts": counts,
+    }
+
+
+def report():
+    """Write profiling report as single json line to destination
+    file given to enable or to stderr
+    :return: None
+    """
+    line = json.dumps(get_report(), sort_keys=True) + "\n"
+    if destination:
+        with open(os.path.expanduser(destination), "a") as fp:
+            fp.write(line)
+    else:
+        taskgraph.output.get_stderr().write(line)
+
+
+def reset():
+    global enabled
+    global destination
+    global phases
+    global counts
+    global started_tracing
+    if started_tracing:
+        tracemalloc.stop()
+        started_tracing = False
+    enabled = False
+    destination = None
+    phases = list()
+    counts = dict()
@@ -2,17 +2,37 @@
 # including but not limited to logging and caching the results.
 
 
+import bisect
+import collections
+import contextlib
+import json
+import logging
 import os
 import re
 import sys
+import threading
 import time
 import taskgraph.task
 import taskgraph.config
+import taskgraph.dag
+import taskgraph.output
+import taskgraph.symbols
 
 from datetime import datetime
 
+log = logging.getLogger("taskgraph")
 
-# Result metadata in execution order
+# Changing the format of stored durations requires incrementing the version
+DURATIONS_VERSION = 1
+
+# Weight of the latest duration in exponentially weighted mean duration
+DURATION_SMOOTHING = 0.3
+
+
+# Result metadata in execution order.
+# Entries are the same dicts as in results_by_values, so result and values
+# of an entry are set to None when it is evicted, see set_limits.
+# Only the latest entries are kept when the number of results is limited.
 # list of dicts
 # [
 #   {
@@ -26,18 +46,116 @@ from datetime import datetime
 # ]
 results_in_order = list()
 
-# Dict of metadata by task indexed by task.get_namedtuple(values)
-# results_by_values[task.get_namedtuple(values)] = {
+# Dict of metadata by task indexed by task.get_key(values)
+# results_by_values[task.get_key(values)] = {
 #     "finish_timestamp": finish_timestamp,
+#     "task": instance of Task,
 #     "values": values,
 #     "result": result,
 # }
 results_by_values = dict()
 
+# Maximum number of results in results_by_values and maximum total
+# estimated size of them in bytes, None for no limit. See set_limits
+max_results = None
+max_result_bytes = None
+
+# Number of entries kept in results_in_order for each result
+# when the number of results is limited
+HISTORY_FACTOR = 4
+
+# Keys of results which can be evicted from results_by_values,
+# least recently used first. Latest results of tasks which are not stale
+# and pinned results are not evictable.
+evictable = collections.OrderedDict()
+
+# Estimated size of each result in bytes by key
+# when max_result_bytes is set, and their sum
+result_sizes = dict()
+result_bytes = 0
+
+# Whether results are indexed for query, see set_indexes
+indexed = False
+
+# Names of inputs whose values results are indexed by
+indexed_inputs = set()
+
+# Entries of results by task name, and by value of each indexed input by
+# input name, in the order they were added
+task_index = dict()
+input_indexes = dict()
+
+# Finish timestamps of results in ascending order and their entries
+timestamp_index = list()
+timestamp_entries = list()
+
+# Number of evicted entries in the indexes. Indexes are rebuilt when
+# they are more than half of the entries.
+dead_entries = 0
+
+# Keys of results added or used inside pinned blocks
+# and the number of pinned blocks running
+pinned_keys = set()
+pin_depth = 0
+
 # Runner to task relationship to assist with
 # getting the right logger for the task
 tasks_by_runner = dict()
 
+# Source of task results in the satisfiability index of taskgraph.dag
+RESULT = "result"
+
+# Exponentially weighted mean duration of task runs in seconds
+# Key is task name prefixed with module name, see get_duration_key
+# Loaded from durations file on first use, None before that
+durations = None
+
+# Whether durations have changed since they were loaded
+durations_changed = False
+
+# Generation of values, incremented each time some value changes.
+# See taskgraph.values
+generation = 0
+
+# Generation of the latest result of each task by task name
+result_generations = dict()
+
+# Key of the latest result of each task in results_by_values by task name
+latest_keys = dict()
+
+# Latest result of each task which is not None nor stale by task name.
+# Updated in place as results are added and invalidated,
+# see taskgraph.values.get_values
+latest_results = dict()
+
+# Latest entry of each task in results_in_order by task name
+latest_entries = dict()
+
+# Latest entry of each task in results_in_order having a result which is
+# not None, and having a result of at most SHORT_RESULT_LENGTH characters,
+# by task name in the order of the entries. See get_all_results
+latest_result_entries = collections.OrderedDict()
+latest_short_entries = collections.OrderedDict()
+
+# Maximum length of results listed by get_all_results_in_order
+SHORT_RESULT_LENGTH = 80
+
+# Bitset of names in latest_results, see taskgraph.symbols
+latest_mask = 0
+
+# Generation in which the results of a task became stale because some
+# of it's inputs changed, by task name. Result of the task is stale
+# until it is run again.
+stale_generations = dict()
+
+# Guards results_in_order and results_by_values
+# when tasks are run in several threads
+lock = threading.RLock()
+
+# Thread specific list collecting results instead of results_in_order.
+# See buffered
+thread_data = threading.local()
+
 
 def prefix_lines(prefix, lines):
     if isinstance(prefix, bytes) and isinstance(lines, bytes):
@@ -126,7 +244,7 @@ class Logger:
         )
 
     def command(self, command):
-        sys.stdout.write(
+        taskgraph.output.get_stdout().write(
             self.print_operation(time.time(), b"CMD", command),
         )
 
@@ -135,76 +253,608 @@ class Logger:
 
     def stdout(self, output):
         self.stdoutput.append(output)
-        sys.stdout.write(
+        taskgraph.output.get_stdout().write(
             self.print_operation(time.time(), b"OUT", output),
         )
 
     def stderr(self, output):
-        sys.stderr.write(
+        taskgraph.output.get_stderr().write(
             self.print_operation(time.time(), b"ERR", output),
         )
 
     def exitcode(self, status):
-        sys.stdout.write(
+        taskgraph.output.get_stdout().write(
             self.print_operation(time.time(), b"END", bytes(str(status), "utf-8")),
         )
 
     def close(self):
         self.print_operation(time.time())
-        self.file.close()
+        if self.file:
+            self.file.close()
         return b''.join(self.stdoutput).decode("utf-8")
 
 
-def add_result(task, values, result):
+def get_durations_file():
+    return taskgraph.config.get_taskgraph_dir() + "/durations.json"
+
+
+def get_duration_key(task):
+    if task.module:
+        return task.module + "." + task.name
+    return task.name
+
+
+def load_durations(durations_file=None):
+    """Read duration history of earlier runs
+    :param durations_file: File name, None for default
+    :return: Dictionary of durations by duration key
+    """
+    global durations
+    global durations_changed
+    if durations_file is None:
+        durations_file = get_durations_file()
+    durations = dict()
+    durations_changed = False
+    try:
+        with open(durations_file, "r") as fp:
+            stored = json.load(fp)
+        if stored.get("version") == DURATIONS_VERSION:
+            durations = dict(stored["durations"])
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, AttributeError, KeyError) as ex:
+        log.warning("Could not read " + durations_file + ": " + str(ex))
+    return durations
+
+
+def save_durations(durations_file=None):
+    """Store duration history if it has changed
+    :param durations_file: File name, None for default
+    :return: None
+    """
+    global durations_changed
+    if not durations_changed:
+        return
+    if durations_file is None:
+        durations_file = get_durations_file()
+    with lock:
+        data = json.dumps(
+            {"version": DURATIONS_VERSION, "durations": durations},
+            sort_keys=True,
+        )
+        durations_changed = False
+    temporary_file = durations_file + "." + str(os.getpid())
+    try:
+        os.makedirs(os.path.dirname(durations_file), exist_ok=True)
+        with open(temporary_file, "w") as fp:
+            fp.write(data)
+        os.replace(temporary_file, durations_file)
+    except OSError as oe:
+        log.warning("Could not write " + durations_file + ": " + str(oe))
+
+
+def add_duration(task, duration):
+    """Update weighted mean duration of the task with the latest run
+    :param task: Task object
+    :param duration: Duration of the run in seconds
+    :return: None
+    """
+    global durations_changed
+    with lock:
+        if durations is None:
+            load_durations()
+        key = get_duration_key(task)
+        if key in durations:
+            duration = DURATION_SMOOTHING * duration + \
+                (1 - DURATION_SMOOTHING) * durations[key]
+        if durations.get(key) != duration:
+            durations[key] = duration
+            durations_changed = True
+
+
+def get_expected_duration(task):
+    """Get weighted mean duration of earlier runs of the task
+    :param task: Task object
+    :return: Duration in seconds or None if task has not been run
+    """
+    if durations is None:
+        with lock:
+            if durations is None:
+                load_durations()
+    return durations.get(get_duration_key(task))
+
+
+def add_result(task, values, result, duration=None):
     """
     Add task name, it's input values at execution time and result
     and store these, including the timestamp it was stored to memory
     :param task: Name of task that was executed
     :param values: Dictionary of values given as input to the task
     :param result: THe result value task execution returned
+    :param duration: Seconds it took to run the task, if measured
     :return: None
     """
 
-    global results_in_order
-    global results_by_values
     finish_timestamp = time.time()
-    results_in_order.append(
-        {
-            "finish_timestamp": finish_timestamp,
-            "task": task,
-            "values": values,
-            "result": result,
-        },
-    )
-    results_by_values[task.get_namedtuple(values)] = {
+    key = task.get_key(values)
+    stored = {
         "finish_timestamp": finish_timestamp,
+        "task": task,
         "values": values,
         "result": result,
     }
+    with lock:
+        store_result(key, stored)
+        append_result(task, stored, key)
+        if indexed:
+            index_result(stored)
+        evict()
+    if duration is not None:
+        add_duration(task, duration)
+
+
+def store_result(key, stored):
+    """Add result to results_by_values as the most recently used one
+    """
+    global result_bytes
+    if key in results_by_values:
+        release(key)
+        if results_by_values[key] is not stored:
+            # Task was run again with the same values
+            discard(results_by_values[key])
+    results_by_values[key] = stored
+    if max_result_bytes is not None:
+        size = get_size(stored["result"])
+        result_sizes[key] = size
+        result_bytes += size
+    if pin_depth:
+        pinned_keys.add(key)
+    elif is_limited():
+        evictable[key] = None
+
+
+def append_result(task, stored, key):
+    """Add result to results_in_order or buffer of current thread
+    and make it the latest result of the task
+    """
+    global latest_mask
+    buffer = getattr(thread_data, "buffer", None)
+    if buffer is None:
+        results_in_order.append(stored)
+        index_entry(stored)
+        trim_history()
+    else:
+        buffer.append(stored)
+    if stored["result"] is not None:
+        previous_key = latest_keys.get(task.name)
+        result_generations[task.name] = generation
+        latest_keys[task.name] = key
+        latest_results[task.name] = stored["result"]
+        latest_mask |= 1 << taskgraph.symbols.intern(task.name)
+        taskgraph.dag.set_value_available(task.name, RESULT)
+        evictable.pop(key, None)
+        if previous_key != key:
+            unpin(previous_key)
+
+
+def remove_entry(entries, stored):
+    """Remove entry from list of entries by identity. The list is searched
+    from the end where entries of recently used results are.
+    :return: True if the entry was found
+    """
+    for i in range(len(entries) - 1, -1, -1):
+        if entries[i] is stored:
+            del entries[i]
+            return True
+    return False
+
+
+def index_entry(stored):
+    """Make entry added to results_in_order the latest entry of it's task
+    """
+    task_name = stored["task"].name
+    latest_entries[task_name] = stored
+    result = stored["result"]
+    if result is None:
+        return
+    latest_result_entries[task_name] = stored
+    latest_result_entries.move_to_end(task_name)
+    try:
+        short = len(result) <= SHORT_RESULT_LENGTH
+    except TypeError:
+        short = False
+    if short:
+        latest_short_entries[task_name] = stored
+        latest_short_entries.move_to_end(task_name)
+
+
+def is_limited():
+    return max_results is not None or max_result_bytes is not None
+
+
+def is_pinned(key):
+    """Check result is the latest result of it's task which is not stale
+    or it has been added or used inside pinned block
+    """
+    if key in pinned_keys:
+        return True
+    task_name = key[0]
+    return latest_keys.get(task_name) == key and task_name in latest_results
+
+
+def unpin(key):
+    """Make result evictable if it is not pinned anymore
+    """
+    if is_limited() and key in results_by_values and not is_pinned(key):
+        evictable[key] = None
+        evictable.move_to_end(key)
+
+
+def touch(key):
+    """Mark result most recently used
+    """
+    if key in evictable:
+        evictable.move_to_end(key)
+    elif pin_depth:
+        pinned_keys.add(key)
+
+
+def release(key):
+    """Forget bookkeeping of result which is removed or replaced
+    """
+    global result_bytes
+    evictable.pop(key, None)
+    result_bytes -= result_sizes.pop(key, 0)
+
+
+def evict():
+    """Remove least recently used results from results_by_values until
+    they are within limits. Result and values of evicted entries are set
+    to None, which also removes them from entries in results_in_order.
+    """
+    while evictable and (
+        (max_results is not None and len(results_by_values) > max_results) or
+        (max_result_bytes is not None and result_bytes > max_result_bytes)
+    ):
+        key, _ = evictable.popitem(last=False)
+        release(key)
+        discard(results_by_values.pop(key))
+
+
+def discard(stored):
+    """Forget result and values of entry removed from results_by_values.
+    The entry is left out of results_in_order and query as well.
+    """
+    global dead_entries
+    stored["result"] = None
+    stored["values"] = None
+    if indexed:
+        dead_entries += 1
+
+
+def trim_history():
+    """Forget oldest entries of results_in_order when there are more than
+    HISTORY_FACTOR entries for each result. Entries are removed in
+    batches to keep appending constant time.
+    """
+    if max_results is None:
+        return
+    limit = HISTORY_FACTOR * max(max_results, 1)
+    if len(results_in_order) > 2 * limit:
+        del results_in_order[:len(results_in_order) - limit]
+
+
+def get_size(value):
+    """Estimate memory taken by value including values contained in
+    dictionaries, lists, tuples and sets
+    :return: Size in bytes
+    """
+    size = 0
+    seen = set()
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if id(value) in seen:
+            continue
+        seen.add(id(value))
+        size += sys.getsizeof(value)
+        if isinstance(value, dict):
+            stack.extend(value.keys())
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            stack.extend(value)
+    return size
+
+
+def set_limits(count=None, size=None):
+    """Limit the results kept in memory for long running sessions.
+    Least recently used results exceeding either limit are evicted,
+    except the latest results of tasks which are not stale and results
+    added or used inside pinned blocks.
+
+    :param count: Maximum number of results, None for no limit
+    :param size: Maximum total estimated size of results in bytes,
+        None for no limit
+    :return: None
+    """
+    global max_results
+    global max_result_bytes
+    global result_bytes
+    with lock:
+        max_results = None if count is None else max(0, int(count))
+        max_result_bytes = None if size is None else max(0, int(size))
+        result_sizes.clear()
+        result_bytes = 0
+        evictable.clear()
+        for key, stored in results_by_values.items():
+            if max_result_bytes is not None:
+                result_sizes[key] = get_size(stored["result"])
+                result_bytes += result_sizes[key]
+            unpin(key)
+        evict()
+        trim_history()
+
+
+def set_indexes(input_names=()):
+    """Index results by task name, finish timestamp and values of given
+    inputs to make query fast. Results added earlier are indexed too.
+
+    :param input_names: Iterable of input names, None to stop indexing
+    :return: None
+    """
+    global indexed
+    global indexed_inputs
+    with lock:
+        indexed = input_names is not None
+        indexed_inputs = set(input_names or ())
+        rebuild_indexes()
+
+
+def rebuild_indexes():
+    """Index results in results_by_values again
+    """
+    global task_index
+    global input_indexes
+    global timestamp_index
+    global timestamp_entries
+    global dead_entries
+    task_index = dict()
+    input_indexes = dict()
+    timestamp_index = list()
+    timestamp_entries = list()
+    dead_entries = 0
+    if indexed:
+        for stored in sorted(
+            results_by_values.values(),
+            key=lambda stored: stored["finish_timestamp"],
+        ):
+            index_result(stored)
+
+
+def index_result(stored):
+    """Add entry of result to the indexes
+    """
+    if dead_entries > len(timestamp_entries) // 2:
+        rebuild_indexes()
+    timestamp = stored["finish_timestamp"]
+    if timestamp_index and timestamp < timestamp_index[-1]:
+        # Results of concurrently run tasks are added out of order
+        position = bisect.bisect_right(timestamp_index, timestamp)
+        timestamp_index.insert(position, timestamp)
+        timestamp_entries.insert(position, stored)
+    else:
+        timestamp_index.append(timestamp)
+        timestamp_entries.append(stored)
+    task_index.setdefault(stored["task"].name, list()).append(stored)
+    values = stored["values"]
+    for input_name in indexed_inputs:
+        if input_name in values:
+            try:
+                input_indexes.setdefault(input_name, dict()).setdefault(
+                    values[input_name],
+                    list(),
+                ).append(stored)
+            except TypeError:
+                # Values which are not hashable are not indexed
+                pass
+
+
+def query(task=None, where=None, since=None, until=None):
+    """Find results of task runs. Results are looked up from the indexes
+    when indexing has been enabled with set_indexes, by the value of some
+    indexed input in where, task or time range in this order. Other
+    conditions are checked from the found results.
+    Evicted results are not found.
+
+    :param task: Task or task name, None for any task
+    :param where: Dictionary of input names and values the task was run with
+    :param since: Earliest finish timestamp, None for no limit
+    :param until: Finish timestamp results finished before, None for no limit
+    :return: List of dictionaries of finish_timestamp, task, values and result
+        in the order of finish_timestamp
+    """
+    if isinstance(task, taskgraph.task.Task):
+        task = task.name
+    if where is None:
+        where = dict()
+    with lock:
+        candidates = None
+        if indexed:
+            for input_name in where:
+                if input_name in indexed_inputs:
+                    try:
+                        candidates = input_indexes.get(input_name, {}).get(
+                            where[input_name],
+                            (),
+                        )
+                        break
+                    except TypeError:
+                        pass
+            if candidates is None and task is not None:
+                candidates = task_index.get(task, ())
+            if candidates is None:
+                start = 0
+                end = len(timestamp_index)
+                if since is not None:
+                    start = bisect.bisect_left(timestamp_index, since)
+                if until is not None:
+                    end = bisect.bisect_left(timestamp_index, until)
+                candidates = timestamp_entries[start:end]
+        else:
+            candidates = list(results_by_values.values())
+        found = list()
+        for stored in candidates:
+            values = stored["values"]
+            if values is None:
+                continue
+            if task is not None and stored["task"].name != task:
+                continue
+            if since is not None and stored["finish_timestamp"] < since:
+                continue
+            if until is not None and stored["finish_timestamp"] >= until:
+                continue
+            matches = True
+            for input_name, value in where.items():
+                if input_name not in values or values[input_name] != value:
+                    matches = False
+                    break
+            if matches:
+                found.append(stored)
+    found.sort(key=lambda stored: stored["finish_timestamp"])
+    return found
+
+
+@contextlib.contextmanager
+def pinned():
+    """Keep results added or used inside with statement by any thread,
+    for instance results of earlier steps still needed by pending steps,
+    in results_by_values until the outermost pinned block exits.
+    """
+    global pin_depth
+    global pinned_keys
+    with lock:
+        pin_depth += 1
+    try:
+        yield
+    finally:
+        with lock:
+            pin_depth -= 1
+            if pin_depth == 0:
+                keys = pinned_keys
+                pinned_keys = set()
+                for key in keys:
+                    unpin(key)
+                evict()
+
+
+def reuse_result(task, values):
+    """Get earlier result of the task with the same values instead of
+    running it. The result becomes the latest result of the task
+    again if it is stale or task has been run with other values after it,
+    moving it's entry to the end of results_in_order.
+
+    :param task: Task object
+    :param values: Dictionary of values given as input to the task
+    :return: Result
+    :raises KeyError: If task has not been run with the values
+    """
+    key = task.get_key(values)
+    with lock:
+        stored = results_by_values[key]
+        touch(key)
+        if stored["result"] is not None and \
+           (latest_keys.get(task.name) != key or is_stale(task.name)):
+            remove_entry(results_in_order, stored)
+            buffer = getattr(thread_data, "buffer", None)
+            if buffer is not None:
+                remove_entry(buffer, stored)
+            append_result(task, stored, key)
+    return stored["result"]
+
+
+@contextlib.contextmanager
+def buffered(buffer):
+    """Collect results added by current thread inside with statement
+    to buffer instead of results_in_order. Buffer is added to
+    results_in_order later with merge to keep the order deterministic.
+    :param buffer: List to append results to
+    """
+    previous_buffer = getattr(thread_data, "buffer", None)
+    thread_data.buffer = buffer
+    try:
+        yield buffer
+    finally:
+        thread_data.buffer = previous_buffer
+
+
+def merge(buffer):
+    """Add results collected with buffered to results_in_order
+    :param buffer: List of results
+    :return: None
+    """
+    with lock:
+        results_in_order.extend(buffer)
+        for stored in buffer:
+            index_entry(stored)
+        trim_history()
+
+
+def next_generation():
+    """Start new generation of values
+    :return: Number of the new generation
+    """
+    global generation
+    with lock:
+        generation += 1
+        return generation
+
+
+def invalidate(task_names):
+    """Mark latest results of tasks stale in current generation.
+    Results are still found by their input values.
+    :param task_names: Iterable of task names
+    :return: None
+    """
+    global latest_mask
+    with lock:
+        for task_name in task_names:
+            stale_generations[task_name] = generation
+            if latest_results.pop(task_name, None) is not None:
+                latest_mask &= ~(1 << taskgraph.symbols.get_id(task_name))
+                unpin(latest_keys[task_name])
+            taskgraph.dag.set_value_unavailable(task_name, RESULT)
+        evict()
+
+
+def is_stale(task_name):
+    """Check the latest result of the task is older than it's inputs
+    """
+    return task_name in stale_generations and \
+        result_generations.get(task_name, -1) < stale_generations[task_name]
 
 
 def get(task_name):
     """
     Get latest structure of task result and execution
-    :param task: Task name
+    :param task_name: Task name
     :return: Dictionary of finish_timestamp, task, values, result
+        or None if task has not been run
     """
-    i = len(results_in_order)-1
-    while i >= 0:
-        if results_in_order[i]["task"] == task:
-            return results_in_order[i]
-        i -= 1
-    return None
+    return latest_entries.get(task_name)
 
 
 def has_result(task, values):
     global results_by_values
-    return task.get_namedtuple(values) in results_by_values
+    return task.get_key(values) in results_by_values
 
 def get_result(task, values):
     if isinstance(task, str):
         return get_result(taskgraph.dag.get_task(task))
-    return results_by_values[task.get_namedtuple(values)]["result"]
+    key = task.get_key(values)
+    with lock:
+        stored = results_by_values[key]
+        touch(key)
+    return stored["result"]
 
 
 def get_results(task, values={}):
@@ -214,12 +864,16 @@ def get_results(task, values={}):
         return get_results(taskgraph.dag.get_task(task), values)
     result = None
     try:
-        result = results_by_values[task.get_namedtuple(values)]
+        key = task.get_key(values)
+        with lock:
+            result = results_by_values[key]
+            touch(key)
     except TypeError as te:
-        # Mandatory input value missing
+        # Values are not hashable
         pass
     except KeyError as ke:
-        # No such task with such values found
+        # Mandatory input value missing
+        # or no such task with such values found
         pass
     return result
 
@@ -228,20 +882,10 @@ def get_all_results():
     """
     Gets a list of tuples containing task name and it's return value.
     Earlier values of same name tasks are not returned despite of result value
+    nor are stale results, see invalidate.
     :return: list(tuple(taskname, result_value))
     """
-    found_tasks = set()
-    results = list()
-    i = len(results_in_order)-1
-    while i >= 0:
-        task_name = results_in_order[i]["task"].name
-        task_result = results_in_order[i]["result"]
-        if task_name not in found_tasks and \
-           task_result is not None:
-                results.insert(0, (task_name, task_result))
-                found_tasks.add(task_name)
-        i -= 1
-    return results
+    return get_latest(latest_result_entries)
 
 
 def get_all_results_in_order():
@@ -250,25 +894,74 @@ def get_all_results_in_order():
     Earlier values of same name tasks are not returned despite of result value
     :return: list(tuple(taskname, result_value))
     """
-    found_tasks = set()
-    results = list()
-    i = len(results_in_order)-1
-    while i >= 0:
-        task_name = results_in_order[i]["task"].name
-        task_result = results_in_order[i]["result"]
-        if task_name not in found_tasks and \
-           task_result is not None and \
-           len(task_result) <= 80:
-            results.insert(0, (task_name, task_result))
-            found_tasks.add(task_name)
-        i -= 1
-    return results
+    return get_latest(latest_short_entries)
 
 
-def reset():
+def get_latest(entries):
+    """Get results of entries which are not stale nor evicted
+    in the order of entries
+    :param entries: Dictionary of entries by task name
+    :return: list(tuple(taskname, result_value))
+    """
+    with lock:
+        return [
+            (task_name, stored["result"])
+            for task_name, stored in entries.items()
+            if stored["result"] is not None and not is_stale(task_name)
+        ]
+
+
+def clear():
+    """Forget all results but keep the runners registered
+    :return: None
+    """
     global results_in_order
     global results_by_values
-    global tasks_by_runner
+    global result_generations
+    global latest_keys
+    global latest_results
+    global latest_mask
+    global stale_generations
+    global evictable
+    global result_sizes
+    global result_bytes
+    global pinned_keys
+    global latest_entries
+    global latest_result_entries
+    global latest_short_entries
     results_in_order = list()
+    latest_entries = dict()
+    latest_result_entries = collections.OrderedDict()
+    latest_short_entries = collections.OrderedDict()
     results_by_values = dict()
-    tasks_by_runner = dict()
\ No newline at end of file
+    evictable = collections.OrderedDict()
+    result_sizes = dict()
+    result_bytes = 0
+    pinned_keys = set()
+    result_generations = dict()
+    latest_keys = dict()
+    latest_results = dict()
+    latest_mask = 0
+    stale_generations = dict()
+    rebuild_indexes()
+    taskgraph.dag.clear_value_source(RESULT)
+
+
+def reset():
+    global tasks_by_runner
+    global generation
+    global durations
+    global durations_changed
+    global max_results
+    global max_result_bytes
+    global indexed
+    global indexed_inputs
+    indexed = False
+    indexed_inputs = set()
+    clear()
+    max_results = None
+    max_result_bytes = None
+    tasks_by_runner = dict()
+    generation = 0
+    durations = None
+    durations_changed = False
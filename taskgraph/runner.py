@@ -1,6 +1,9 @@
 import copy
 import logging
+import types
+
 import taskgraph.dag
+import taskgraph.executor
 import taskgraph.inputs
 import taskgraph.results
 
@@ -43,6 +46,12 @@ class ValueTask:
     already fixed input values..
     The input value may be either a string or another ValueTask which
     needs to be completed in order to fulfull the value of that specific input.
+
+    ValueTasks are immutable. Equal ValueTasks created by the same
+    create_value_task call are the same instance, so inputs shared by
+    several tasks form a DAG instead of being copied to each of them.
+    Results of a run are kept outside of the ValueTasks which can
+    therefore be run any number of times.
     """
 
     @classmethod
@@ -54,40 +63,90 @@ class ValueTask:
         :param name: The task name of the actual task used.
         :param values: Dictionary of the input values.
         """
-        completed_values = dict()
-        task = taskgraph.dag.get_task(name)
-
-        # Construct all values combining the input values and
-        # possible provided values of the task
-        all_values = {**values}
-        all_values = taskgraph.inputs.get_simple_values(
-            module=task.module,
-            values=all_values,
-        )
-        if task and task.provided_values:
-            all_values.update(task.provided_values)
-        all_task_inputs = task.input_names + task.optional_input_names
-        for input_name in all_task_inputs:
-            if input_name in all_values:
-                if taskgraph.dag.is_task(all_values[input_name]):
-                    # Input value is a task
-                    completed_values[input_name] = cls.create_value_task(
-                        name=all_values[input_name],
-                        values=all_values,
-                    )
+        # Created ValueTasks by task name and id of the values they were
+        # created from. Inputs of a task are given the same dictionary
+        # of values, so a task shared by them is created only once.
+        created = dict()
+        # Simple values by id of the values they were made of
+        simple_values = dict()
+        # Keeps dictionaries alive while their ids are used as keys
+        all_values_list = list()
+        # Equal ValueTasks
+        shared = dict()
+
+        def create_frame(name, values):
+            task = taskgraph.dag.get_task(name)
+
+            # Construct all values combining the input values and
+            # possible provided values of the task
+            all_values = simple_values.get(id(values))
+            if all_values is None:
+                all_values = taskgraph.inputs.get_simple_values(
+                    module=task.module,
+                    values=values,
+                )
+                simple_values[id(values)] = all_values
+                all_values_list.append(values)
+            if task and task.provided_values:
+                all_values = {**all_values, **task.provided_values}
+                all_values_list.append(all_values)
+            all_task_inputs = task.input_names + task.optional_input_names
+            # Index of next input is the last item
+            return [
+                (name, id(values)),
+                name,
+                task,
+                all_values,
+                dict(),
+                all_task_inputs,
+                0,
+            ]
+
+        # ValueTasks being created. ValueTasks of inputs are created
+        # before the ValueTask having them.
+        stack = [create_frame(name, values)]
+        while True:
+            frame = stack[-1]
+            key, name, task, all_values, completed_values, \
+                all_task_inputs, index = frame
+            input_task_name = None
+            while index < len(all_task_inputs):
+                input_name = all_task_inputs[index]
+                if input_name in all_values:
+                    if taskgraph.dag.is_task(all_values[input_name]):
+                        # Input value is a task
+                        input_task_name = all_values[input_name]
+                    else:
+                        completed_values[input_name] = all_values[input_name]
+                elif taskgraph.dag.is_task(input_name):
+                        # Either current input is actually a task name
+                        # or input is not specified in inputs
+                        input_task_name = input_name
                 else:
-                    completed_values[input_name] = all_values[input_name]
-            elif taskgraph.dag.is_task(input_name):
-                    # Either current input is actually a task name
-                    # or input is not specified in inputs
-                    completed_values[input_name] = cls.create_value_task(
-                        name=input_name,
-                        values=all_values,
-                    )
-            else:
-                if input_name not in task.optional_input_names:
-                    raise MissingInputException(input_name)
-        return ValueTask(name=name, values=completed_values, task=task)
+                    if input_name not in task.optional_input_names:
+                        raise MissingInputException(input_name)
+                if input_task_name is not None:
+                    input_key = (input_task_name, id(all_values))
+                    if input_key not in created:
+                        break
+                    completed_values[input_name] = created[input_key]
+                    input_task_name = None
+                index += 1
+            if input_task_name is not None:
+                # Create ValueTask of the input and check it again
+                frame[-1] = index
+                stack.append(create_frame(input_task_name, all_values))
+                continue
+            value_task = cls(name=name, values=completed_values, task=task)
+            try:
+                value_task = shared.setdefault(value_task, value_task)
+            except TypeError:
+                # Values are not hashable, ValueTask is not shared
+                pass
+            created[key] = value_task
+            stack.pop()
+            if not stack:
+                return value_task
 
     def __init__(self, name, values={}, task=None):
         """Creates ValueTask instance from task and given dict of input values.
@@ -98,56 +157,107 @@ class ValueTask:
         :param values: Dictionary of the input values.
         """
         self.name = name
-        self.values = values
+        self.values = types.MappingProxyType(dict(values))
         self.task = task
         if self.task is None and name:
             self.task = taskgraph.dag.get_task(name)
+        # Names of inputs which are ValueTasks in order of values
+        self.input_value_tasks = tuple(
+            input_name for input_name in self.values
+            if isinstance(self.values[input_name], ValueTask)
+        )
+        # Hash of ValueTask inputs is cached in them
+        try:
+            self.hash = hash(frozenset(self.values.items())) + hash(self.task)
+        except TypeError:
+            self.hash = None
 
     def run(self):
-        # TODO store results to separate structure,
-        #      do not contaminate self.inputs?
-        # TODO parallel execution of ValueTask inputs
-        result = None
-        for input_name in self.values:
-            input_value = self.values[input_name]
-            if isinstance(input_value, ValueTask):
-                self.values[input_name] = input_value.run()
+        with taskgraph.results.pinned():
+            if taskgraph.executor.is_parallel():
+                return taskgraph.executor.run_value_task(self)
+            return self.evaluate(dict())
+
+    def evaluate(self, node_results):
+        """Run ValueTask inputs not run yet and the task itself
+        :param node_results: Dictionary of results by id of ValueTask
+        :return: Result of the task
+        """
+        # ValueTasks being run as lists of ValueTask, it's input values,
+        # result of last evaluated input and index of next input.
+        # Inputs are run before the ValueTask having them.
+        stack = [[self, dict(self.values), None, 0]]
+        while stack:
+            frame = stack[-1]
+            value_task, values, result, index = frame
+            if id(value_task) in node_results:
+                stack.pop()
+                continue
+            input_names = value_task.input_value_tasks
+            while index < len(input_names):
+                input_value = values[input_names[index]]
+                if id(input_value) not in node_results:
+                    break
+                values[input_names[index]] = node_results[id(input_value)]
                 # Store last run and evaluated input as result to handle aliases
-                result = self.values[input_name]
-            elif taskgraph.dag.is_task(input_value):
-                print(input_value + " is task")
+                result = values[input_names[index]]
+                index += 1
+            if index < len(input_names):
+                frame[2] = result
+                frame[3] = index
+                stack.append([input_value, dict(input_value.values), None, 0])
+                continue
+            node_results[id(value_task)] = value_task.run_task(values, result)
+            stack.pop()
+        return node_results[id(self)]
+
+    def run_task(self, values, result=None):
+        """Run the task itself with results of the ValueTask inputs.
+
+        :param values: Input values with results of ValueTask inputs
+        :param result: Result of the last evaluated input returned
+            when the task has no runnable
+        :return: Result of the task
+        """
         if self.task.runnable:
             # Try to fetch result from the cache
             result = taskgraph.results.get_results(
                 self.task,
-                self.values,
+                values,
             )
-            if result and "result" in result:
-                result = result["result"]
+            if result is not None:
+                try:
+                    result = taskgraph.results.reuse_result(
+                        self.task,
+                        values,
+                    )
+                except KeyError:
+                    # Evicted after it was found
+                    result = None
             # No result in cache. We need to execute
             if result == None:
-                result = self.task.run(self.values)
+                result = self.task.run(values)
         return result
 
     def __hash__(self):
-        return hash(frozenset(self.values.items())) + hash(self.task)
+        if self.hash is None:
+            raise TypeError("ValueTask with unhashable values")
+        return self.hash
 
     def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, ValueTask):
+            return False
+        if self.hash is not None and other.hash is not None and \
+           self.hash != other.hash:
+            return False
         return self.values == other.values and \
             self.task == other.task
 
     def __deepcopy__(self, memo={}):
-        values = dict()
-        completed_values = dict()
-        for input_name in self.values:
-            input_value = self.values[input_name]
-            values[input_name] = copy.deepcopy(input_value, memo)
-        for input_name in self.values:
-            input_value = self.values[input_name]
-            completed_values[input_name] = copy.deepcopy(input_value, memo)
-        result = type(self)(self.name, values)
-        result.values = completed_values
-        return result
+        # ValueTasks are immutable
+        return self
 
 
 class CommandLineTask(ValueTask):
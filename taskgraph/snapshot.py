@@ -0,0 +1,176 @@
+# This file takes care of storing registered tasks and the indexes of
+# dag and inputs to a single file, so that they do not need to be parsed
+# from json and python modules on every start.
+
+import hashlib
+import logging
+import os
+import pathlib
+import pickle
+
+import taskgraph.config
+import taskgraph.dag
+import taskgraph.inputs
+import taskgraph.modules
+import taskgraph.symbols
+
+log = logging.getLogger("taskgraph")
+
+# Changing the format of stored snapshot requires incrementing the version
+SNAPSHOT_VERSION = 7
+
+
+def get_snapshot_file():
+    return taskgraph.config.get_taskgraph_dir() + "/registry.pickle"
+
+
+def get_source_files(json_directories=[], python_directories=[]):
+    """Get all files the registered tasks are constructed from.
+    Includes the framework itself, so that changes there invalidate
+    the snapshot as well.
+
+    :param json_directories: Directories containing json modules
+    :param python_directories: Directories containing python modules
+    :return: Sorted list of file names as strings
+    """
+    package_directory = pathlib.Path(__file__).parent.resolve()
+    sources = set(package_directory.glob("**/*.py"))
+    sources.update(package_directory.glob("modules/json/*"))
+    for directory in json_directories:
+        sources.update(pathlib.Path(directory).resolve().glob("*"))
+    for directory in python_directories:
+        sources.update(pathlib.Path(directory).resolve().glob("*.py"))
+    return sorted(str(source) for source in sources if source.is_file())
+
+
+def get_file_hash(path):
+    with open(path, "rb") as fp:
+        return hashlib.sha256(fp.read()).hexdigest()
+
+
+def describe_sources(sources):
+    """Get modification time, size and content hash of source files
+    :return: Dictionary with file name as key
+    """
+    result = dict()
+    for source in sources:
+        stat = os.stat(source)
+        result[source] = {
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": get_file_hash(source),
+        }
+    return result
+
+
+def sources_match(described_sources, sources):
+    """Check described sources still match the source files.
+    Content hash is calculated only when mtime or size has changed.
+    Descriptions of sources whose content has not changed are updated
+    with their current mtime and size.
+
+    :return: Tuple of booleans whether sources match and whether
+        some description was updated
+    """
+    if set(described_sources) != set(sources):
+        return False, False
+    updated = False
+    for source in sources:
+        description = described_sources[source]
+        try:
+            stat = os.stat(source)
+        except OSError:
+            return False, updated
+        if stat.st_mtime_ns == description["mtime"] and \
+           stat.st_size == description["size"]:
+            continue
+        if get_file_hash(source) != description["hash"]:
+            return False, updated
+        description["mtime"] = stat.st_mtime_ns
+        description["size"] = stat.st_size
+        updated = True
+    return True, updated
+
+
+def executables_match(checked_executables):
+    for executable, available in checked_executables.items():
+        if taskgraph.modules.is_command_available(executable) != available:
+            return False
+    return True
+
+
+def save(sources, snapshot_file=None):
+    """Store currently registered tasks with dag and input indexes.
+
+    :param sources: Source files tasks were registered from
+    :param snapshot_file: File name to store snapshot to
+    :return: True if snapshot was stored
+    """
+    if snapshot_file is None:
+        snapshot_file = get_snapshot_file()
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "sources": describe_sources(sources),
+        "executables": dict(taskgraph.modules.checked_executables),
+        "symbols": taskgraph.symbols.get_state(),
+        "dag": taskgraph.dag.get_state(),
+        "inputs": taskgraph.inputs.get_state(),
+    }
+    return write(snapshot, snapshot_file)
+
+
+def write(snapshot, snapshot_file):
+    """Store snapshot dictionary to file
+    :return: True if snapshot was stored
+    """
+    try:
+        data = pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, AttributeError, TypeError) as pe:
+        # Some runnable can not be recreated from reference
+        log.warning("Could not create registry snapshot: " + str(pe))
+        return False
+    temporary_file = snapshot_file + "." + str(os.getpid())
+    try:
+        os.makedirs(os.path.dirname(snapshot_file), exist_ok=True)
+        with open(temporary_file, "wb") as fp:
+            fp.write(data)
+        os.replace(temporary_file, snapshot_file)
+    except OSError as oe:
+        log.warning("Could not write " + snapshot_file + ": " + str(oe))
+        return False
+    return True
+
+
+def load(sources, snapshot_file=None):
+    """Restore tasks with dag and input indexes from snapshot
+    if it is still valid for given sources.
+
+    :param sources: Source files tasks would be registered from
+    :param snapshot_file: File name of stored snapshot
+    :return: True if tasks were restored
+    """
+    if snapshot_file is None:
+        snapshot_file = get_snapshot_file()
+    try:
+        with open(snapshot_file, "rb") as fp:
+            snapshot = pickle.load(fp)
+    except FileNotFoundError:
+        return False
+    except Exception as ex:
+        log.warning("Could not read " + snapshot_file + ": " + str(ex))
+        return False
+    if not isinstance(snapshot, dict) or \
+       snapshot.get("version") != SNAPSHOT_VERSION:
+        return False
+    match, updated = sources_match(snapshot["sources"], sources)
+    if not match or not executables_match(snapshot["executables"]):
+        return False
+    if updated:
+        # Files touched without changes are not hashed again on next start
+        write(snapshot, snapshot_file)
+    # Restored indexes refer to symbols by their ids
+    taskgraph.symbols.set_state(snapshot["symbols"])
+    taskgraph.dag.set_state(snapshot["dag"])
+    taskgraph.inputs.set_state(snapshot["inputs"])
+    taskgraph.modules.checked_executables.update(snapshot["executables"])
+    return True
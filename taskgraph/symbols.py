@@ -0,0 +1,100 @@
+# This file contains the interned symbol table of all task, input and
+# value names including module prefixed aliases of inputs.
+# Each name is given a small integer id when it is seen first time.
+# Sets of names are represented as bitsets, integers having the bit of
+# each contained id set, to make set algebra over names cheap.
+
+# Key is name, value is id
+ids_by_name = dict()
+
+# Names by their id
+names = list()
+
+
+def intern(name):
+    """Get id of the name, adding the name to the table if needed
+    :param name: Name as string
+    :return: Id as integer
+    """
+    try:
+        return ids_by_name[name]
+    except KeyError:
+        id = len(names)
+        ids_by_name[name] = id
+        names.append(name)
+        return id
+
+
+def get_id(name):
+    """Get id of the name
+    :return: Id or None if name has not been interned
+    """
+    return ids_by_name.get(name)
+
+
+def get_name(id):
+    return names[id]
+
+
+def intern_mask(value_names):
+    """Get bitset of names, adding names to the table if needed
+    :param value_names: Iterable of names
+    :return: Bitset as integer
+    """
+    mask = 0
+    for name in value_names:
+        mask |= 1 << intern(name)
+    return mask
+
+
+def get_mask(value_names):
+    """Get bitset of names. Names which have not been interned can not
+    be in any bitset created with intern_mask and are left out.
+    :param value_names: Iterable of names, for instance a dictionary
+    :return: Bitset as integer
+    """
+    mask = 0
+    for name in value_names:
+        id = ids_by_name.get(name)
+        if id is not None:
+            mask |= 1 << id
+    return mask
+
+
+def has(mask, name):
+    """Check name is in bitset
+    """
+    id = ids_by_name.get(name)
+    return id is not None and (mask >> id) & 1 == 1
+
+
+def get_names(mask):
+    """Get names in bitset in order of their ids
+    :return: List of names
+    """
+    result = list()
+    while mask:
+        lowest = mask & -mask
+        result.append(names[lowest.bit_length() - 1])
+        mask ^= lowest
+    return result
+
+
+def get_state():
+    return {"names": names}
+
+
+def set_state(state):
+    global ids_by_name
+    global names
+    names = list(state["names"])
+    ids_by_name = dict()
+    for id, name in enumerate(names):
+        ids_by_name[name] = id
+
+
+def reset():
+    global ids_by_name
+    global names
+    ids_by_name = dict()
+    names = list()
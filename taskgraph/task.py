@@ -3,12 +3,19 @@ log = logging.getLogger("taskgraph")
 log.setLevel(1)
 
 import collections
+import inspect
+import operator
 import re
 import select
 import subprocess
+import sys
+import time
 
+import taskgraph.cache
 import taskgraph.dag
+import taskgraph.engine
 import taskgraph.inputs
+import taskgraph.processpool
 import taskgraph.results
 import taskgraph.values
 import taskgraph.util
@@ -80,15 +87,12 @@ class Task:
                    found_given_inputs[i][-1] == '}':
                     found_given_inputs[i] = found_given_inputs[i][1:-1]
                 i += 1
-            name_container = (name, )
-
-            def inline_value_runnable(**kwargs):
-                return name_container[0].format(**kwargs)
             task = Task(
                 name=name,
                 inputs=found_given_inputs,
-                runnable=inline_value_runnable,
+                runnable=inline_value_runnable(name),
             )
+            task.runnable_reference = ("inline", name)
         else:
             pass
         return task
@@ -116,6 +120,8 @@ class Task:
         defaultInput=None,
         values={},
         module=None,
+        executor=None,
+        cacheTtl=None,
     ):
         """Add and register new task to be used as input for other tasks
         :param name to be used for executing
@@ -132,12 +138,22 @@ class Task:
             but are not relayed to the signature executable call.
         :param values: Dictionary of input names and their values to
                be provided further down to input tasks
+        :param executor: "process" to run python function of the task in
+               a worker process, None to run it in this process
+        :param cacheTtl: Seconds results of the task are kept in
+               the persistent result cache, see taskgraph.cache.
+               None to not store the results.
         """
         # The name of this task to bue used by run_task
         log.info("Registering task "+str(name))
-        self.runnable = None
+        self._runnable = None
+        # Description how to recreate the runnable when it is not bound.
+        # See resolve_runnable_reference
+        self.runnable_reference = None
         self.name = name
         self.module = module
+        self.executor = executor
+        self.cache_ttl = cacheTtl
         # The actual runnable implementation extracted
         # from the first parameter in signature
 
@@ -148,14 +164,17 @@ class Task:
             self.input_names = list(inputs)
         # Optional input names or prerequisites for this task
         self.optional_input_names = list(optionalInputs)
+        # Names of arguments of the runnable in order
+        self.argument_names = tuple(
+            self.input_names + self.optional_input_names,
+        )
         taskgraph.inputs.add_input_names(
             module=self.module,
             inputs=self.input_names + self.optional_input_names,
         )
         self.default_input = defaultInput
         if runnable:
-            self.runnable = runnable
-            taskgraph.results.register_runner(runnable, self)
+            self.bind_runnable(runnable)
         self.provided_values = dict()
         # Check provided_values if they contain inputs to be completed
         # Mapping to generate inline tasks.
@@ -171,6 +190,58 @@ class Task:
             )
         taskgraph.dag.add(self.module, self)
 
+    @property
+    def runnable(self):
+        """The runnable of the task. Runnable is recreated from
+        runnable_reference on first access if it is not bound yet.
+        """
+        if self._runnable is None and self.runnable_reference is not None:
+            self.bind_runnable(
+                resolve_runnable_reference(self.runnable_reference),
+            )
+        return self._runnable
+
+    @runnable.setter
+    def runnable(self, runnable):
+        self._runnable = runnable
+
+    def bind_runnable(self, runnable):
+        self._runnable = runnable
+        taskgraph.results.register_runner(runnable, self)
+
+    def is_bound(self):
+        return self._runnable is not None
+
+    def __getstate__(self):
+        """Leave out runnables which can be recreated from runnable_reference
+        to make the task picklable.
+        """
+        state = dict(self.__dict__)
+        if self.runnable_reference is not None:
+            state["_runnable"] = None
+        # Key functions are created again when needed
+        state.pop("get_key", None)
+        state.pop("key_type", None)
+        return state
+
+    def get_key(self, values):
+        """
+        Get tuple of task name and values of it's inputs, mainly used as
+        dictionary key of results. The tuple equals get_namedtuple.
+        The function building the tuple is created on first call and
+        replaces this method.
+
+        :param values: Dictionary containing values of all mandatory inputs
+        :return: Tuple
+        :raises KeyError: If some mandatory input has no value
+        """
+        self.get_key = create_key_function(
+            self.name,
+            self.input_names,
+            self.optional_input_names,
+        )
+        return self.get_key(values)
+
     def get_namedtuple(self, values):
         """
         Get a named tuple containing task name and it's inputs and their values
@@ -179,40 +250,34 @@ class Task:
             unset optional values containing "emtpy_input_value"
         """
         global EMPTY_VALUE
-        tupletype = collections.namedtuple(
-            "task",
-            ["task_name"] + self.input_names + self.optional_input_names,
-            defaults=(EMPTY_VALUE,) * len(self.optional_input_names),
-        )
+        key_type = self.__dict__.get("key_type")
+        if key_type is None:
+            key_type = collections.namedtuple(
+                "task",
+                ("task_name",) + self.argument_names,
+                defaults=(EMPTY_VALUE,) * len(self.optional_input_names),
+            )
+            self.key_type = key_type
         if not "task_name" in values:
             values = dict(values)
             values["task_name"] = self.name
-        return tupletype(**values)
+        return key_type(**values)
 
     def get_relevant_values(self, values):
         """Strip given values so that only relevant values to this task
            are included."""
-        new_values = dict()
-        new_values.update(
-            values_subset(
-                values,
-                self.input_names + self.optional_input_names,
-            )
-        )
-        return new_values
+        return {
+            name: values[name]
+            for name in self.argument_names
+            if name in values
+        }
 
     def get_missing_inputs(self, values):
-        missing_inputs = list()
-        delivered_inputs = frozenset(values.keys())
-        for input in self.input_names:
-            if input not in delivered_inputs:
-                missing_inputs.append(input)
-        return missing_inputs
+        return [input for input in self.input_names if input not in values]
 
     def run(self, values):
         call_args = self.get_relevant_values(values)
-        fulfilled_dependencies = set(call_args.keys())
-        missing_dependencies = set(self.input_names) - fulfilled_dependencies
+        missing_dependencies = self.get_missing_inputs(call_args)
         if missing_dependencies:
             # Not all parameters fullfilled
             log.warning("Not running " + self.name)
@@ -224,10 +289,35 @@ class Task:
         log.warning("with values")
         log.warning("\n" + values_as_string(call_args))
 
+        cached = taskgraph.cache.is_enabled() and self.cache_ttl is not None
+        if cached:
+            found, result = taskgraph.cache.get(self, call_args)
+            if found:
+                taskgraph.results.add_result(self, call_args, result)
+                return result
+
         result = None
-        if self.runnable:
+        start = time.perf_counter()
+        if self.executor == taskgraph.processpool.PROCESS_EXECUTOR and \
+           taskgraph.processpool.is_process_reference(
+               self.runnable_reference,
+           ):
+            result = taskgraph.processpool.call(
+                self.runnable_reference,
+                call_args,
+            )
+        elif self.runnable:
             result = self.runnable(**call_args)
-            taskgraph.results.add_result(self, call_args, result)
+        else:
+            return result
+        taskgraph.results.add_result(
+            self,
+            call_args,
+            result,
+            duration=time.perf_counter() - start,
+        )
+        if cached:
+            taskgraph.cache.put(self, call_args, result)
         return result
 
     def is_predecessor_of(self, task):
@@ -287,19 +377,39 @@ class ConsecutiveTask:
         self.next_consecutive_task = next_consecutive_task
 
     def append(self, next_consecutive_task):
+        """Append task after the last task of the chain or after the last
+        task of each branch of conditions in the chain.
+        :return: next_consecutive_task
+        """
+        append_to_ends([self], next_consecutive_task)
+        return next_consecutive_task
+
+    def append_or_follow(self, next_consecutive_task, stack):
+        """Append task after this one if this is the last task of the chain.
+        Otherwise add following task to stack for append_to_ends.
+        """
         if self.next_consecutive_task is not None:
-            return self.next_consecutive_task.append(next_consecutive_task)
+            stack.append(self.next_consecutive_task)
         else:
             self.next_consecutive_task = next_consecutive_task
-        return self.next_consecutive_task
-
 
     def run(self):
-        result = taskgraph.values.fetch_value(self.task_name)
-        if self.next_consecutive_task is not None:
-            result = self.next_consecutive_task.run()
+        """Run tasks of the chain one after another
+        :return: Result of the last task
+        """
+        result = None
+        consecutive_task = self
+        while consecutive_task is not None:
+            result, consecutive_task = consecutive_task.run_step()
         return result
 
+    def run_step(self):
+        """Run this task of the chain only
+        :return: Tuple of result and the following task
+        """
+        result = taskgraph.values.fetch_value(self.task_name)
+        return result, self.next_consecutive_task
+
 
 class Condition(ConsecutiveTask):
     def __init__(self, input_names, evaluator, condition_map=dict()):
@@ -318,30 +428,149 @@ class Condition(ConsecutiveTask):
         global EMPTY_VALUE
         if result != EMPTY_VALUE:
             if result in self.condition_map and self.condition_map[result]:
-                self.condition_map[result].append(next_consecutive_task)
+                append_to_ends(
+                    [self.condition_map[result]],
+                    next_consecutive_task,
+                )
             else:
                 self.condition_map[result] = next_consecutive_task
         else:
-            for result in self.condition_map:
-                self.append(next_consecutive_task=next_consecutive_task, result=result)
+            append_to_ends([self], next_consecutive_task)
         return next_consecutive_task
 
-    def run(self):
+    def append_or_follow(self, next_consecutive_task, stack):
+        for result in self.condition_map:
+            if self.condition_map[result]:
+                stack.append(self.condition_map[result])
+            else:
+                self.condition_map[result] = next_consecutive_task
+
+    def run_step(self):
         # TODO Check get_values() has all the needed values and raise exception if needed
         values = taskgraph.values.get_values()
         values = values_subset(values, self.input_names)
         result = self.evaluator(**values)
         next_consecutive_task = self.condition_map[result]
-        return next_consecutive_task.run()
+        if next_consecutive_task is None:
+            raise KeyError(result)
+        return result, next_consecutive_task
+
+
+def append_to_ends(consecutive_tasks, next_consecutive_task):
+    """Append task after the last task of each chain. Chains are followed
+    through branches of conditions. Tasks shared by several branches are
+    followed only once.
+
+    :param consecutive_tasks: List of first ConsecutiveTasks of the chains
+    :param next_consecutive_task: ConsecutiveTask to be appended
+    :return: None
+    """
+    visited = set()
+    stack = list(consecutive_tasks)
+    while stack:
+        consecutive_task = stack.pop()
+        if id(consecutive_task) in visited:
+            continue
+        visited.add(id(consecutive_task))
+        consecutive_task.append_or_follow(next_consecutive_task, stack)
+
+
+def create_key_function(task_name, input_names, optional_input_names):
+    """Create function returning tuple of task name and values of inputs
+    in order with EMPTY_VALUE for optional inputs without value.
+    See Task.get_key
+
+    :return: Function taking dictionary of values
+    """
+    prefix = (task_name,)
+    input_names = tuple(input_names)
+    optional_input_names = tuple(optional_input_names)
+    if len(input_names) > 1:
+        get_inputs = operator.itemgetter(*input_names)
+    elif input_names:
+        # itemgetter of single item does not return a tuple
+        input_name = input_names[0]
+
+        def get_inputs(values):
+            return (values[input_name],)
+    else:
+        def get_inputs(values):
+            return ()
+
+    if not optional_input_names:
+        def get_key(values):
+            return prefix + get_inputs(values)
+    elif len(optional_input_names) == 1:
+        # Most tasks have at most one optional input
+        optional_input_name = optional_input_names[0]
+
+        def get_key(values):
+            return prefix + get_inputs(values) + (
+                values.get(optional_input_name, EMPTY_VALUE),
+            )
+    else:
+        def get_key(values):
+            return prefix + get_inputs(values) + tuple(
+                [values.get(name, EMPTY_VALUE) for name in optional_input_names]
+            )
+    return get_key
 
 
+def inline_value_runnable(name):
+    def runnable(**kwargs):
+        return name.format(**kwargs)
+    return runnable
+
+
+def function_reference(function):
+    """Get runnable reference of function defined on module level.
+    Modules which are not importable by name are referenced with file path.
+    """
+    module = sys.modules.get(function.__module__)
+    spec = getattr(module, "__spec__", None)
+    path = None
+    if spec is None or not spec.parent:
+        path = inspect.getfile(function)
+    return ("function", function.__module__, function.__name__, path)
+
+
+def resolve_runnable_reference(reference):
+    """Recreate runnable from it's reference.
+    :param reference: Tuple of reference type and it's arguments.
+        ("shell", dict of task_shell_script arguments)
+        ("inline", inline value task name)
+        ("function", module name, function name, module path or None)
+    :return: Runnable
+    """
+    if reference[0] == "shell":
+        return shell_script_runnable(**reference[1])
+    elif reference[0] == "inline":
+        return inline_value_runnable(reference[1])
+    elif reference[0] == "function":
+        _, module_name, function_name, path = reference
+        module = taskgraph.util.import_module(module_name, path)
+        return getattr(module, function_name)
+    raise ValueError("Unknown runnable reference " + str(reference))
+
 
 def task_func(*args, **kwargs):
     def inner_func(runnable):
         determined_values =  taskgraph.util.get_function_name_params(runnable)
         determined_values.update(kwargs)
         module = re.search(r'[^.]+$', runnable.__module__).group(0)
-        Task(module=module, **determined_values)
+        reference = function_reference(runnable)
+        task = None
+        if taskgraph.dag.is_task(determined_values["name"]):
+            task = taskgraph.dag.get_task(determined_values["name"])
+        if task is not None and \
+           task.runnable_reference == reference and \
+           not task.is_bound():
+            # Task restored without runnable is bound on module import
+            task.bind_runnable(runnable)
+        else:
+            task = Task(module=module, **determined_values)
+            task.runnable_reference = reference
+        return runnable
     if args:
         return inner_func(args[0])
     else:
@@ -349,6 +578,9 @@ def task_func(*args, **kwargs):
 
 
 def run_commands(logger, commands):
+    if taskgraph.engine.is_enabled():
+        # Commands are run in asyncio event loop
+        return taskgraph.engine.run_commands(logger, commands)
     READ_SIZE = 8192
     cmd_idx = 0
     while cmd_idx < len(commands):
@@ -465,16 +697,13 @@ def postprocessOutput(output_lines, postprocess_rules):
     return results
 
 
-def task_shell_script(
+def shell_script_runnable(
     name=None,
     executable=None,
     commandLineArguments=None,
     inputs=[],
     optionalInputs=[],
-    defaultInput=None,
-    values={},
     postprocess=None,
-    module=None,
 ):
     def runnable(**resolved_input_values):
         nonlocal name
@@ -517,12 +746,38 @@ def task_shell_script(
                 )
             result = postprocessOutput(result, completed_inputs)
         return result
-    return Task(
+    return runnable
+
+
+def task_shell_script(
+    name=None,
+    executable=None,
+    commandLineArguments=None,
+    inputs=[],
+    optionalInputs=[],
+    defaultInput=None,
+    values={},
+    postprocess=None,
+    module=None,
+    cacheTtl=None,
+):
+    runnable_arguments = {
+        "name": name,
+        "executable": executable,
+        "commandLineArguments": commandLineArguments,
+        "inputs": inputs,
+        "optionalInputs": optionalInputs,
+        "postprocess": postprocess,
+    }
+    task = Task(
         module=module,
         name=name,
-        runnable=runnable,
+        runnable=shell_script_runnable(**runnable_arguments),
         inputs=inputs,
         optionalInputs=optionalInputs,
         defaultInput=defaultInput,
         values=values,
+        cacheTtl=cacheTtl,
     )
+    task.runnable_reference = ("shell", runnable_arguments)
+    return task
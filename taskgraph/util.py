@@ -1,11 +1,14 @@
 import codecs
 import colorama
 import fcntl
+import importlib
+import importlib.util
 import inspect
 import logging
 import os
 import pathlib
 import re
+import sys
 import types
 
 
@@ -57,6 +60,37 @@ def get_basename_without_ext(path):
     )[0]
 
 
+def import_module_from_path(module_name, path):
+    """Import python file as module with given name.
+
+    :param module_name: Name of the module in sys.modules
+    :param path: Path of python file
+    :return: Module
+    """
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def import_module(module_name, path=None):
+    """Import module by name or from path when given.
+    Already imported modules are returned as such.
+
+    :param module_name: Name of the module in sys.modules
+    :param path: Path of python file to be imported as module_name
+    :return: Module
+    """
+    module = sys.modules.get(module_name)
+    if module is not None and \
+       (path is None or getattr(module, "__file__", None) == path):
+        return module
+    if path is None:
+        return importlib.import_module(module_name)
+    return import_module_from_path(module_name, path)
+
+
 def strip_trailing_extension(str):
     """Remove trailing .ext as long as len(ext) > 0"""
     pos = str.find(".")
@@ -211,26 +245,41 @@ def string_to_valid_identifier(string):
 
 
 def get_asciitree(task, values=dict()):
-    parents = []
-    for input in task.input_names + task.optional_input_names:
-        try:
-            input_task = taskgraph.dag.get_task(input)
-
-            parents.append(
-                get_asciitree(
-                    task=input_task,
-                    values=values,
-                ),
+    """Get tree of the task and it's transitive inputs
+    :param task: Task at the bottom of the tree
+    :param values: Dictionary of provided values shown after inputs
+    :return: taskgraph.ascii.AsciiTreeItem
+    """
+    # Tasks whose inputs are being added as tuples of task, iterator of
+    # it's inputs and items of inputs. Items of inputs are created before
+    # the item having them.
+    stack = [(task, iter(task.input_names + task.optional_input_names), [])]
+    while True:
+        task, inputs, parents = stack[-1]
+        for input in inputs:
+            try:
+                input_task = taskgraph.dag.get_task(input)
+            except taskgraph.dag.NoSuchTask:
+                contents = input
+                if input in values:
+                    contents += '=' + values[input]
+                parents.append(
+                    taskgraph.ascii.AsciiTreeItem(contents=contents),
+                )
+                continue
+            input_names = input_task.input_names + \
+                input_task.optional_input_names
+            stack.append((input_task, iter(input_names), []))
+            break
+        else:
+            stack.pop()
+            item = taskgraph.ascii.AsciiTreeItem(
+                contents=task.name,
+                parent_list=parents,
             )
-        except taskgraph.dag.NoSuchTask:
-            contents = input
-            if input in values:
-                contents += '=' + values[input]
-            parents.append(taskgraph.ascii.AsciiTreeItem(contents=contents))
-    return taskgraph.ascii.AsciiTreeItem(
-        contents=task.name,
-        parent_list=parents,
-    )
+            if not stack:
+                return item
+            stack[-1][2].append(item)
 
 def find_variables(string, variables):
     """Finds variables with pattern `{variable}`-
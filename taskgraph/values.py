@@ -1,10 +1,23 @@
+import collections
+
 import taskgraph.dag
+import taskgraph.plan
 import taskgraph.results
+import taskgraph.symbols
+
+# Sources of values in the satisfiability index of taskgraph.dag
+ENVIRONMENT = "environment"
+COMMAND_LINE = "commandLine"
 
 value_names = set()
 environment_values = dict()
 command_line_values = dict()
 
+# Bitsets of names in environment_values and command_line_values,
+# see taskgraph.symbols
+environment_mask = 0
+command_line_mask = 0
+
 
 def add_value_names(names):
     global value_names
@@ -14,9 +27,15 @@ def add_value_names(names):
 def set_environment_values(value_dict={}):
     global value_names
     global environment_values
+    global environment_mask
     for name in value_dict:
         if name in value_names:
+            if name in environment_values and \
+               environment_values[name] != value_dict[name]:
+                invalidate(name)
             environment_values[name] = value_dict[name]
+            environment_mask |= 1 << taskgraph.symbols.intern(name)
+            taskgraph.dag.set_value_available(name, ENVIRONMENT)
 
 def deprecate_input(input_name):
     """Remove a value from cache
@@ -24,46 +43,98 @@ def deprecate_input(input_name):
     :return:
     """
     global environment_values
+    global environment_mask
+    global command_line_mask
     try:
         environment_values.pop(input_name)
+        environment_mask &= ~(1 << taskgraph.symbols.get_id(input_name))
+        taskgraph.dag.set_value_unavailable(input_name, ENVIRONMENT)
     except KeyError:
         pass
     try:
         command_line_values.pop(input_name)
+        command_line_mask &= ~(1 << taskgraph.symbols.get_id(input_name))
+        taskgraph.dag.set_value_unavailable(input_name, COMMAND_LINE)
     except KeyError:
         pass
 
+def get_dirty_names(names):
+    """Get all tasks having some of the names as direct or indirect input.
+    Each task is visited once even if it is reached through several inputs.
+
+    :param names: Iterable of value names
+    :return: Set of task names
+    """
+    dirty_names = set()
+    stack = list(names)
+    while stack:
+        for task_name in taskgraph.dag.get_tasks_having_input(stack.pop()):
+            if task_name not in dirty_names:
+                dirty_names.add(task_name)
+                stack.append(task_name)
+    return dirty_names
+
+
+def invalidate(input_name):
+    """Start new generation in which the values and results of all tasks
+    having input_name as direct or indirect input are stale.
+
+    :param input_name: Name of the changed value
+    :return: Set of stale task names
+    """
+    taskgraph.results.next_generation()
+    dirty_names = get_dirty_names([input_name])
+    for name in dirty_names:
+        deprecate_input(name)
+    taskgraph.results.invalidate(dirty_names)
+    return dirty_names
+
+
 def deprecate_input_recursive(inputs):
     """Remove value from cache.
-    Removes also all values which have had this as input.
+    Removes also all values which have had this as input
+    and marks results having them as input stale.
 
     :param inputs:
     :return:
     """
     for input in inputs:
-        deprecate_input_recursive(
-            taskgraph.dag.get_tasks_having_input(input),
-        )
+        invalidate(input)
         deprecate_input(input)
 
 def set_command_line_value(input_name, value):
     global command_line_values
+    global command_line_mask
+    if input_name in command_line_values and \
+       command_line_values[input_name] == value:
+        return
     deprecate_input_recursive([input_name])
     command_line_values[input_name] = value
+    command_line_mask |= 1 << taskgraph.symbols.intern(input_name)
+    taskgraph.dag.set_value_available(input_name, COMMAND_LINE)
 
 
 def get_values():
-    """
+    """Get all available values. Latest results of tasks override
+    command line values which override environment values.
+    Values are not copied, so the view reflects later changes to them.
 
-    :return:
+    :return: collections.ChainMap of value names and values
     """
     global environment_values
     global command_line_values
-    result = dict()
-    result.update(environment_values)
-    result.update(command_line_values)
-    result.update(taskgraph.results.get_all_results())
-    return result
+    return collections.ChainMap(
+        taskgraph.results.latest_results,
+        command_line_values,
+        environment_values,
+    )
+
+
+def get_available_mask():
+    """Get bitset of names of all available values, see get_values
+    """
+    return environment_mask | command_line_mask | \
+        taskgraph.results.latest_mask
 
 
 def get_value(name):
@@ -82,36 +153,64 @@ def is_valuename(name):
 
 def fetch_value(name):
     """ Fetches the value from cache or
-    executes the task providing it.
+    executes the tasks providing it.
+    Tasks are run according to execution plan of the task
+    compiled for names of currently available values.
+    Stale results are not available, so only the tasks having some
+    changed input are run again.
 
     :param name:
     :return:
     """
     result = get_value(name)
     if result is None:
-        task = taskgraph.dag.get_task(name)
-        values = task.get_relevant_values(get_values())
-        # TODO: Find a way to run dependencies first
-        # has_result will raise TyypeError on missing inputs
-        missing_inputs = task.get_missing_inputs(values)
-        for input in missing_inputs:
-            values[input] = fetch_value(input)
-        if not taskgraph.results.has_result(task, values):
-            result = task.run(values)
-        else:
-            # No result available
-            result = taskgraph.results.get_result(
-                task=task,
-                values=values,
-            )
+        values = get_values()
+        plan = taskgraph.plan.get_plan(name, values, get_available_mask())
+        result = taskgraph.plan.run_plan(plan, values)
     return result
 
 
+def fetch_values(names):
+    """Fetch values of several names at once like fetch_value.
+    Tasks are run according to a single execution plan of all of them,
+    so tasks needed by several names are run once and independent tasks
+    concurrently when taskgraph.executor has several workers.
+
+    :param names: List of value or task names
+    :return: Dictionary of values by name
+    """
+    results = dict()
+    targets = list()
+    for name in names:
+        result = get_value(name)
+        if result is not None:
+            results[name] = result
+        elif name not in targets:
+            targets.append(name)
+    if targets:
+        values = get_values()
+        plan = taskgraph.plan.get_batch_plan(
+            targets,
+            values,
+            get_available_mask(),
+        )
+        results.update(
+            zip(targets, taskgraph.plan.run_batch_plan(plan, values)),
+        )
+    return results
+
+
 def reset():
     global value_names
     global environment_values
     global command_line_values
+    global environment_mask
+    global command_line_mask
     value_names = set()
     environment_values = dict()
     command_line_values = dict()
+    environment_mask = 0
+    command_line_mask = 0
+    taskgraph.dag.clear_value_source(ENVIRONMENT)
+    taskgraph.dag.clear_value_source(COMMAND_LINE)
 
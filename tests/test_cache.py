@@ -0,0 +1,199 @@
+import os
+import pickle
+import sys
+
+from unittest.mock import *
+
+import taskgraph.cache
+import taskgraph.dag
+import taskgraph.main
+import taskgraph.results
+import taskgraph.task
+import taskgraph.values
+
+
+def setup_cache(tmp_path, size=None):
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    taskgraph.values.reset()
+    taskgraph.cache.reset()
+    taskgraph.cache.enable(size, str(tmp_path / "results.sqlite"))
+
+
+def teardown_cache():
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    taskgraph.values.reset()
+    taskgraph.cache.reset()
+
+
+def test_cached_result_is_not_run_again(tmp_path):
+    setup_cache(tmp_path)
+    shout = Mock(side_effect=lambda word: word.upper())
+    task = taskgraph.task.Task(
+        name="shout",
+        runnable=shout,
+        inputs=["word"],
+        cacheTtl=60,
+    )
+    count = Mock(side_effect=lambda word: len(word))
+    uncached = taskgraph.task.Task(
+        name="count",
+        runnable=count,
+        inputs=["word"],
+    )
+    assert task.run({"word": "hi"}) == "HI"
+    assert uncached.run({"word": "hi"}) == 2
+    # Next invocation starts without results in memory
+    taskgraph.results.reset()
+    assert task.run({"word": "hi"}) == "HI"
+    assert uncached.run({"word": "hi"}) == 2
+    assert shout.mock_calls == [call(word="hi")]
+    assert count.call_count == 2
+    # Result read from the cache is the latest result of the task
+    assert taskgraph.results.latest_results["shout"] == "HI"
+    assert task.run({"word": "bye"}) == "BYE"
+    stats = taskgraph.cache.get_stats()
+    assert stats["entries"] == 2
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    teardown_cache()
+
+
+def test_definition_change_is_not_cached(tmp_path):
+    setup_cache(tmp_path)
+    task = taskgraph.task.Task(
+        name="shout",
+        runnable=lambda word: word.upper(),
+        inputs=["word"],
+        cacheTtl=60,
+    )
+    taskgraph.cache.put(task, {"word": "hi"}, "HI")
+    assert taskgraph.cache.get(task, {"word": "hi"}) == (True, "HI")
+    task.optional_input_names.append("volume")
+    assert taskgraph.cache.get(task, {"word": "hi"}) == (False, None)
+    teardown_cache()
+
+
+def test_cached_result_expires(tmp_path):
+    setup_cache(tmp_path)
+    task = taskgraph.task.Task(
+        name="shout",
+        runnable=lambda word: word.upper(),
+        inputs=["word"],
+        cacheTtl=10,
+    )
+    with patch("time.time", return_value=1000.0):
+        taskgraph.cache.put(task, {"word": "hi"}, "HI")
+    with patch("time.time", return_value=1009.0):
+        assert taskgraph.cache.get(task, {"word": "hi"}) == (True, "HI")
+    with patch("time.time", return_value=1011.0):
+        assert taskgraph.cache.get(task, {"word": "hi"}) == (False, None)
+    assert taskgraph.cache.get_stats()["entries"] == 0
+    teardown_cache()
+
+
+def test_least_recently_used_is_evicted(tmp_path):
+    size = len(pickle.dumps("x" * 100))
+    setup_cache(tmp_path, size=size * 2)
+    task = taskgraph.task.Task(
+        name="pad",
+        runnable=lambda word: word * 100,
+        inputs=["word"],
+        cacheTtl=60,
+    )
+    with patch("time.time", return_value=1000.0):
+        taskgraph.cache.put(task, {"word": "a"}, "a" * 100)
+    with patch("time.time", return_value=1001.0):
+        taskgraph.cache.put(task, {"word": "b"}, "b" * 100)
+    with patch("time.time", return_value=1002.0):
+        assert taskgraph.cache.get(task, {"word": "a"})[0]
+    with patch("time.time", return_value=1003.0):
+        taskgraph.cache.put(task, {"word": "c"}, "c" * 100)
+    with patch("time.time", return_value=1004.0):
+        assert taskgraph.cache.get(task, {"word": "a"})[0]
+        assert not taskgraph.cache.get(task, {"word": "b"})[0]
+        assert taskgraph.cache.get(task, {"word": "c"})[0]
+    stats = taskgraph.cache.get_stats()
+    assert stats["entries"] == 2
+    assert stats["size"] == size * 2
+    teardown_cache()
+
+
+def test_cache_command_line(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    setup_cache(tmp_path)
+    task = taskgraph.task.Task(
+        name="shout",
+        runnable=lambda word: word.upper(),
+        inputs=["word"],
+        cacheTtl=60,
+    )
+    taskgraph.cache.put(task, {"word": "hi"}, "HI")
+    taskgraph.main.run_command_line(
+        ["tg", "--cache-stats", "--cache-clear", "--cache-stats"],
+        {},
+    )
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 17
+    assert lines[1] == "entries=1"
+    assert lines[8] == "Removed 1 cached results"
+    assert lines[10] == "entries=0"
+    # Durations are not written when no task was run
+    assert not (tmp_path / ".taskgraph" / "durations.json").exists()
+    teardown_cache()
+
+
+def test_lazy_module_is_not_imported(tmp_path):
+    setup_cache(tmp_path)
+    module_file = tmp_path / "lazymodule.py"
+    module_file.write_text("def shout(word):\n    return word.upper()\n")
+    task = taskgraph.task.Task(name="shout", inputs=["word"], cacheTtl=60)
+    task.runnable_reference = (
+        "function",
+        "lazymodule",
+        "shout",
+        str(module_file),
+    )
+    key = taskgraph.cache.get_key(task, {"word": "hi"})
+    assert not task.is_bound()
+    assert "lazymodule" not in sys.modules
+    # Changing the module source changes the key
+    module_file.write_text("def shout(word):\n    return word.lower()\n")
+    stat = os.stat(module_file)
+    os.utime(module_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert taskgraph.cache.get_key(task, {"word": "hi"}) != key
+    teardown_cache()
+
+
+def test_disabled_cache_is_cleared(tmp_path):
+    setup_cache(tmp_path)
+    task = taskgraph.task.Task(
+        name="shout",
+        runnable=lambda word: word.upper(),
+        inputs=["word"],
+        cacheTtl=60,
+    )
+    taskgraph.cache.put(task, {"word": "hi"}, "HI")
+    taskgraph.cache.put(task, {"word": "bye"}, "BYE")
+    taskgraph.cache.close()
+    taskgraph.cache.disable()
+    assert taskgraph.cache.clear() == 2
+    taskgraph.cache.enable()
+    assert taskgraph.cache.get_stats()["entries"] == 0
+    teardown_cache()
+
+
+def test_disabled_cache_is_not_created(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    teardown_cache()
+    taskgraph.main.run_command_line(
+        ["tg", "--cache-stats", "--cache-clear"],
+        {},
+    )
+    lines = capsys.readouterr().out.splitlines()
+    assert "enabled=False" in lines
+    assert "entries=0" in lines
+    assert "Removed 0 cached results" in lines
+    assert not (tmp_path / ".taskgraph" / "results.sqlite").exists()
+    teardown_cache()
@@ -0,0 +1,83 @@
+import os
+import pathlib
+import subprocess
+import time
+
+from unittest.mock import *
+
+import taskgraph.config
+
+
+def git(*args, cwd=None):
+    subprocess.run(
+        [
+            "git",
+            "-c", "user.name=taskgraph",
+            "-c", "user.email=taskgraph@localhost",
+        ] + list(args),
+        cwd=cwd,
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def create_origin(tmp_path):
+    work = tmp_path / "work"
+    (work / "json").mkdir(parents=True)
+    (work / "json" / "first.json").write_text("[]")
+    git("init", "--initial-branch=main", str(work))
+    git("add", "json", cwd=work)
+    git("commit", "--message", "first", cwd=work)
+    git("clone", "--bare", str(work), str(tmp_path / "modules.git"))
+    git(
+        "remote", "add", "origin", str(tmp_path / "modules.git"),
+        cwd=work,
+    )
+    return work
+
+
+def test_external_modules_refresh(tmp_path):
+    home = tmp_path / "home"
+    (home / ".taskgraph").mkdir(parents=True)
+    work = create_origin(tmp_path)
+    (home / ".taskgraph" / "config").write_text(
+        "[taskgraph]\n"
+        "externalModules = file://" + str(tmp_path / "modules.git") + "\n"
+        "externalModulesTtl = 60\n"
+    )
+    checkout_dir = str(home / ".taskgraph" / "externalModules" / "modules")
+    stamp_file = taskgraph.config.get_stamp_file(checkout_dir)
+
+    with patch("pathlib.Path.home", return_value=home), \
+         patch("taskgraph.config.start_background_refresh") as refresh:
+        # First read clones synchronously
+        taskgraph.config.read_config_file()
+        assert taskgraph.config.external_module_dir == checkout_dir
+        assert os.path.isfile(checkout_dir + "/json/first.json")
+        assert os.path.isfile(stamp_file)
+        assert refresh.mock_calls == []
+
+        # Fresh checkout is used as such
+        taskgraph.config.read_config_file()
+        assert refresh.mock_calls == []
+
+        # Stale checkout is refreshed in background
+        old = time.time() - 120
+        os.utime(stamp_file, (old, old))
+        taskgraph.config.read_config_file()
+        assert refresh.mock_calls == [call(checkout_dir)]
+        assert taskgraph.config.is_fresh(stamp_file, 60)
+
+    # Refresh fast forwards the checkout
+    (work / "json" / "second.json").write_text("[]")
+    git("add", "json", cwd=work)
+    git("commit", "--message", "second", cwd=work)
+    git("push", "origin", "main", cwd=work)
+    os.utime(stamp_file, (old, old))
+    process = taskgraph.config.start_background_refresh(checkout_dir)
+    assert process.wait(timeout=60) == 0
+    assert os.path.isfile(checkout_dir + "/json/second.json")
+    assert taskgraph.config.is_fresh(stamp_file, 60)
+
+    taskgraph.config.external_module_dir = None
@@ -0,0 +1,191 @@
+import io
+import os
+import signal
+import threading
+import time
+
+from unittest.mock import *
+
+import taskgraph.client
+import taskgraph.daemon
+import taskgraph.dag
+import taskgraph.inputs
+import taskgraph.main
+import taskgraph.results
+import taskgraph.task
+import taskgraph.values
+
+
+def test_daemon(tmp_path):
+    taskgraph.dag.reset()
+    taskgraph.inputs.reset()
+    taskgraph.results.reset()
+    taskgraph.values.reset()
+    socket_file = str(tmp_path / "daemon.sock")
+    runnable = Mock(side_effect=lambda greeted: "hello " + greeted)
+    taskgraph.task.Task(
+        name="daemonGreeting",
+        runnable=runnable,
+        inputs=["greeted"],
+    )
+    server = taskgraph.daemon.Server(
+        socket_file=socket_file,
+        run=taskgraph.main.run_command_line,
+    )
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+
+    def forward(argv):
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        exit_code = taskgraph.client.forward(
+            argv=argv,
+            # Durations are written under the home directory
+            environment={
+                "PATH": os.environ.get("PATH", ""),
+                "HOME": str(tmp_path),
+            },
+            cwd=str(tmp_path),
+            socket_file=socket_file,
+            stdout=stdout,
+            stderr=stderr,
+        )
+        return exit_code, stdout.getvalue(), stderr.getvalue()
+
+    try:
+        # Output and exit status are returned to client
+        exit_code, stdout, stderr = forward(
+            ["tg", "greeted=world", "daemonGreeting"],
+        )
+        assert exit_code == 0, stderr
+        assert "export daemonGreeting=\"hello world\"\n" in stdout
+
+        # Result of earlier command is reused
+        exit_code, stdout, _ = forward(
+            ["tg", "greeted=world", "daemonGreeting"],
+        )
+        assert exit_code == 0
+        assert "export daemonGreeting=\"hello world\"\n" in stdout
+        assert runnable.call_count == 1
+
+        # Startup arguments are not read as value names
+        exit_code, stdout, _ = forward(
+            [
+                "tg", "--profile-startup", "greeted=world",
+                "--profile-startup=profile.json", "daemonGreeting",
+            ],
+        )
+        assert exit_code == 0
+        assert "export daemonGreeting=\"hello world\"\n" in stdout
+
+        # Command line values do not persist between commands
+        exit_code, stdout, stderr = forward(["tg", "daemonGreeting"])
+        assert exit_code == 0, stderr
+        assert "Missing input for task daemonGreeting\n" in stdout
+
+        # Results are forgotten after session lifetime
+        server.session_start -= server.session_lifetime + 1
+        exit_code, stdout, _ = forward(
+            ["tg", "greeted=world", "daemonGreeting"],
+        )
+        assert exit_code == 0
+        assert runnable.call_count == 2
+    finally:
+        server.shutdown()
+        thread.join()
+        server.server_close()
+        taskgraph.dag.reset()
+        taskgraph.inputs.reset()
+        taskgraph.results.reset()
+        taskgraph.values.reset()
+
+    # No daemon listening
+    assert forward(["tg"])[0] is None
+
+
+def test_daemon_environment_change(tmp_path):
+    taskgraph.dag.reset()
+    taskgraph.inputs.reset()
+    taskgraph.results.reset()
+    taskgraph.values.reset()
+    socket_file = str(tmp_path / "daemon.sock")
+    taskgraph.task.Task(
+        name="upper",
+        runnable=lambda WORD: WORD.upper(),
+        inputs=["WORD"],
+    )
+    greet = Mock(side_effect=lambda upper: "hello " + upper)
+    taskgraph.task.Task(name="greet", runnable=greet, inputs=["upper"])
+    server = taskgraph.daemon.Server(
+        socket_file=socket_file,
+        run=taskgraph.main.run_command_line,
+    )
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+
+    def forward(environment):
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        exit_code = taskgraph.client.forward(
+            argv=["tg", "greet"],
+            environment=dict(environment, HOME=str(tmp_path)),
+            cwd=str(tmp_path),
+            socket_file=socket_file,
+            stdout=stdout,
+            stderr=stderr,
+        )
+        return exit_code, stdout.getvalue(), stderr.getvalue()
+
+    try:
+        exit_code, stdout, stderr = forward({"WORD": "one"})
+        assert exit_code == 0, stderr
+        assert "export greet=\"hello ONE\"\n" in stdout
+        exit_code, stdout, stderr = forward({"WORD": "two"})
+        assert exit_code == 0, stderr
+        assert "export greet=\"hello TWO\"\n" in stdout
+        # Unchanged environment reuses results
+        exit_code, stdout, stderr = forward({"WORD": "two"})
+        assert exit_code == 0, stderr
+        assert "export greet=\"hello TWO\"\n" in stdout
+        assert greet.call_count == 2
+        # Removed variable makes results depending on it stale
+        exit_code, stdout, stderr = forward({})
+        assert exit_code == 0, stderr
+        assert "Missing input for task greet\n" in stdout
+    finally:
+        server.shutdown()
+        thread.join()
+        server.server_close()
+        taskgraph.dag.reset()
+        taskgraph.inputs.reset()
+        taskgraph.results.reset()
+        taskgraph.values.reset()
+
+
+def test_serve_terminated(tmp_path):
+    socket_file = str(tmp_path / "daemon.sock")
+    previous_handler = Mock()
+
+    def terminate(self):
+        assert os.path.exists(socket_file)
+        os.kill(os.getpid(), signal.SIGTERM)
+        # Handler runs before sleep returns
+        time.sleep(5)
+
+    default_handler = signal.signal(signal.SIGTERM, previous_handler)
+    try:
+        with patch.object(
+            taskgraph.daemon.Server,
+            "serve_forever",
+            terminate,
+        ):
+            taskgraph.daemon.serve(
+                run=taskgraph.main.run_command_line,
+                socket_file=socket_file,
+            )
+        # Socket file is removed and previous handler restored
+        assert previous_handler.call_count == 0
+        assert not os.path.exists(socket_file)
+        assert signal.getsignal(signal.SIGTERM) is previous_handler
+    finally:
+        signal.signal(signal.SIGTERM, default_handler)
@@ -0,0 +1,169 @@
+import random
+import types
+
+import pytest
+
+import taskgraph.dag
+
+
+def create_task(name, inputs=[], optional_inputs=[]):
+    return types.SimpleNamespace(
+        name=name,
+        input_names=list(inputs),
+        optional_input_names=list(optional_inputs),
+        default_input=None,
+    )
+
+
+def assert_topological(graph):
+    order = graph.get_topological_order()
+    assert set(order) == graph.all_value_names
+    for task_name in graph.all_task_names:
+        for input in graph.get_inputs(task_name):
+            assert order.index(input) < order.index(task_name)
+
+
+def test_taskgraph_add_out_of_order():
+    graph = taskgraph.dag.TaskGraph()
+    # Tasks are added before the tasks they have as input
+    graph.add(create_task("greeting", ["fullName"], ["punctuation"]), "a")
+    graph.add(create_task("letter", ["greeting", "body"]), "a")
+    graph.add(create_task("fullName", ["firstName", "lastName"]), "b")
+    graph.add(create_task("firstName", ["person"]), "b")
+    assert_topological(graph)
+    assert graph.get_tasks_having_input("fullName") == {"greeting"}
+    assert graph.get_inputs("greeting") == {"fullName", "punctuation"}
+    assert graph.final_tasks() == {"letter"}
+    assert graph.final_tasks("a") == {"letter"}
+    assert graph.final_tasks("b") == {"fullName"}
+
+    # Other graphs are independent
+    other = taskgraph.dag.TaskGraph()
+    other.add(create_task("greeting", ["name"]))
+    assert other.get_inputs("greeting") == {"name"}
+    assert not other.is_task("letter")
+
+
+def test_taskgraph_cycle():
+    graph = taskgraph.dag.TaskGraph()
+    graph.add(create_task("b", ["a"]))
+    graph.add(create_task("c", ["b"]))
+    with pytest.raises(taskgraph.dag.CycleError):
+        graph.add(create_task("a", ["c"]))
+    with pytest.raises(taskgraph.dag.CycleError):
+        graph.add(create_task("d", [], ["d"]))
+    # Graph is left untouched
+    assert not graph.is_task("a")
+    assert not graph.is_task("d")
+    assert_topological(graph)
+
+
+def test_taskgraph_remove_and_replace():
+    graph = taskgraph.dag.TaskGraph()
+    graph.add(create_task("b", ["a"]), "module")
+    graph.add(create_task("c", ["b", "x"]), "module")
+    graph.add(create_task("b", ["y"]), "module")
+    assert graph.get_tasks_having_input("a") == set()
+    assert "a" not in graph.all_value_names
+    assert graph.get_inputs("b") == {"y"}
+    assert_topological(graph)
+
+    graph.remove("c")
+    assert graph.all_value_names == {"b", "y"}
+    assert graph.final_tasks("module") == {"b"}
+    graph.remove("b")
+    assert graph.get_modules() == []
+    assert graph.all_value_names == set()
+    with pytest.raises(taskgraph.dag.NoSuchTask):
+        graph.remove("b")
+
+
+def get_runnable_tasks_walking(graph, available):
+    runnable = set()
+    changed = True
+    while changed:
+        changed = False
+        for task_name in graph.all_task_names - runnable:
+            if all(
+                input in available or input in runnable
+                for input in graph.get_task(task_name).input_names
+            ):
+                runnable.add(task_name)
+                changed = True
+    return runnable
+
+
+def test_taskgraph_runnable_tasks():
+    graph = taskgraph.dag.TaskGraph()
+    graph.add(create_task("letter", ["greeting", "body"], ["signature"]), "m")
+    graph.add(create_task("greeting", ["fullName"]), "m")
+    graph.add(create_task("fullName", ["firstName", "lastName"]), "n")
+    assert graph.get_runnable_tasks() == set()
+
+    graph.set_value_available("firstName", "environment")
+    graph.set_value_available("lastName", "commandLine")
+    assert graph.get_runnable_tasks() == {"fullName", "greeting"}
+    assert graph.get_runnable_tasks("m") == {"greeting"}
+
+    graph.set_value_available("body", "commandLine")
+    assert graph.get_runnable_tasks() == {"fullName", "greeting", "letter"}
+
+    # Result of a task keeps it's dependents runnable
+    graph.set_value_available("fullName", "result")
+    graph.set_value_unavailable("lastName", "commandLine")
+    assert graph.get_runnable_tasks() == {"greeting", "letter"}
+    graph.clear_value_source("result")
+    assert graph.get_runnable_tasks() == set()
+
+    # Tasks added later are indexed as well
+    graph.set_value_available("lastName", "commandLine")
+    graph.add(create_task("body", ["greeting"]), "m")
+    graph.set_value_unavailable("body", "commandLine")
+    assert graph.get_runnable_tasks() == {
+        "fullName", "greeting", "body", "letter",
+    }
+    graph.remove("fullName")
+    assert graph.get_runnable_tasks() == set()
+
+
+def test_taskgraph_indexes_match_walking():
+    random.seed(1)
+    names = [str(i) for i in range(20)]
+    graph = taskgraph.dag.TaskGraph()
+    available = set()
+    for _ in range(500):
+        operation = random.random()
+        if operation < 0.4:
+            try:
+                graph.add(
+                    create_task(
+                        random.choice(names),
+                        random.sample(names, random.randint(0, 3)),
+                        random.sample(names, random.randint(0, 1)),
+                    ),
+                    random.choice([None, "a", "b"]),
+                )
+            except taskgraph.dag.CycleError:
+                pass
+        elif operation < 0.5 and graph.all_task_names:
+            graph.remove(random.choice(sorted(graph.all_task_names)))
+        elif operation < 0.75:
+            name = random.choice(names)
+            available.add(name)
+            graph.set_value_available(name, "environment")
+        else:
+            name = random.choice(names)
+            available.discard(name)
+            graph.set_value_unavailable(name, "environment")
+        assert graph.get_runnable_tasks() == \
+            get_runnable_tasks_walking(graph, available)
+        assert graph.final_tasks() == set(
+            name for name in graph.all_task_names
+            if not graph.get_tasks_having_input(name)
+        )
+        for module in graph.get_modules():
+            tasks = graph.tasks_by_modules[module]
+            assert graph.final_tasks(module) == set(
+                name for name in tasks
+                if not graph.get_tasks_having_input(name) & tasks
+            )
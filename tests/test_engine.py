@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+import taskgraph.dag
+import taskgraph.engine
+import taskgraph.executor
+import taskgraph.results
+import taskgraph.runner
+import taskgraph.task
+
+
+def create_tasks():
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    for name in ["first", "second", "third"]:
+        taskgraph.task.task_shell_script(
+            name=name,
+            executable="sleep",
+            commandLineArguments="0.3; echo " + name,
+        )
+    taskgraph.task.Task(
+        name="all",
+        runnable=lambda first, second, third: [first, second, third],
+        inputs=["first", "second", "third"],
+    )
+
+
+def run_all(processes):
+    taskgraph.executor.set_workers(4)
+    taskgraph.engine.enable(processes)
+    try:
+        start = time.time()
+        result = taskgraph.runner.ValueTask.create_value_task("all").run()
+        return result, time.time() - start
+    finally:
+        taskgraph.engine.disable()
+        taskgraph.executor.set_workers(1)
+
+
+def test_engine_runs_commands_concurrently():
+    create_tasks()
+    result, duration = run_all(processes=3)
+    assert result == ["first\n", "second\n", "third\n"]
+    assert duration < 0.8
+    assert not taskgraph.engine.is_enabled()
+
+    # Limit of processes applies to all tasks
+    create_tasks()
+    result, duration = run_all(processes=1)
+    assert result == ["first\n", "second\n", "third\n"]
+    assert duration >= 0.9
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+
+
+def test_engine_failed_command():
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    task = taskgraph.task.task_shell_script(
+        name="failing",
+        executable="sh",
+        commandLineArguments="-c 'echo failing >&2; exit 3'",
+    )
+    taskgraph.engine.enable()
+    try:
+        with pytest.raises(taskgraph.task.FailedCommand) as fc:
+            task.run({})
+    finally:
+        taskgraph.engine.disable()
+    assert "exit code: 3" in str(fc.value)
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
@@ -0,0 +1,108 @@
+import threading
+import time
+
+import taskgraph.dag
+import taskgraph.executor
+import taskgraph.results
+import taskgraph.runner
+import taskgraph.task
+
+
+def test_run_value_task_parallel():
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    # Both inputs must be running at the same time to pass the barrier
+    barrier = threading.Barrier(2, timeout=5)
+    calls = list()
+
+    def slow(shared):
+        barrier.wait()
+        time.sleep(0.05)
+        return "slow"
+
+    def fast(shared):
+        barrier.wait()
+        return "fast"
+
+    def shared():
+        calls.append("shared")
+        return "shared"
+
+    taskgraph.task.Task(name="shared", runnable=shared)
+    slow_task = taskgraph.task.Task(
+        name="slow",
+        runnable=slow,
+        inputs=["shared"],
+    )
+    fast_task = taskgraph.task.Task(
+        name="fast",
+        runnable=fast,
+        inputs=["shared"],
+    )
+    taskgraph.task.Task(
+        name="both",
+        runnable=lambda slow, fast: slow + " " + fast,
+        inputs=["slow", "fast"],
+    )
+    taskgraph.executor.set_workers(4)
+    try:
+        valuetask = taskgraph.runner.ValueTask.create_value_task(name="both")
+        assert valuetask.run() == "slow fast"
+    finally:
+        taskgraph.executor.set_workers(1)
+    assert calls == ["shared"]
+    # Results are in the order of sequential execution
+    # although fast finished first
+    assert [
+        result["task"].name
+        for result in taskgraph.results.results_in_order
+    ] == ["shared", "slow", "fast", "both"]
+    assert taskgraph.results.results_in_order[1]["values"] == {
+        "shared": "shared",
+    }
+    assert taskgraph.results.has_result(fast_task, {"shared": "shared"})
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+
+
+def test_schedule():
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    started = list()
+
+    def create_runnable(name):
+        def runnable():
+            started.append(name)
+            time.sleep(0.1)
+            return name
+        return runnable
+
+    for name in ["first", "second", "long"]:
+        taskgraph.task.Task(name=name, runnable=create_runnable(name))
+    taskgraph.task.Task(
+        name="all",
+        runnable=lambda first, second, long: [first, second, long],
+        inputs=["first", "second", "long"],
+    )
+    taskgraph.executor.set_workers(2)
+    try:
+        for schedule, last_started in [
+            (taskgraph.executor.FIFO, "long"),
+            (taskgraph.executor.CRITICAL_PATH, "second"),
+        ]:
+            taskgraph.results.clear()
+            taskgraph.results.durations = {
+                "first": 0.1,
+                "second": 0.1,
+                "long": 10.0,
+            }
+            started.clear()
+            taskgraph.executor.set_schedule(schedule)
+            valuetask = taskgraph.runner.ValueTask.create_value_task("all")
+            assert valuetask.run() == ["first", "second", "long"]
+            assert started[-1] == last_started
+    finally:
+        taskgraph.executor.set_workers(1)
+        taskgraph.executor.set_schedule(taskgraph.executor.CRITICAL_PATH)
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
@@ -0,0 +1,75 @@
+from unittest.mock import *
+
+import taskgraph.dag
+import taskgraph.main
+import taskgraph.results
+import taskgraph.task
+import taskgraph.values
+
+
+def test_run_command_line_batches(tmp_path, monkeypatch, capsys):
+    # Durations are written under the home directory
+    monkeypatch.setenv("HOME", str(tmp_path))
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    taskgraph.values.reset()
+    shout = Mock(side_effect=lambda word: word.upper())
+    taskgraph.task.Task(name="shout", runnable=shout, inputs=["word"])
+    count = Mock(side_effect=lambda word: str(len(word)))
+    taskgraph.task.Task(name="count", runnable=count, inputs=["word"])
+    with patch(
+        "taskgraph.values.fetch_values",
+        wraps=taskgraph.values.fetch_values,
+    ) as fetch_values:
+        taskgraph.main.run_command_line(
+            [
+                "tg",
+                "shout", "word=hi", "count",
+                # Reassigning word fetches earlier targets first
+                "--word", "goodbye", "shout",
+            ],
+            {},
+        )
+    assert fetch_values.mock_calls == [
+        call(["shout", "count"]),
+        call(["shout"]),
+    ]
+    assert shout.mock_calls == [call(word="hi"), call(word="goodbye")]
+    assert count.call_count == 1
+    assert capsys.readouterr().out.splitlines() == [
+        "export shout=HI",
+        "export count=2",
+        # Result of count is stale after word changed
+        "export shout=GOODBYE",
+    ]
+    assert (tmp_path / ".taskgraph" / "durations.json").exists()
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    taskgraph.values.reset()
+
+
+def test_run_command_line_missing_input(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    taskgraph.values.reset()
+    taskgraph.task.Task(
+        name="shout",
+        runnable=lambda word: word.upper(),
+        inputs=["word"],
+    )
+    taskgraph.task.Task(
+        name="greet",
+        runnable=lambda name: "hello " + name,
+        inputs=["name"],
+    )
+    taskgraph.main.run_command_line(["tg", "word=hi", "shout", "greet"], {})
+    # Only the target missing input is reported
+    assert capsys.readouterr().out.splitlines() == [
+        "Missing input for task greet",
+        "('name',)",
+        "export shout=HI",
+    ]
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    taskgraph.values.reset()
@@ -1,3 +1,4 @@
+import json
 import sys
 import os
 
@@ -10,8 +11,36 @@ sys.path.append(
     ),
 )
 
+import taskgraph.dag
 import taskgraph.modules
 
-taskgraph.modules.refresh_path_executables()
 
-taskgraph.modules.register_json_modules()
\ No newline at end of file
+def test_register_json_modules(tmp_path):
+    taskgraph.dag.reset()
+    taskgraph.modules.refresh_path_executables(
+        index_file=str(tmp_path / "pathIndex.json"),
+    )
+    taskgraph.modules.register_json_modules()
+    taskgraph.modules.path_directories = list()
+    taskgraph.modules.executables_by_directory = dict()
+    taskgraph.modules.path_index_file = None
+    taskgraph.dag.reset()
+
+
+def test_cyclic_json_module(tmp_path):
+    taskgraph.dag.reset()
+    (tmp_path / "cyclic.json").write_text(
+        json.dumps(
+            [
+                {"name": "first", "inputs": ["second"]},
+                {"name": "second", "inputs": ["first"]},
+                {"name": "third", "inputs": ["first"]},
+            ],
+        ),
+    )
+    # Task depending on itself is skipped, other tasks are registered
+    taskgraph.modules.register_json_modules(str(tmp_path))
+    assert taskgraph.dag.is_task("first")
+    assert not taskgraph.dag.is_task("second")
+    assert taskgraph.dag.is_task("third")
+    taskgraph.dag.reset()
@@ -0,0 +1,75 @@
+import json
+import os
+
+from unittest.mock import *
+
+import taskgraph.modules
+
+
+def create_executables(directory, names):
+    directory.mkdir()
+    for name in names:
+        (directory / name).write_text("#!/bin/sh\n")
+
+
+def age_directory(directory):
+    # Push directory mtime safely past the mtime granularity
+    stat = os.stat(directory)
+    os.utime(
+        directory,
+        ns=(stat.st_atime_ns, stat.st_mtime_ns - 10 * 10**9),
+    )
+
+
+def test_path_index(tmp_path):
+    first = tmp_path / "first"
+    second = tmp_path / "second"
+    create_executables(first, ["alpha", "beta"])
+    create_executables(second, ["beta", "gamma"])
+    age_directory(first)
+    age_directory(second)
+    paths = [str(first), str(second), str(tmp_path / "missing")]
+    index_file = str(tmp_path / "index" / "pathIndex.json")
+
+    # Nothing indexed yet, directories are scanned on first lookup
+    taskgraph.modules.refresh_path_executables(paths, index_file)
+    assert taskgraph.modules.find_executable("beta") == first / "beta"
+    assert taskgraph.modules.find_executable("gamma") == second / "gamma"
+    assert taskgraph.modules.find_executable("delta") is None
+    with open(index_file) as fp:
+        index = json.load(fp)
+    assert index["directories"][str(first)]["executables"] == [
+        "alpha",
+        "beta",
+    ]
+    assert str(tmp_path / "missing") not in index["directories"]
+
+    # Unchanged directories are not scanned again
+    with patch("taskgraph.modules.scan_directory") as scan_directory:
+        taskgraph.modules.refresh_path_executables(paths, index_file)
+        assert taskgraph.modules.find_executable("gamma") == \
+            second / "gamma"
+        assert scan_directory.mock_calls == []
+
+    # Only changed directory is rescanned
+    (second / "delta").write_text("#!/bin/sh\n")
+    age_directory(second)
+    scan_directory = Mock(side_effect=taskgraph.modules.scan_directory)
+    with patch("taskgraph.modules.scan_directory", scan_directory):
+        taskgraph.modules.refresh_path_executables(paths, index_file)
+        assert taskgraph.modules.find_executable("delta") == \
+            second / "delta"
+        assert scan_directory.mock_calls == [call(str(second))]
+
+    # Directories removed from PATH are pruned on next write
+    (first / "epsilon").write_text("#!/bin/sh\n")
+    age_directory(first)
+    taskgraph.modules.refresh_path_executables([str(first)], index_file)
+    assert taskgraph.modules.find_executable("epsilon") == first / "epsilon"
+    with open(index_file) as fp:
+        index = json.load(fp)
+    assert sorted(index["directories"]) == [str(first)]
+
+    taskgraph.modules.path_directories = list()
+    taskgraph.modules.executables_by_directory = dict()
+    taskgraph.modules.path_index_file = None
@@ -0,0 +1,79 @@
+import sys
+
+import taskgraph.dag
+import taskgraph.inputs
+import taskgraph.modules
+import taskgraph.results
+
+
+STUB_MODULE = '''
+from taskgraph.task import *
+
+@task_func(defaultInput="word")
+def shout(word, times=1):
+    return (word.upper() + "!") * int(times)
+'''
+
+DYNAMIC_MODULE = '''
+import taskgraph.task
+
+for name in ["first", "second"]:
+    taskgraph.task.Task(name=name, runnable=lambda: name)
+'''
+
+
+def test_read_python_manifest(tmp_path):
+    path = tmp_path / "stubmodule.py"
+    path.write_text(STUB_MODULE)
+    assert taskgraph.modules.read_python_manifest(str(path)) == [
+        {
+            "name": "shout",
+            "inputs": ["word"],
+            "optionalInputs": ["times"],
+            "defaultInput": "word",
+        },
+    ]
+    path.write_text(DYNAMIC_MODULE)
+    assert taskgraph.modules.read_python_manifest(str(path)) is None
+
+
+def test_register_python_module_stubs(tmp_path):
+    (tmp_path / "stubmodule.py").write_text(STUB_MODULE)
+    (tmp_path / "dynamicmodule.py").write_text(DYNAMIC_MODULE)
+    taskgraph.modules.register_python_modules(str(tmp_path))
+
+    # Module which registers tasks dynamically is imported right away
+    assert "dynamicmodule" in sys.modules
+    assert taskgraph.dag.is_task("second")
+
+    # Stub is registered without importing module
+    assert "stubmodule" not in sys.modules
+    task = taskgraph.dag.get_task("shout")
+    assert task.module == "stubmodule"
+    assert task.default_input == "word"
+    assert task.optional_input_names == ["times"]
+    assert not task.is_bound()
+
+    # Module is imported and stub bound on first run
+    assert task.run({"word": "hey", "times": "2"}) == "HEY!HEY!"
+    assert "stubmodule" in sys.modules
+    assert task.is_bound()
+    assert taskgraph.dag.get_task("shout") is task
+
+    del(sys.modules["stubmodule"])
+    del(sys.modules["dynamicmodule"])
+    taskgraph.dag.reset()
+    taskgraph.inputs.reset()
+    taskgraph.results.reset()
+
+
+def test_builtin_modules_not_imported(monkeypatch):
+    # Forget modules imported by earlier tests, they are restored afterwards
+    for module_name in ("taskgraph.modules.python.mail", "smtplib"):
+        monkeypatch.delitem(sys.modules, module_name, raising=False)
+    taskgraph.modules.register_python_modules()
+    assert taskgraph.dag.is_task("sendSmtpMail")
+    assert "taskgraph.modules.python.mail" not in sys.modules
+    assert "smtplib" not in sys.modules
+    taskgraph.dag.reset()
+    taskgraph.inputs.reset()
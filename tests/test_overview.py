@@ -0,0 +1,81 @@
+import unittest.mock
+
+import taskgraph.dag
+import taskgraph.inputs
+import taskgraph.overview
+import taskgraph.task
+
+
+def test_overview_cache(tmp_path):
+    taskgraph.dag.reset()
+    taskgraph.inputs.reset()
+    cache_file = str(tmp_path / "overview.json")
+    taskgraph.task.Task(
+        name="fullName",
+        runnable=lambda firstName, lastName: firstName + " " + lastName,
+        inputs=["firstName", "lastName"],
+        module="names",
+    )
+    taskgraph.task.Task(
+        name="greeting",
+        runnable=lambda fullName: "hello " + fullName,
+        inputs=["fullName"],
+        module="names",
+    )
+    taskgraph.task.Task(
+        name="shout",
+        runnable=lambda word: word.upper(),
+        inputs=["word"],
+        module="shouting",
+    )
+
+    overview = taskgraph.overview.get_overview(
+        values={"firstName": "John"},
+        columns=80,
+        cache_file=cache_file,
+    )
+    assert overview.startswith("names\n=====\n")
+    assert "firstName=John" in overview
+    assert "greeting" in overview
+    assert "shouting\n========\n" in overview
+
+    # Unchanged modules are not rendered again
+    with unittest.mock.patch(
+        "taskgraph.overview.render_module",
+        wraps=taskgraph.overview.render_module,
+    ) as render_module:
+        assert taskgraph.overview.get_overview(
+            values={"firstName": "John"},
+            columns=80,
+            cache_file=cache_file,
+        ) == overview
+        assert render_module.call_count == 0
+
+        # Only the module showing the changed value is
+        new_overview = taskgraph.overview.get_overview(
+            values={"firstName": "Jane"},
+            columns=80,
+            cache_file=cache_file,
+        )
+        assert render_module.call_count == 1
+        assert "firstName=Jane" in new_overview
+
+        # Terminal width changes all of them
+        taskgraph.overview.get_overview(
+            values={"firstName": "Jane"},
+            columns=60,
+            cache_file=cache_file,
+        )
+        assert render_module.call_count == 3
+
+        # New renderer version changes all of them
+        with unittest.mock.patch("taskgraph.overview.RENDERER_VERSION", 2):
+            taskgraph.overview.get_overview(
+                values={"firstName": "Jane"},
+                columns=60,
+                cache_file=cache_file,
+            )
+        assert render_module.call_count == 5
+
+    taskgraph.dag.reset()
+    taskgraph.inputs.reset()
@@ -0,0 +1,80 @@
+from unittest.mock import *
+
+import pytest
+
+import taskgraph.dag
+import taskgraph.plan
+import taskgraph.results
+import taskgraph.runner
+import taskgraph.task
+import taskgraph.values
+
+
+def test_compile_plan():
+    taskgraph.dag.reset()
+    taskgraph.plan.reset()
+    full_name = taskgraph.task.Task(
+        name="fullName",
+        runnable=Mock(return_value="John Smith"),
+        inputs=["firstName", "lastName"],
+    )
+    greeting = taskgraph.task.Task(
+        name="greeting",
+        runnable=Mock(return_value="hello John Smith"),
+        inputs=["fullName"],
+        optionalInputs=["punctuation"],
+    )
+    letter = taskgraph.task.Task(
+        name="letter",
+        runnable=Mock(return_value="letter"),
+        inputs=["greeting", "fullName"],
+        optionalInputs=["signature"],
+    )
+    plan = taskgraph.plan.compile_plan(
+        "letter",
+        {"firstName", "lastName", "signature"},
+    )
+    assert plan == (
+        (full_name, (("firstName", None), ("lastName", None))),
+        (greeting, (("fullName", 0),)),
+        (letter, (("greeting", 1), ("fullName", 0), ("signature", None))),
+    )
+    with pytest.raises(taskgraph.runner.MissingInputException):
+        taskgraph.plan.compile_plan("letter", {"firstName"})
+    taskgraph.dag.reset()
+
+
+def test_fetch_value_memoized_plan():
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    taskgraph.values.reset()
+    taskgraph.plan.reset()
+    shout = Mock(side_effect=lambda word: word.upper())
+    taskgraph.task.Task(name="shout", runnable=shout, inputs=["word"])
+    exclaim = Mock(side_effect=lambda shout: shout + "!")
+    taskgraph.task.Task(name="exclaim", runnable=exclaim, inputs=["shout"])
+    taskgraph.values.add_value_names(taskgraph.dag.get_all_value_names())
+
+    with patch(
+        "taskgraph.plan.compile_plan",
+        wraps=taskgraph.plan.compile_plan,
+    ) as compile_plan:
+        taskgraph.values.set_command_line_value("word", "hello")
+        assert taskgraph.values.fetch_value("exclaim") == "HELLO!"
+        # Results of the first fetch are available for the second
+        assert taskgraph.values.fetch_value("exclaim") == "HELLO!"
+        assert compile_plan.call_count == 2
+        assert taskgraph.values.fetch_value("exclaim") == "HELLO!"
+        assert compile_plan.call_count == 2
+        assert shout.call_count == 1
+        assert exclaim.call_count == 1
+
+        # Adding tasks invalidates plans
+        taskgraph.task.Task(name="whisper", runnable=Mock(), inputs=["word"])
+        taskgraph.values.fetch_value("exclaim")
+        assert compile_plan.call_count == 3
+
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    taskgraph.values.reset()
+    taskgraph.plan.reset()
@@ -0,0 +1,50 @@
+import os
+import sys
+
+import taskgraph.dag
+import taskgraph.inputs
+import taskgraph.modules
+import taskgraph.processpool
+import taskgraph.results
+
+
+PROCESS_MODULE = '''
+import os
+from taskgraph.task import *
+
+@task_func(executor="process")
+def workerPid(greeted):
+    return "hello " + greeted + " from " + str(os.getpid())
+'''
+
+
+def test_process_executor(tmp_path):
+    taskgraph.dag.reset()
+    taskgraph.inputs.reset()
+    taskgraph.results.reset()
+    path = tmp_path / "processmodule.py"
+    path.write_text(PROCESS_MODULE)
+    taskgraph.modules.register_python_module("processmodule", str(path))
+    task = taskgraph.dag.get_task("workerPid")
+    assert task.executor == "process"
+    assert taskgraph.processpool.get_preloaded_modules() == [
+        ("processmodule", str(path)),
+    ]
+    taskgraph.processpool.set_processes(1)
+    try:
+        result = task.run({"greeted": "world"})
+        assert result.startswith("hello world from ")
+        worker_pid = result.split()[-1]
+        assert worker_pid != str(os.getpid())
+        # The same warm worker is used again
+        assert task.run({"greeted": "again"}).split()[-1] == worker_pid
+    finally:
+        taskgraph.processpool.shutdown()
+        taskgraph.processpool.processes = None
+    # Module is imported only in the worker process
+    assert "processmodule" not in sys.modules
+    assert not task.is_bound()
+    assert taskgraph.results.get_result(task, {"greeted": "world"}) == result
+    taskgraph.dag.reset()
+    taskgraph.inputs.reset()
+    taskgraph.results.reset()
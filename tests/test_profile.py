@@ -0,0 +1,78 @@
+import json
+import os
+import sys
+import tracemalloc
+
+from unittest.mock import *
+
+import taskgraph.main
+import taskgraph.profile
+
+
+def test_profile_phases(tmp_path):
+    report_file = tmp_path / "profile.jsonl"
+    # Nothing is recorded when not enabled
+    with taskgraph.profile.phase("disabled"):
+        pass
+    taskgraph.profile.count("disabled", 1)
+    assert taskgraph.profile.phases == []
+    assert taskgraph.profile.counts == {}
+
+    taskgraph.profile.enable(str(report_file))
+    with taskgraph.profile.phase("allocating"):
+        data = [bytes(1000) for i in range(100)]
+    taskgraph.profile.count("items", len(data))
+    taskgraph.profile.report()
+    taskgraph.profile.report()
+    taskgraph.profile.reset()
+
+    lines = report_file.read_text().splitlines()
+    assert len(lines) == 2
+    report = json.loads(lines[0])
+    assert report["version"] == taskgraph.profile.REPORT_VERSION
+    assert report["counts"] == {"items": 100}
+    assert [phase["phase"] for phase in report["phases"]] == ["allocating"]
+    phase = report["phases"][0]
+    assert phase["wall"] >= 0
+    assert phase["cpu"] >= 0
+    assert phase["allocated"] >= 100000
+    assert phase["peak"] >= phase["allocated"]
+
+
+@patch("os.environ", {})
+def test_enable_startup_profiling():
+    with patch("sys.argv", ["tg", "--profile-startup=out.jsonl", "task"]):
+        taskgraph.main.enable_startup_profiling()
+        assert sys.argv == ["tg", "task"]
+        assert taskgraph.profile.enabled
+        assert taskgraph.profile.destination == "out.jsonl"
+    taskgraph.profile.reset()
+
+    with patch("sys.argv", ["tg", "task"]):
+        taskgraph.main.enable_startup_profiling()
+        assert not taskgraph.profile.enabled
+
+    os.environ["TASKGRAPH_PROFILE_STARTUP"] = "1"
+    with patch("sys.argv", ["tg"]):
+        taskgraph.main.enable_startup_profiling()
+        assert taskgraph.profile.enabled
+        assert taskgraph.profile.destination is None
+    taskgraph.profile.reset()
+
+
+def test_reset_keeps_tracing_started_elsewhere():
+    taskgraph.profile.reset()
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        taskgraph.profile.enable()
+        taskgraph.profile.reset()
+        assert tracemalloc.is_tracing()
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+    # Tracing started by enable is stopped
+    taskgraph.profile.enable()
+    taskgraph.profile.reset()
+    assert tracemalloc.is_tracing() == tracing
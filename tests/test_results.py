@@ -98,3 +98,209 @@ def test_get_results():
     assert before < return_value["finish_timestamp"] < after
     assert return_value["values"] == {"inputName": "inputValue"}
     assert return_value["result"] == result
+
+
+def test_durations(tmp_path):
+    taskgraph.results.reset()
+    durations_file = str(tmp_path / "durations.json")
+    taskgraph.results.load_durations(durations_file)
+    task = taskgraph.task.Task(name="timed", module="module")
+    assert taskgraph.results.get_expected_duration(task) is None
+    # Nothing is written before durations change
+    taskgraph.results.save_durations(durations_file)
+    assert not os.path.exists(durations_file)
+
+    taskgraph.results.add_result(task, {}, "result", duration=1.0)
+    assert taskgraph.results.get_expected_duration(task) == 1.0
+    taskgraph.results.add_result(task, {}, "result", duration=2.0)
+    assert taskgraph.results.get_expected_duration(task) == pytest.approx(
+        taskgraph.results.DURATION_SMOOTHING * 2.0 +
+        (1 - taskgraph.results.DURATION_SMOOTHING) * 1.0,
+    )
+    expected = taskgraph.results.get_expected_duration(task)
+    taskgraph.results.save_durations(durations_file)
+
+    # Durations are kept across runs by task and module name
+    taskgraph.results.reset()
+    assert taskgraph.results.load_durations(durations_file) == {
+        "module.timed": expected,
+    }
+    taskgraph.results.reset()
+    taskgraph.dag.reset()
+
+
+def test_result_limits():
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    taskgraph.results.set_limits(count=3)
+    task = taskgraph.task.Task(name="echo", inputs=["word"])
+    for word in ("a", "b", "c"):
+        taskgraph.results.add_result(task, {"word": word}, word.upper())
+    # Using a result makes it the most recently used one
+    assert taskgraph.results.get_result(task, {"word": "a"}) == "A"
+    taskgraph.results.add_result(task, {"word": "d"}, "D")
+    assert taskgraph.results.has_result(task, {"word": "a"})
+    assert not taskgraph.results.has_result(task, {"word": "b"})
+    assert taskgraph.results.has_result(task, {"word": "c"})
+    assert taskgraph.results.has_result(task, {"word": "d"})
+    # Entry of evicted result is kept without it's payload
+    assert [
+        stored["result"] for stored in taskgraph.results.results_in_order
+    ] == ["A", None, "C", "D"]
+
+    # Latest result is kept even if it alone exceeds the limit
+    size = taskgraph.results.get_size("x" * 1000)
+    taskgraph.results.set_limits(size=size)
+    taskgraph.results.add_result(task, {"word": "x"}, "x" * 1000)
+    taskgraph.results.add_result(task, {"word": "y"}, "y" * 1000)
+    assert list(taskgraph.results.results_by_values) == [("echo", "y")]
+    assert taskgraph.results.result_bytes == size
+    assert taskgraph.results.latest_results["echo"] == "y" * 1000
+    taskgraph.results.reset()
+    taskgraph.dag.reset()
+
+
+def test_pinned_results():
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    taskgraph.results.set_limits(count=1)
+    task = taskgraph.task.Task(name="echo", inputs=["word"])
+    with taskgraph.results.pinned():
+        for word in ("a", "b", "c"):
+            taskgraph.results.add_result(task, {"word": word}, word.upper())
+        assert len(taskgraph.results.results_by_values) == 3
+    assert list(taskgraph.results.results_by_values) == [("echo", "c")]
+
+    # Only latest entries are kept in results_in_order
+    for index in range(100):
+        taskgraph.results.add_result(task, {"word": str(index)}, index + 1)
+    assert len(taskgraph.results.results_in_order) <= \
+        2 * taskgraph.results.HISTORY_FACTOR
+    assert taskgraph.results.results_in_order[-1]["result"] == 100
+    taskgraph.results.reset()
+    taskgraph.dag.reset()
+
+
+def test_latest_results():
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    first = taskgraph.task.Task(name="first", inputs=["word"])
+    second = taskgraph.task.Task(name="second", inputs=["word"])
+    assert taskgraph.results.get("first") is None
+    taskgraph.results.add_result(first, {"word": "a"}, "A")
+    taskgraph.results.add_result(second, {"word": "a"}, "a" * 81)
+    taskgraph.results.add_result(second, {"word": "b"}, "B")
+    taskgraph.results.add_result(second, {"word": "c"}, "c" * 81)
+    taskgraph.results.add_result(first, {"word": "b"}, None)
+    assert taskgraph.results.get("first")["values"] == {"word": "b"}
+    assert taskgraph.results.get("second")["result"] == "c" * 81
+    # Latest results which are not None in the order they were added
+    assert taskgraph.results.get_all_results() == [
+        ("first", "A"),
+        ("second", "c" * 81),
+    ]
+    # Latest results of at most 80 characters
+    assert taskgraph.results.get_all_results_in_order() == [
+        ("first", "A"),
+        ("second", "B"),
+    ]
+    taskgraph.results.next_generation()
+    taskgraph.results.invalidate(["first"])
+    assert taskgraph.results.get_all_results() == [("second", "c" * 81)]
+    taskgraph.results.reset()
+    taskgraph.dag.reset()
+
+
+def test_reused_result_is_moved():
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    task = taskgraph.task.Task(name="echo", inputs=["word"])
+    taskgraph.results.add_result(task, {"word": "a"}, "A")
+    taskgraph.results.add_result(task, {"word": "b"}, "B")
+    for word in ("a", "b", "a"):
+        assert taskgraph.results.reuse_result(task, {"word": word}) == \
+            word.upper()
+    assert [
+        stored["result"] for stored in taskgraph.results.results_in_order
+    ] == ["B", "A"]
+    assert taskgraph.results.get("echo")["result"] == "A"
+
+    # Entry reused inside buffered is moved to the buffer
+    buffer = list()
+    with taskgraph.results.buffered(buffer):
+        taskgraph.results.reuse_result(task, {"word": "b"})
+        taskgraph.results.reuse_result(task, {"word": "a"})
+        taskgraph.results.reuse_result(task, {"word": "b"})
+    taskgraph.results.merge(buffer)
+    assert [
+        stored["result"] for stored in taskgraph.results.results_in_order
+    ] == ["A", "B"]
+    taskgraph.results.reset()
+    taskgraph.dag.reset()
+
+
+def test_query():
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    send = taskgraph.task.Task(name="send", inputs=["host", "message"])
+    ping = taskgraph.task.Task(name="ping", inputs=["host"])
+    runs = [
+        (send, {"host": "a", "message": "first"}),
+        (ping, {"host": "a"}),
+        (send, {"host": "b", "message": "second"}),
+        (send, {"host": "a", "message": "third"}),
+    ]
+    for index, (task, values) in enumerate(runs):
+        with patch("time.time", return_value=1000.0 + index):
+            taskgraph.results.add_result(task, values, index)
+
+    def query_results(**kwargs):
+        return [
+            stored["result"]
+            for stored in taskgraph.results.query(**kwargs)
+        ]
+
+    for input_names in (None, [], ["host"]):
+        taskgraph.results.set_indexes(input_names)
+        assert query_results() == [0, 1, 2, 3]
+        assert query_results(task="send") == [0, 2, 3]
+        assert query_results(task=ping) == [1]
+        assert query_results(where={"host": "a"}) == [0, 1, 3]
+        assert query_results(task="send", where={"host": "a"}) == [0, 3]
+        assert query_results(where={"host": "c"}) == []
+        assert query_results(since=1001.0) == [1, 2, 3]
+        assert query_results(since=1001.0, until=1003.0) == [1, 2]
+        assert query_results(where={"host": "a"}, since=1002.0) == [3]
+
+    # Evicted results are not found
+    taskgraph.results.set_limits(count=2)
+    assert query_results(where={"host": "a"}) == [1, 3]
+    taskgraph.results.reset()
+    taskgraph.dag.reset()
+
+
+def test_query_rerun():
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    send = taskgraph.task.Task(name="send", inputs=["host"])
+    for index, host in enumerate(["a", "b", "a"]):
+        with patch("time.time", return_value=1000.0 + index):
+            taskgraph.results.add_result(send, {"host": host}, index)
+    queries = [
+        {"task": "send"},
+        {"where": {"host": "a"}},
+        {"since": 1000.0},
+    ]
+    found = list()
+    for input_names in (None, ["host"]):
+        taskgraph.results.set_indexes(input_names)
+        # Results of earlier run with the same values are replaced
+        with patch("time.time", return_value=1003.0):
+            taskgraph.results.add_result(send, {"host": "b"}, 3)
+        found.append([
+            [stored["result"] for stored in taskgraph.results.query(**query)]
+            for query in queries
+        ])
+    assert found[0] == found[1] == [[2, 3], [2], [2, 3]]
+    taskgraph.results.reset()
+    taskgraph.dag.reset()
@@ -0,0 +1,93 @@
+import json
+import os
+import sys
+
+from unittest.mock import *
+
+import taskgraph.dag
+import taskgraph.inputs
+import taskgraph.modules
+import taskgraph.results
+import taskgraph.snapshot
+
+
+PYTHON_MODULE = '''
+from taskgraph.task import *
+
+@task_func
+def greeting(greeted):
+    return "hello " + greeted
+'''
+
+
+def test_snapshot(tmp_path):
+    taskgraph.dag.reset()
+    taskgraph.inputs.reset()
+    taskgraph.modules.checked_executables = dict()
+    json_directory = tmp_path / "json"
+    python_directory = tmp_path / "python"
+    json_directory.mkdir()
+    python_directory.mkdir()
+    json_file = json_directory / "snapshotmodule.json"
+    json_file.write_text(
+        json.dumps(
+            [
+                {
+                    "name": "greetedName",
+                    "inputs": ["firstName"],
+                    "values": {"greeted": "{firstName} Smith"},
+                },
+            ],
+        ),
+    )
+    (python_directory / "snapshotgreeting.py").write_text(PYTHON_MODULE)
+    snapshot_file = str(tmp_path / "registry.pickle")
+    sources = taskgraph.snapshot.get_source_files(
+        json_directories=[str(json_directory)],
+        python_directories=[str(python_directory)],
+    )
+    assert str(json_file) in sources
+
+    # Nothing to load before saving
+    assert not taskgraph.snapshot.load(sources, snapshot_file)
+
+    taskgraph.modules.register_python_modules(str(python_directory))
+    taskgraph.modules.register_json_modules(str(json_directory))
+    assert taskgraph.snapshot.save(sources, snapshot_file)
+    taskgraph.dag.reset()
+    taskgraph.inputs.reset()
+
+    # Restore tasks without importing python module
+    assert taskgraph.snapshot.load(sources, snapshot_file)
+    assert "snapshotgreeting" not in sys.modules
+    assert taskgraph.inputs.is_input("snapshotmodule.firstName")
+    inline_task = taskgraph.dag.get_task("{firstName} Smith")
+    assert inline_task.run({"firstName": "John"}) == "John Smith"
+    task = taskgraph.dag.get_task("greeting")
+    assert not task.is_bound()
+    assert task.module == "snapshotgreeting"
+
+    # Runnable is bound from module on first use
+    assert task.run({"greeted": "world"}) == "hello world"
+    assert "snapshotgreeting" in sys.modules
+    assert taskgraph.dag.get_task("greeting") is task
+
+    # Touching the file does not invalidate snapshot
+    os.utime(json_file)
+    assert taskgraph.snapshot.load(sources, snapshot_file)
+    # and the touched file is not hashed again on next load
+    with patch(
+        "taskgraph.snapshot.get_file_hash",
+        wraps=taskgraph.snapshot.get_file_hash,
+    ) as get_file_hash:
+        assert taskgraph.snapshot.load(sources, snapshot_file)
+        assert get_file_hash.call_count == 0
+
+    # Changing the contents does
+    json_file.write_text("[]")
+    assert not taskgraph.snapshot.load(sources, snapshot_file)
+
+    del(sys.modules["snapshotgreeting"])
+    taskgraph.dag.reset()
+    taskgraph.inputs.reset()
+    taskgraph.results.reset()
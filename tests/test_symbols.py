@@ -0,0 +1,24 @@
+import taskgraph.symbols
+
+
+def test_symbols():
+    state = taskgraph.symbols.get_state()
+    taskgraph.symbols.reset()
+    try:
+        first = taskgraph.symbols.intern("first")
+        assert taskgraph.symbols.intern("first") == first
+        assert taskgraph.symbols.get_id("second") is None
+        mask = taskgraph.symbols.intern_mask(["second", "third", "first"])
+        assert taskgraph.symbols.get_names(mask) == [
+            "first", "second", "third",
+        ]
+        assert taskgraph.symbols.has(mask, "second")
+        assert not taskgraph.symbols.has(mask, "fourth")
+        # Unknown names are not in any bitset
+        assert taskgraph.symbols.get_mask({"third": 1, "fourth": 2}) == \
+            1 << taskgraph.symbols.get_id("third")
+
+        taskgraph.symbols.set_state(taskgraph.symbols.get_state())
+        assert taskgraph.symbols.get_name(first) == "first"
+    finally:
+        taskgraph.symbols.set_state(state)
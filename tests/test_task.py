@@ -1,5 +1,7 @@
 import collections
+import copy
 import os
+import pickle
 import pytest
 import random
 import sys
@@ -22,6 +24,8 @@ import taskgraph.dag
 import taskgraph.modules
 import taskgraph.results
 import taskgraph.runner
+import taskgraph.util
+import taskgraph.values
 
 
 def test_format_argument_list():
@@ -289,6 +293,34 @@ def test_get_namedtuple():
     )("task", "inputValue", taskgraph.task.EMPTY_VALUE)
 
 
+def test_get_key():
+    taskgraph.dag.reset()
+    task = taskgraph.task.Task(
+        name="task",
+        runnable=lambda inputName, optionalInputName=None: inputName,
+        inputs=["inputName"],
+        optionalInputs=["optionalInputName"],
+    )
+    values = {"inputName": "inputValue"}
+    key = task.get_key(values)
+    assert key == ("task", "inputValue", taskgraph.task.EMPTY_VALUE)
+    assert key == task.get_namedtuple(values)
+    assert hash(key) == hash(task.get_namedtuple(values))
+    # Key function is created once
+    assert task.get_key is task.get_key
+    with pytest.raises(KeyError):
+        task.get_key({"optionalInputName": "optionalValue"})
+    assert task.get_relevant_values(
+        {"inputName": "inputValue", "other": "otherValue"},
+    ) == values
+
+    # Key functions are not pickled
+    task.runnable_reference = ("inline", "{inputName}")
+    copied = pickle.loads(pickle.dumps(task))
+    assert copied.get_key(values) == key
+    taskgraph.dag.reset()
+
+
 def test_store_results():
     # Initialize command_to_full_path to bypass executable search from PATH
     old_command_to_full_path = taskgraph.modules.command_to_full_path
@@ -507,4 +539,89 @@ def test_optional_input_environment_value():
     assert valuetask.values == { "commitMessageFile": "commit.md"}
     taskgraph.dag.reset()
     taskgraph.results.reset()
-    taskgraph.values.reset()
\ No newline at end of file
+    taskgraph.values.reset()
+
+def test_shared_value_tasks():
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    calls = list()
+
+    def create_runnable(name):
+        def runnable(**kwargs):
+            calls.append(name)
+            return name + "(" + ",".join(sorted(kwargs.values())) + ")"
+        return runnable
+
+    # Chain of diamonds, each layer having both tasks of the previous
+    # layer as inputs. Tree of it would have 2 ** 21 nodes.
+    taskgraph.task.Task(name="left0", runnable=create_runnable("left0"))
+    taskgraph.task.Task(name="right0", runnable=create_runnable("right0"))
+    for layer in range(1, 20):
+        inputs = ["left" + str(layer - 1), "right" + str(layer - 1)]
+        for side in ["left", "right"]:
+            name = side + str(layer)
+            taskgraph.task.Task(
+                name=name,
+                runnable=create_runnable(name),
+                inputs=inputs,
+            )
+    valuetask = taskgraph.runner.ValueTask.create_value_task(name="left19")
+    left18 = valuetask.values["left18"]
+    right18 = valuetask.values["right18"]
+    assert left18.values["left17"] is right18.values["left17"]
+    assert hash(left18.values["left17"]) == hash(right18.values["left17"])
+    assert copy.deepcopy(valuetask) is valuetask
+
+    result = valuetask.run()
+    assert len(calls) == 39
+    assert result.startswith("left19(left18(")
+    # Running does not change the ValueTask
+    assert isinstance(valuetask.values["left18"], taskgraph.runner.ValueTask)
+    taskgraph.results.clear()
+    assert valuetask.run() == result
+    assert len(calls) == 78
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+
+
+def test_deep_chain():
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    taskgraph.values.reset()
+    # Deeper than recursion would allow
+    length = sys.getrecursionlimit() * 2
+    taskgraph.task.Task(
+        name="chain0",
+        runnable=lambda start: start,
+        inputs=["start"],
+    )
+    for i in range(1, length):
+        taskgraph.task.Task(
+            name="chain" + str(i),
+            runnable=lambda **previous: list(previous.values())[0],
+            inputs=["chain" + str(i - 1)],
+        )
+    last = "chain" + str(length - 1)
+    taskgraph.values.add_value_names(["start"])
+    taskgraph.values.set_command_line_value("start", "value")
+    assert taskgraph.values.fetch_value(last) == "value"
+
+    taskgraph.results.clear()
+    valuetask = taskgraph.runner.ValueTask.create_value_task(
+        name=last,
+        values={"start": "value"},
+    )
+    assert valuetask.run() == "value"
+
+    taskgraph.results.clear()
+    consecutive_task = taskgraph.task.ConsecutiveTask.create_consecutive_tasks(
+        ["chain" + str(i) for i in range(length - 1)],
+    )
+    consecutive_task.append(taskgraph.task.ConsecutiveTask(task_name=last))
+    assert consecutive_task.run() == "value"
+
+    tree = taskgraph.util.get_asciitree(taskgraph.dag.get_task(last))
+    assert tree.contents == last
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    taskgraph.values.reset()
@@ -1,5 +1,10 @@
+import threading
+
 import taskgraph.dag
+import taskgraph.executor
+import taskgraph.plan
 import taskgraph.results
+import taskgraph.symbols
 import taskgraph.values
 import taskgraph.task
 
@@ -56,3 +61,175 @@ def test_fetch_value():
     taskgraph.values.reset()
 
 
+
+
+def test_runnable_tasks_follow_values():
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    taskgraph.values.reset()
+    taskgraph.task.Task(
+        name="shout",
+        runnable=lambda word: word.upper(),
+        inputs=["word"],
+        module="module",
+    )
+    taskgraph.task.Task(
+        name="exclaim",
+        runnable=lambda shout: shout + "!",
+        inputs=["shout"],
+        module="module",
+    )
+    taskgraph.values.add_value_names(taskgraph.dag.get_all_value_names())
+    assert taskgraph.dag.get_runnable_tasks() == set()
+    taskgraph.values.set_environment_values({"word": "hello"})
+    assert taskgraph.dag.get_runnable_tasks("module") == {"shout", "exclaim"}
+    taskgraph.values.deprecate_input("word")
+    assert taskgraph.dag.get_runnable_tasks() == set()
+    taskgraph.values.set_command_line_value("word", "bye")
+    assert taskgraph.values.fetch_value("exclaim") == "BYE!"
+    taskgraph.values.reset()
+    # Result of shout is still available
+    assert taskgraph.dag.get_runnable_tasks() == {"exclaim"}
+    taskgraph.results.reset()
+    assert taskgraph.dag.get_runnable_tasks() == set()
+    taskgraph.dag.reset()
+
+
+def test_changed_value_invalidates_results():
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    taskgraph.values.reset()
+    shout = Mock(side_effect=lambda word: word.upper())
+    taskgraph.task.Task(name="shout", runnable=shout, inputs=["word"])
+    count = Mock(side_effect=lambda word: len(word))
+    taskgraph.task.Task(name="count", runnable=count, inputs=["word"])
+    greet = Mock(side_effect=lambda name: "hello " + name)
+    taskgraph.task.Task(name="greet", runnable=greet, inputs=["name"])
+    both = Mock(side_effect=lambda shout, count, greet: [shout, count, greet])
+    taskgraph.task.Task(
+        name="both",
+        runnable=both,
+        inputs=["shout", "count", "greet"],
+    )
+    taskgraph.values.add_value_names(taskgraph.dag.get_all_value_names())
+    taskgraph.values.set_command_line_value("word", "hi")
+    taskgraph.values.set_command_line_value("name", "bob")
+    assert taskgraph.values.fetch_value("both") == ["HI", 2, "hello bob"]
+
+    # Both is reached through shout and count but visited once
+    with patch(
+        "taskgraph.dag.get_tasks_having_input",
+        wraps=taskgraph.dag.get_tasks_having_input,
+    ) as get_tasks_having_input:
+        taskgraph.values.set_command_line_value("word", "bye")
+    assert get_tasks_having_input.call_count == 4
+    assert taskgraph.results.is_stale("both")
+    assert not taskgraph.results.is_stale("greet")
+    assert set(taskgraph.values.get_values()) == {"word", "name", "greet"}
+
+    # Only tasks having word as input are run again
+    assert taskgraph.values.fetch_value("both") == ["BYE", 3, "hello bob"]
+    assert shout.call_count == 2
+    assert count.call_count == 2
+    assert greet.call_count == 1
+    assert both.call_count == 2
+
+    # Earlier results with the same values are reused
+    taskgraph.values.set_command_line_value("word", "hi")
+    assert taskgraph.values.fetch_value("both") == ["HI", 2, "hello bob"]
+    assert taskgraph.values.get_values()["shout"] == "HI"
+    assert shout.call_count == 2
+    assert both.call_count == 2
+
+    # Setting the same value again does not invalidate anything
+    taskgraph.values.set_command_line_value("word", "hi")
+    assert not taskgraph.results.is_stale("both")
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    taskgraph.values.reset()
+
+
+def test_values_view():
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    taskgraph.values.reset()
+    taskgraph.task.Task(
+        name="shout",
+        runnable=lambda word: word.upper(),
+        inputs=["word"],
+    )
+    taskgraph.values.add_value_names(["word", "name", "shout"])
+    taskgraph.values.set_environment_values({"word": "hi", "name": "bob"})
+    values = taskgraph.values.get_values()
+    assert dict(values) == {"word": "hi", "name": "bob"}
+
+    # View follows changes of values and results
+    taskgraph.values.set_command_line_value("word", "bye")
+    assert values["word"] == "bye"
+    assert taskgraph.values.fetch_value("shout") == "BYE"
+    assert values["shout"] == "BYE"
+    # Results override command line values
+    taskgraph.values.set_command_line_value("shout", "quiet")
+    assert values["shout"] == "BYE"
+    assert taskgraph.values.get_available_mask() == \
+        taskgraph.symbols.get_mask(["word", "name", "shout"])
+    # Changed input makes both the result and value of shout stale
+    taskgraph.values.set_command_line_value("word", "hello")
+    assert "shout" not in values
+    assert taskgraph.values.get_available_mask() == \
+        taskgraph.symbols.get_mask(["word", "name"])
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    taskgraph.values.reset()
+
+
+def test_fetch_values():
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    taskgraph.values.reset()
+    taskgraph.plan.reset()
+    barrier = threading.Barrier(2, timeout=5)
+    shared = Mock(side_effect=lambda word: word.upper())
+    taskgraph.task.Task(name="shared", runnable=shared, inputs=["word"])
+
+    def wait_for_other(shared):
+        # Both tasks must be running at the same time to pass the barrier
+        barrier.wait()
+        return shared + "!"
+
+    for name in ["first", "second"]:
+        taskgraph.task.Task(
+            name=name,
+            runnable=wait_for_other,
+            inputs=["shared"],
+        )
+    taskgraph.values.add_value_names(taskgraph.dag.get_all_value_names())
+    taskgraph.values.set_command_line_value("word", "hi")
+    # Shared task is a single step
+    steps, positions = taskgraph.plan.compile_batch_plan(
+        ["first", "second"],
+        {"word"},
+    )
+    assert [task.name for task, _ in steps] == ["shared", "first", "second"]
+    assert positions == (1, 2)
+    taskgraph.executor.set_workers(2)
+    try:
+        with patch(
+            "taskgraph.plan.compile_batch_plan",
+            wraps=taskgraph.plan.compile_batch_plan,
+        ) as compile_batch_plan:
+            assert taskgraph.values.fetch_values(
+                ["first", "word", "second", "first"],
+            ) == {"first": "HI!", "second": "HI!", "word": "hi"}
+        assert compile_batch_plan.call_count == 1
+    finally:
+        taskgraph.executor.set_workers(1)
+    assert shared.call_count == 1
+    assert [
+        result["task"].name
+        for result in taskgraph.results.results_in_order
+    ] == ["shared", "first", "second"]
+    taskgraph.dag.reset()
+    taskgraph.results.reset()
+    taskgraph.values.reset()
+    taskgraph.plan.reset()